@@ -1,15 +1,14 @@
-from flask import Flask, session, render_template, request, redirect, url_for, flash
-import threading
+from flask import Flask, session, render_template, request, redirect, url_for, flash, make_response
 import os
 import storage
+import http_cache
+import profiling
+import compression
 from urllib.parse import unquote
 
-# 1. 앱과 잠금 생성
-app = Flask(__name__)
-data_lock = threading.RLock()
-
-# 세션 비밀 키
-app.secret_key = 'super-secret-key-please-change-this' 
+# [!! ★★★ 변경 ★★★ !!]
+# 잠금은 storage.py가 소유합니다. (기존 `from app import data_lock` 호환용 재노출)
+data_lock = storage.data_lock
 
 # LaTeX 수정 지시어
 # [!! ★★★ 수정됨 ★★★ !!]
@@ -23,53 +22,64 @@ LATEX_FIX_INSTRUCTION = """[중요 지시]:
 # 이제 서버에 Tesseract를 설치할 필요가 없습니다.
 
 # ----------------------------
-# Google Gemini API 설정
+# [!! ★★★ 변경 ★★★ !!] Google Gemini API 설정
 # ----------------------------
-try:
-    import google.generativeai as genai
-    # [주의] 배포 환경 변수 또는 여기에 직접 키 입력
-    GEMINI_API_KEY = os.getenv("GEMINI_API_KEY") 
-    genai.configure(api_key=GEMINI_API_KEY)
-    print("✅ Google Gemini API 키 설정 완료.")
-except Exception as e:
-    print(f"💥 [오류] Gemini API 설정 실패: {e}")
+# import 시점에 google.generativeai를 불러오지 않습니다.
+# 첫 LLM 호출 때 llm.get_genai()가 import + API 키 설정을 합니다.
 
 # ----------------------------
-# Excel 라이브러리 확인
-# ----------------------------
-try:
-    import openpyxl
-    app.config['OPENPYXL_AVAILABLE'] = True
-    print("✅ 'openpyxl' (Excel 라이브러리) 로드 성공.")
-except ImportError:
-    app.config['OPENPYXL_AVAILABLE'] = False
-    print("⚠️ 'openpyxl' 라이브러리를 찾을 수 없습니다. .xlsx 파일은 처리할 수 없습니다.")
-    
-# ----------------------------
-# 블루프린트 등록
+# 앱 팩토리
 # ----------------------------
-try:
+def create_app():
+    """
+    Flask 앱을 생성하고 블루프린트/미들웨어를 등록합니다.
+    (gunicorn: `gunicorn "app:create_app()"` 또는 기존처럼 `gunicorn app:app`)
+    """
+    app = Flask(__name__)
+
+    # 세션 비밀 키
+    app.secret_key = 'super-secret-key-please-change-this' 
+    # 템플릿에서 내용 해시가 붙은 정적 파일 URL 사용: {{ static_url('js/index.js') }}
+    app.jinja_env.globals['static_url'] = http_cache.static_url
+
+    # Excel 라이브러리 확인 (import 없이 설치 여부만)
+    app.config['OPENPYXL_AVAILABLE'] = storage.OPENPYXL_AVAILABLE
+    if not storage.OPENPYXL_AVAILABLE:
+        print("⚠️ 'openpyxl' 라이브러리를 찾을 수 없습니다. .xlsx 파일은 처리할 수 없습니다.")
+
+    # 블루프린트 등록
+    # (라우트 모듈은 더 이상 app.py를 import하지 않으므로 순환 import가 없습니다)
     from auth import auth_bp
     from routes_core import core_bp
     from routes_analysis import analysis_bp
     from routes_quiz import quiz_bp
-    
+    from routes_admin import admin_bp
+
     app.register_blueprint(auth_bp)
     app.register_blueprint(core_bp)
     app.register_blueprint(analysis_bp)
     app.register_blueprint(quiz_bp)
+    app.register_blueprint(admin_bp)
+
+    app.add_url_rule("/", "index", index)
+    app.before_request(require_login)
+    app.after_request(add_header)
+    # [!! 신규 !!] 요청 프로파일링 (AITER_PROFILE=1일 때만 훅 등록)
+    profiling.init_app(app)
+    # [!! 신규 !!] 응답 압축 (gzip/br, 스트리밍은 청크별 flush)
+    compression.init_app(app)
     print("✅ [Init] 모든 API 블루프린트 로드 성공.")
-except ImportError as e:
-    print(f"💥 [Init] 블루프린트 import 실패: {e}")
-    print("   필수 파일들이 모두 존재하는지 확인하세요.")
+    return app
 
 # ----------------------------
 # 로그인 확인 (미들웨어)
 # ----------------------------
-@app.before_request
 def require_login():
     if request.path.startswith('/static'):
         return
+    # 관리자 API는 세션 대신 관리자 토큰으로 보호 (routes_admin.admin_required)
+    if request.blueprint == 'admin':
+        return
     if request.endpoint not in ['auth.login_folder', 'auth.create_folder', 'index']:
         if 'folder_id' not in session:
             flash("먼저 폴더 ID로 로그인하거나 새 폴더를 생성해야 합니다.")
@@ -78,11 +88,18 @@ def require_login():
 # ----------------------------
 # 메인 페이지 라우트
 # ----------------------------
-@app.route("/")
 def index():
     current_user = session.get('folder_id')
     
     if current_user:
+        # [HTTP 캐시] 캐시 파일 버전이 그대로면 캐시를 읽지도, 렌더링하지도 않고 304
+        cache_version = storage.get_cache_version(current_user)
+        etag = http_cache.make_etag(current_user, cache_version, request.query_string)
+        last_modified = http_cache.mtime_to_datetime(max(mtime for mtime, _ in cache_version))
+        not_modified = http_cache.conditional_response(etag, last_modified)
+        if not_modified is not None:
+            return not_modified
+
         qa_cache = storage.load_qa_cache(current_user)
         odapnote_list = storage.load_odapnote(current_user)
         
@@ -91,20 +108,20 @@ def index():
         
         answer = ""
         question_text = ""
+        quiz_key = ""
 
         if cache_key:
             cache_key = unquote(cache_key)
             if cache_key in qa_cache:
                 answer = qa_cache[cache_key].get('answer', '')
                 question_text = qa_cache[cache_key].get('question_text', '')
+                if qa_cache[cache_key].get('answer_key'):
+                    quiz_key = cache_key
         elif odap_key:
-            try:
-                odap_index = int(odap_key)
-                if 0 <= odap_index < len(odapnote_list):
-                    answer = odapnote_list[odap_index].get('content', '')
-                    question_text = f"[{odapnote_list[odap_index].get('timestamp', '')} 오답노트]"
-            except ValueError:
-                pass
+            odap_item = next((item for item in odapnote_list if item.get('id') == odap_key), None)
+            if odap_item:
+                answer = odap_item.get('content', '')
+                question_text = f"[{odap_item.get('timestamp', '')} 오답노트]"
         
         try:
             ask_list, summarize_list, quiz_list, mindmap_list = storage.get_categorized_cache(qa_cache)
@@ -112,12 +129,12 @@ def index():
             ask_list, summarize_list, quiz_list, mindmap_list = [], [], [], []
 
         supported_files = storage.get_supported_files(current_user)
-        ocr_cache = storage.load_ocr_cache(current_user)
         
-        return render_template("index.html", 
+        response = make_response(render_template("index.html", 
                                 current_user=current_user,
                                 answer=answer,
                                 question_text=question_text,
+                                quiz_key=quiz_key,
                                 ask_list=ask_list, 
                                 summarize_list=summarize_list,
                                 quiz_list=quiz_list, 
@@ -125,20 +142,21 @@ def index():
                                 supported_files=supported_files,
                                 odapnote_list=odapnote_list,
                                 chat_history=[],
-                                ocr_cache_keys=list(ocr_cache.keys())
-                                )
+                                ocr_cache_keys=storage.get_ocr_done_files(current_user)
+                                ))
+        return http_cache.mark_revalidate(response, etag, last_modified)
     else:
         return render_template("index.html", current_user=current_user)
 
 # ----------------------------
 # 캐시 제어
 # ----------------------------
-@app.after_request
 def add_header(response):
-    response.headers['Cache-Control'] = 'no-store, no-cache, must-revalidate, max-age=0'
-    response.headers['Pragma'] = 'no-cache'
-    response.headers['Expires'] = '0'
-    return response
+    # 정적 파일은 장기 캐시, 조회 화면은 ETag 재검증, 나머지는 no-store
+    return http_cache.apply_cache_policy(response)
+
+# 기존 실행 방식(`python app.py`, `gunicorn app:app`) 호환용 기본 인스턴스
+app = create_app()
 
 # ----------------------------
 # 서버 실행
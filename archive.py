@@ -0,0 +1,281 @@
+import os
+import re
+import gzip
+import json
+import time
+import zlib
+import shutil
+import hashlib
+import tarfile
+import tempfile
+
+import storage
+
+# ----------------------------
+# [!! ★★★ 신규 ★★★ !!]
+# 사용자 폴더 내보내기/가져오기 (서버 간 이전용 tar.gz)
+# 보관 파일 구성:
+#   data/<파일명>              원본 자료
+#   cache/qa.json, cache/odap.json, cache/ocr_manifest.json
+#   blobs/<해시>.txt(.gz)       추출 텍스트 블롭 (매니페스트가 참조하는 것만)
+#   export.json                 {"version", "user", "created_at", "files": {이름: sha256}}  (항상 마지막)
+# 내보내기: 파일을 1MB 단위로 읽어 tar 헤더 + gzip 압축을 직접 흘려 보냄 -> 크기와 무관하게 메모리 일정
+# 가져오기: 스트림을 임시 폴더에 풀면서 해시 계산 -> export.json과 모두 일치할 때만 반영
+#           (이미 있는 같은 내용의 블롭/원본은 다시 쓰지 않고 재사용 -> 재추출 없음)
+# ----------------------------
+
+EXPORT_VERSION = 1
+CHUNK_SIZE = 1024 * 1024
+CACHE_TYPES = ("qa", "odap", "ocr_manifest")
+MAX_IMPORT_MEMBERS = 20000
+
+_BLOB_NAME = re.compile(r"^[0-9a-f]{64}\.txt(\.gz)?$")
+
+
+class ArchiveError(Exception):
+    """ 가져오기 검증 실패 (보관 파일 손상/변조/형식 오류) """
+
+
+def _tar_header(arcname, size, mtime):
+    info = tarfile.TarInfo(arcname)
+    info.size = size
+    info.mtime = int(mtime)
+    info.mode = 0o644
+    return info.tobuf(tarfile.PAX_FORMAT, "utf-8", "surrogateescape")
+
+
+def _export_members(user_id):
+    """
+    (보관 이름, 원본 경로) 목록. 매니페스트는 내보내는 원본에 해당하는 항목만 남긴 사본을 씁니다.
+    (추출 이후 원본이 바뀐 항목은 빼서, 가져온 쪽에서 다시 추출하게 함)
+    """
+    data_dir = storage.get_user_data_path(user_id)
+    members = [(f"data/{name}", os.path.join(data_dir, name)) for name in sorted(os.listdir(data_dir))
+               if os.path.isfile(os.path.join(data_dir, name))]
+    for cache_type in ("qa", "odap"):
+        path = storage.get_user_cache_path(user_id, cache_type)
+        if os.path.exists(path):
+            members.append((f"cache/{cache_type}.json", path))
+
+    exported = {arcname[len("data/"):] for arcname, _ in members if arcname.startswith("data/")}
+    manifest = {name: entry for name, entry in storage.load_ocr_manifest(user_id).items()
+                if name in exported and storage._source_matches(user_id, name, entry)}
+    blob_dir = storage.get_user_blob_path(user_id)
+    blob_names = sorted({entry["hash"] + (".txt.gz" if entry.get("compressed") else ".txt")
+                         for entry in manifest.values() if entry.get("hash")})
+    members.extend((f"blobs/{name}", os.path.join(blob_dir, name)) for name in blob_names)
+    return members, json.dumps(manifest, ensure_ascii=False, indent=4).encode('utf-8')
+
+
+def iter_export(user_id):
+    """ 사용자 폴더 전체를 tar.gz 바이트 조각으로 내보냅니다. (Response에 그대로 넘기는 제너레이터) """
+    members, manifest_bytes = _export_members(user_id)
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # (wbits=31: gzip 헤더/트레일러)
+    hashes, started = {}, time.time()
+
+    def emit(data):
+        chunk = compressor.compress(data)
+        return [chunk] if chunk else []
+
+    def emit_member(arcname, size, mtime, chunks):
+        digest = hashlib.sha256()
+        yield from emit(_tar_header(arcname, size, mtime))
+        written = 0
+        for chunk in chunks:
+            chunk = chunk[:size - written]
+            digest.update(chunk)
+            written += len(chunk)
+            yield from emit(chunk)
+            if written >= size:
+                break
+        if written < size:
+            # (읽는 도중 파일이 줄어든 경우: 헤더 크기를 맞추기 위해 0으로 채움 -> 가져올 때 해시 불일치로 걸러짐)
+            yield from emit(b"\0" * (size - written))
+            digest.update(b"\0" * (size - written))
+        yield from emit(b"\0" * (-size % tarfile.BLOCKSIZE))
+        hashes[arcname] = digest.hexdigest()
+
+    for arcname, path in members:
+        try:
+            f = open(path, 'rb')
+        except OSError:
+            # (내보내는 사이 삭제된 파일/정리된 블롭은 건너뜀)
+            continue
+        with f:
+            st = os.fstat(f.fileno())
+            yield from emit_member(arcname, st.st_size, st.st_mtime, iter(lambda: f.read(CHUNK_SIZE), b""))
+
+    yield from emit_member("cache/ocr_manifest.json", len(manifest_bytes), started, [manifest_bytes])
+    summary = json.dumps({"version": EXPORT_VERSION, "user": user_id,
+                          "created_at": time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(started)),
+                          "files": hashes}, ensure_ascii=False, indent=2).encode('utf-8')
+    yield from emit_member("export.json", len(summary), started, [summary])
+    # (tar 종료 블록 2개 + gzip 마무리)
+    yield from emit(b"\0" * (tarfile.BLOCKSIZE * 2))
+    tail = compressor.flush()
+    if tail:
+        yield tail
+    print(f"✅ [Export] '{user_id}' 내보내기 완료 ({len(hashes)}개 항목)")
+
+
+def _copy_hashed(source, target_path):
+    """ 스트림을 파일로 복사하면서 sha256을 계산합니다. """
+    digest = hashlib.sha256()
+    with open(target_path, 'wb') as out:
+        for chunk in iter(lambda: source.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+            out.write(chunk)
+    return digest.hexdigest()
+
+
+def _blob_text_hash(path, compressed):
+    """ 블롭 이름(=텍스트 내용 해시) 검증용: 압축 블롭은 풀면서 해시 """
+    digest = hashlib.sha256()
+    with (gzip.open(path, 'rb') if compressed else open(path, 'rb')) as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _staging_name(arcname):
+    """ 허용된 보관 이름만 통과 (경로 조작 방지). 반환: (종류, 이름) 또는 None """
+    kind, _, name = arcname.partition("/")
+    if kind == "data" and name and name == os.path.basename(name) and storage.allowed_file(name):
+        return kind, name
+    if kind == "cache" and name in {f"{t}.json" for t in CACHE_TYPES}:
+        return kind, name
+    if kind == "blobs" and _BLOB_NAME.match(name):
+        return kind, name
+    if arcname == "export.json":
+        return "meta", arcname
+    return None
+
+
+def import_archive(user_id, fileobj):
+    """
+    tar.gz 스트림을 현재 사용자 폴더로 가져옵니다.
+    반환: {"data": n, "blobs_written": n, "blobs_reused": n, "data_reused": n, "qa": n, "odap": n,
+          "stale_entries": n (원본과 맞지 않아 버린 추출 항목), "skipped": [...]}
+    검증 실패 시 아무것도 반영하지 않고 ArchiveError를 던집니다.
+    """
+    data_dir = storage.get_user_data_path(user_id)
+    blob_dir = storage.get_user_blob_path(user_id)
+    staging = tempfile.mkdtemp(prefix=f"import_{user_id}_", dir=storage.BASE_CACHE_DIR)
+    staged, hashes, reused, skipped, meta = {}, {}, set(), [], None
+    try:
+        try:
+            with tarfile.open(fileobj=fileobj, mode="r|gz") as tar:
+                for count, member in enumerate(tar):
+                    if count >= MAX_IMPORT_MEMBERS:
+                        raise ArchiveError("보관 파일 항목이 너무 많습니다.")
+                    target = _staging_name(member.name) if member.isfile() else None
+                    if target is None:
+                        skipped.append(member.name)
+                        continue
+                    kind, name = target
+                    if kind == "blobs" and os.path.exists(os.path.join(blob_dir, name)):
+                        # 같은 이름 = 같은 내용 해시 -> 이미 있는 블롭 재사용 (읽지 않고 건너뜀)
+                        reused.add(member.name)
+                        continue
+                    if kind == "meta":
+                        meta = json.loads(tar.extractfile(member).read(CHUNK_SIZE * 16).decode('utf-8'))
+                        continue
+                    staged_path = os.path.join(staging, f"{len(staged):06d}")
+                    hashes[member.name] = _copy_hashed(tar.extractfile(member), staged_path)
+                    staged[member.name] = staged_path
+        except (tarfile.TarError, EOFError, OSError, zlib.error, ValueError) as e:
+            raise ArchiveError(f"보관 파일을 읽을 수 없습니다: {e}")
+
+        _validate(meta, staged, hashes, reused, blob_dir)
+        return _commit(user_id, data_dir, blob_dir, staged, hashes, reused, skipped)
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+
+
+def _validate(meta, staged, hashes, reused, blob_dir):
+    if not isinstance(meta, dict) or meta.get("version") != EXPORT_VERSION or not isinstance(meta.get("files"), dict):
+        raise ArchiveError("export.json이 없거나 지원하지 않는 형식입니다.")
+    expected = meta["files"]
+    for arcname, digest in hashes.items():
+        if expected.get(arcname) != digest:
+            raise ArchiveError(f"해시 불일치: {arcname}")
+    missing = [name for name in expected if name not in hashes and name not in reused]
+    if missing:
+        raise ArchiveError(f"보관 파일에 빠진 항목이 있습니다: {missing[:5]}")
+    for arcname, path in staged.items():
+        if arcname.startswith("blobs/"):
+            name = arcname[len("blobs/"):]
+            if _blob_text_hash(path, name.endswith(".gz")) != name.split(".", 1)[0]:
+                raise ArchiveError(f"블롭 내용이 이름(해시)과 다릅니다: {arcname}")
+
+
+def _load_staged_json(staged, arcname, default):
+    path = staged.get(arcname)
+    if not path:
+        return default
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except ValueError:
+        raise ArchiveError(f"{arcname}을 읽을 수 없습니다.")
+
+
+def _commit(user_id, data_dir, blob_dir, staged, hashes, reused, skipped):
+    report = {"data": 0, "data_reused": 0, "blobs_written": 0, "blobs_reused": len(reused), "qa": 0, "odap": 0,
+              "stale_entries": 0, "skipped": skipped}
+    manifest = _load_staged_json(staged, "cache/ocr_manifest.json", {})
+    qa_cache = _load_staged_json(staged, "cache/qa.json", {})
+    odap_items = storage._migrate_odapnote(_load_staged_json(staged, "cache/odap.json", []))
+
+    stale = set()
+    with storage.cache_file_lock(storage.get_user_cache_path(user_id, "ocr_manifest")):
+        for arcname, path in staged.items():
+            kind, name = arcname.split("/", 1)
+            if kind == "blobs":
+                if os.path.exists(os.path.join(blob_dir, name)):
+                    report["blobs_reused"] += 1
+                else:
+                    os.replace(path, os.path.join(blob_dir, name))
+                    report["blobs_written"] += 1
+            elif kind == "data":
+                target = os.path.join(data_dir, name)
+                if os.path.exists(target) and storage._file_sha256(target) == hashes[arcname]:
+                    report["data_reused"] += 1
+                else:
+                    os.replace(path, target)
+                    report["data"] += 1
+                entry = manifest.get(name)
+                if not entry:
+                    continue
+                if entry.get("source_hash") != hashes[arcname]:
+                    # (추출 결과가 이 원본 내용의 것이 아님 -> 항목을 버리고 다시 추출하게 함)
+                    del manifest[name]
+                    stale.add(name)
+                    continue
+                if entry.get("source_mtime_ns"):
+                    # (추출 당시 mtime으로 맞춰 두면 _source_matches가 해시 재계산 없이 바로 통과)
+                    os.utime(target, ns=(entry["source_mtime_ns"], entry["source_mtime_ns"]))
+
+        imported = {name for name in manifest if f"data/{name}" in staged}
+        report["stale_entries"] = len(stale)
+        def mutate(current):
+            for name in imported:
+                current[name] = manifest[name]
+            for name in stale:
+                current.pop(name, None)
+            return current
+        current = storage.update_ocr_manifest(user_id, mutate)
+        storage._collect_unused_blobs(user_id, current)
+
+    if qa_cache:
+        storage.update_qa_cache(user_id, lambda cache: cache.update(qa_cache))
+        report["qa"] = len(qa_cache)
+    if odap_items:
+        with storage.cache_file_lock(storage.get_user_cache_path(user_id, "odap")):
+            items = storage.load_odapnote(user_id)
+            known = {item.get("id") for item in items}
+            new_items = [item for item in odap_items if item.get("id") not in known]
+            storage.save_odapnote(user_id, items + new_items)
+            report["odap"] = len(new_items)
+    print(f"✅ [Import] '{user_id}' 가져오기 완료: {report}")
+    return report
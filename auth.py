@@ -1,35 +1,16 @@
-import os
-import json
-import threading
 from datetime import datetime  # [!! ★★★ 추가 ★★★ !!]
 from flask import Blueprint, request, jsonify, session, redirect, url_for, flash, render_template
 from werkzeug.security import generate_password_hash, check_password_hash
+from user_store import UserStore
+import warmup
 
 # 'auth'라는 이름의 Blueprint(청사진)를 생성합니다.
 auth_bp = Blueprint('auth', __name__)
 
 USERS_FILE = "users.json"
-# users.json 파일 접근을 위한 전용 잠금(lock)입니다.
-auth_lock = threading.Lock()
-
-def load_users():
-    """사용자 데이터를 스레드 안전하게 불러옵니다."""
-    with auth_lock:
-        if not os.path.exists(USERS_FILE):
-            with open(USERS_FILE, 'w', encoding='utf-8') as f:
-                json.dump({}, f)
-            return {}
-        try:
-            with open(USERS_FILE, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except json.JSONDecodeError:
-            return {}
-
-def save_users(users_data):
-    """사용자 데이터를 스레드 안전하게 저장합니다."""
-    with auth_lock:
-        with open(USERS_FILE, 'w', encoding='utf-8') as f:
-            json.dump(users_data, f, ensure_ascii=False, indent=4)
+# [!! ★★★ 변경 ★★★ !!]
+# users.json 전체를 읽고 쓰던 방식 -> SQLite 인덱스 저장소 (users.json은 최초 1회 자동 이전)
+user_store = UserStore(legacy_json=USERS_FILE)
 
 @auth_bp.route("/login_folder", methods=["POST"])
 def login_folder():
@@ -41,15 +22,17 @@ def login_folder():
         flash("폴더 ID와 비밀번호를 모두 입력해야 합니다.")
         return redirect(url_for('index'))
 
-    users = load_users()
+    user = user_store.get_user(folder_id)
 
     # 1. ID가 이미 있는 경우 (로그인 시도)
-    if folder_id in users:
-        if check_password_hash(users[folder_id]['password_hash'], password):
+    if user:
+        if check_password_hash(user['password_hash'], password):
             # [성공] 비밀번호 일치
             session['folder_id'] = folder_id # 쿠키(세션)에 사용자 ID 저장
             flash(f"'{folder_id}' 폴더로 로그인했습니다.")
             print(f"✅ [Auth] '{folder_id}' 로그인 성공.")
+            # [!! 신규 !!] 첫 요청 전에 캐시/자료를 미리 읽어 둠 (백그라운드)
+            warmup.start(folder_id)
         else:
             # [실패] 비밀번호 불일치
             flash("비밀번호가 틀렸습니다.")
@@ -71,25 +54,21 @@ def create_folder():
         flash("폴더 ID와 비밀번호를 모두 입력해야 합니다.")
         return redirect(url_for('index'))
 
-    users = load_users()
-
     # 1. ID가 이미 있는 경우
-    if folder_id in users:
+    if user_store.get_user(folder_id):
         flash("이미 존재하는 폴더 ID입니다. 다른 ID를 사용해주세요.")
         print(f"⚠️ [Auth] '{folder_id}' 생성 실패: 이미 존재하는 ID")
+    # 2. ID가 없는 경우 (신규 생성) - 동시에 같은 ID를 만들면 한쪽만 성공
+    elif not user_store.create_user(folder_id, generate_password_hash(password),
+                                    datetime.now().strftime('%Y-%m-%d %H:%M:%S')):
+        flash("이미 존재하는 폴더 ID입니다. 다른 ID를 사용해주세요.")
+        print(f"⚠️ [Auth] '{folder_id}' 생성 실패: 동시에 생성된 ID")
     else:
-        # 2. ID가 없는 경우 (신규 생성)
-        new_user = {
-            "password_hash": generate_password_hash(password),
-            "created_at": datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        }
-        users[folder_id] = new_user
-        save_users(users)
-        
         # [성공] 생성 후 바로 로그인 처리
         session['folder_id'] = folder_id
         flash(f"'{folder_id}' 폴더를 새로 만들고 로그인했습니다.")
         print(f"✅ [Auth] '{folder_id}' 생성 및 로그인 성공.")
+        warmup.start(folder_id)
 
     return redirect(url_for('index'))
 
@@ -0,0 +1,180 @@
+"""
+LLM 복원력(재시도 / 회로 차단기 / 헤지) 동작 확인 벤치마크
+
+  python bench/bench_resilience.py [--hedge-calls 20]
+
+API 키 없이 가짜 백엔드(fake_llm.FakeBackend, AITER_FAKE_LLM 형식 설정)로 llm.generate를 호출하고
+metrics 카운터 / 백엔드 호출 수 / 사용량 원장을 비교합니다. 하나라도 어긋나면 종료 코드 1.
+
+시나리오
+  retry         fail_first=2            -> 3번째 시도에 성공, 재시도 2회
+  retry_exhaust fail_first=10           -> 최대 시도 횟수만큼만 호출하고 LLMUnavailable
+  breaker       연속 실패 -> open (백엔드 호출 없이 즉시 실패) -> half_open 시험 실패 -> open
+                -> half_open 시험 성공 -> closed
+  hedge         slow_rate=0.5           -> 헤지 승리 발생, 복제 호출도 원장에 1줄씩 기록, 슬롯 모두 반납
+  hedge_skip    사용자 동시 실행 1      -> 슬롯이 없으면 복제하지 않음 (백엔드 호출 수 = 요청 수)
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+failures = []
+
+
+def check(name, condition, detail=""):
+    print(f"  {'ok  ' if condition else 'FAIL'} {name}{f'  ({detail})' if detail else ''}")
+    if not condition:
+        failures.append(name)
+
+
+def counter(name, **labels):
+    import metrics
+    return metrics.snapshot()["counters"].get(metrics._key(name, labels), 0)
+
+
+def use_backend(options):
+    """ AITER_FAKE_LLM 문자열로 가짜 백엔드를 새로 만들고 회로 차단기/재시도 정책을 초기화합니다. """
+    import llm
+    import metrics
+    import resilience
+    from fake_llm import FakeBackend
+    os.environ["AITER_FAKE_LLM"] = options
+    backend = FakeBackend.from_env()
+    llm.set_backend(backend)
+    resilience.breaker = resilience.CircuitBreaker("gemini", failure_threshold=3, reset_timeout=0.3)
+    resilience.retry_policy = resilience.RetryPolicy(max_attempts=3, base_delay=0.01, max_delay=0.05)
+    # (헤지 지연은 최근 p90 대신 0.1초로 고정: 느린 호출이 섞인 p90이면 헤지가 거의 일어나지 않음)
+    llm._hedge_delay = lambda action_type: 0.1
+    metrics.reset()
+    return backend
+
+
+def ledger_count(user_id):
+    import ledger
+    return sum(1 for entry in ledger.iter_entries(1) if entry.get("u") == user_id)
+
+
+def scenario_retry():
+    import llm
+    print("\n[retry]")
+    backend = use_backend("fail_first=2,latency=0.01")
+    response = llm.generate("extract_answer", "system", "question", user_id="retry")
+    check("3번째 시도에 성공", response.text.startswith("[fake:"), f"백엔드 호출 {backend.calls}회")
+    check("백엔드 호출 3회", backend.calls == 3)
+    check("재시도 2회", counter("llm_retries_total", action="extract_answer") == 2)
+    check("원장 1줄", ledger_count("retry") == 1)
+
+
+def scenario_retry_exhaust():
+    import llm
+    print("\n[retry_exhaust]")
+    backend = use_backend("fail_first=10,latency=0.01")
+    try:
+        llm.generate("extract_answer", "system", "question", user_id="exhaust")
+        raised = False
+    except llm.LLMUnavailable:
+        raised = True
+    check("LLMUnavailable", raised)
+    check("최대 시도 횟수(3)만큼 호출", backend.calls == 3, f"{backend.calls}회")
+
+
+def scenario_breaker():
+    import llm
+    import resilience
+    print("\n[breaker]")
+    backend = use_backend("fail_first=4,latency=0.01")
+    # (재시도 없이 한 번씩: 연속 실패 3회에 open)
+    resilience.retry_policy = resilience.RetryPolicy(max_attempts=1)
+
+    def call():
+        try:
+            llm.generate("extract_answer", "system", "question", user_id="breaker")
+            return "ok"
+        except llm.LLMUnavailable as e:
+            return "circuit" if "멈췄습니다" in str(e) else "error"
+
+    results = [call() for _ in range(3)]
+    check("연속 실패 3회 -> open", resilience.breaker.state == "open", f"{results}")
+    calls_before = backend.calls
+    check("open 동안 즉시 실패", call() == "circuit" and backend.calls == calls_before)
+
+    time.sleep(0.35)
+    check("half_open 시험 호출 실패 -> 다시 open", call() == "error" and resilience.breaker.state == "open")
+    time.sleep(0.35)
+    check("half_open 시험 호출 성공 -> closed", call() == "ok" and resilience.breaker.state == "closed")
+    check("상태 전이 open 2회 / half_open 2회 / closed 1회",
+          (counter("llm_circuit_transitions_total", circuit="gemini", to="open"),
+           counter("llm_circuit_transitions_total", circuit="gemini", to="half_open"),
+           counter("llm_circuit_transitions_total", circuit="gemini", to="closed")) == (2, 2, 1))
+
+
+def _wait_idle(backend, expected_calls, timeout=5.0):
+    """ 헤지로 버려진 호출까지 모두 끝날 때까지 대기 """
+    from scheduler import scheduler
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if scheduler._running == 0 and backend.calls >= expected_calls:
+            return True
+        time.sleep(0.05)
+    return False
+
+
+def scenario_hedge(calls):
+    import llm
+    from scheduler import scheduler
+    print("\n[hedge]")
+    backend = use_backend("slow_rate=0.5,slow_latency=1.0,latency=0.02,seed=7")
+    for _ in range(calls):
+        llm.generate("extract_errors", "system", "answers", user_id="hedge")
+    hedged = counter("llm_hedged_total", action="extract_errors")
+    wins = counter("llm_hedge_wins_total", action="extract_errors")
+    idle = _wait_idle(backend, calls + hedged)
+    check("헤지 발생", hedged > 0, f"{hedged}/{calls}회")
+    check("헤지 승리 발생", wins > 0, f"{wins}회")
+    check("백엔드 호출 = 요청 + 헤지", backend.calls == calls + hedged, f"{backend.calls}회")
+    check("원장 = 백엔드 호출 (복제 호출도 기록)", ledger_count("hedge") == backend.calls, f"{ledger_count('hedge')}줄")
+    check("슬롯 모두 반납", idle and scheduler._running == 0)
+
+
+def scenario_hedge_skip(calls):
+    import llm
+    from scheduler import scheduler
+    print("\n[hedge_skip]")
+    backend = use_backend("slow_rate=1,slow_latency=0.3,seed=7")
+    user_concurrency, scheduler.user_concurrency = scheduler.user_concurrency, 1
+    try:
+        for _ in range(calls):
+            llm.generate("extract_errors", "system", "answers", user_id="hedge_skip")
+    finally:
+        scheduler.user_concurrency = user_concurrency
+    _wait_idle(backend, calls)
+    check("복제 없음 (사용자 슬롯 부족)", counter("llm_hedged_total", action="extract_errors") == 0)
+    check("건너뛴 헤지 집계", counter("llm_hedge_skipped_total", action="extract_errors") == calls)
+    check("백엔드 호출 = 요청", backend.calls == calls, f"{backend.calls}회")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--hedge-calls", type=int, default=20)
+    args = parser.parse_args()
+
+    # 실제 cache/ledger를 건드리지 않도록 임시 폴더에서 실행
+    os.chdir(tempfile.mkdtemp(prefix="aiter_bench_resilience_"))
+    os.environ["AITER_LLM_BACKEND"] = "fake"
+    started = time.perf_counter()
+    scenario_retry()
+    scenario_retry_exhaust()
+    scenario_breaker()
+    scenario_hedge(args.hedge_calls)
+    scenario_hedge_skip(max(3, args.hedge_calls // 4))
+    print(f"\n{'모두 통과' if not failures else f'실패 {len(failures)}건: {failures}'} ({time.perf_counter() - started:.1f}s)")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
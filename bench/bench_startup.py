@@ -0,0 +1,64 @@
+"""
+서버 시작 시간 벤치마크
+
+  python bench/bench_startup.py [--runs 5]
+
+각 실행을 새 파이썬 프로세스에서 측정합니다. (import 캐시 영향 제거)
+  - import_ms       : `import app` 소요 시간
+  - first_request_ms: 앱 생성 후 첫 요청(GET /) 응답까지의 시간
+  - heavy_modules   : 시작 직후 이미 import된 무거운 모듈 (지연 로드가 깨졌는지 확인용)
+"""
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+import tempfile
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ["google.generativeai", "fitz", "pptx", "openpyxl", "numpy", "PIL"]
+
+# 자식 프로세스에서 실행할 측정 코드
+CHILD_SCRIPT = r"""
+import sys, time, json
+t0 = time.perf_counter()
+import app
+t1 = time.perf_counter()
+client = app.app.test_client()
+response = client.get("/")
+t2 = time.perf_counter()
+print(json.dumps({
+    "import_ms": (t1 - t0) * 1000,
+    "first_request_ms": (t2 - t1) * 1000,
+    "status": response.status_code,
+    "heavy_modules": [m for m in HEAVY if m in sys.modules],
+}))
+"""
+
+
+def run_once():
+    env = dict(os.environ, PYTHONPATH=REPO_ROOT + os.pathsep + os.environ.get("PYTHONPATH", ""))
+    script = f"HEAVY = {HEAVY_MODULES!r}\n" + CHILD_SCRIPT
+    # 실제 data/cache 폴더를 건드리지 않도록 임시 폴더에서 실행
+    with tempfile.TemporaryDirectory() as workdir:
+        output = subprocess.run([sys.executable, "-c", script], cwd=workdir, env=env,
+                                capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    results = [run_once() for _ in range(args.runs)]
+    for key in ("import_ms", "first_request_ms"):
+        values = [r[key] for r in results]
+        print(f"{key:<18} median={statistics.median(values):8.1f}  min={min(values):8.1f}  max={max(values):8.1f}")
+    print(f"{'heavy_modules':<18} {results[-1]['heavy_modules'] or '(none)'}")
+    print(f"{'status':<18} {results[-1]['status']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,250 @@
+"""
+저장소(storage.py) 마이크로 벤치마크
+
+  python bench/bench_storage.py [--scales small,medium] [--repeat 3] [--json result.json]
+
+합성 사용자를 규모별로 만들어 storage 함수들을 단독으로 측정합니다. (LLM 호출 없음)
+  scale   qa 항목   추출 텍스트   오답노트
+  small       10        1 MB          1
+  medium    1000       50 MB        100
+  large    10000      500 MB       1000   (디스크/시간이 많이 들어 기본 목록에서 제외)
+
+측정 항목 (각 함수별)
+  - wall_ms    : --repeat 회 반복의 중앙값 (tracemalloc 없이 측정)
+  - peak_mb    : tracemalloc 기준 최대 파이썬 메모리 (별도 1회 실행)
+  - written_kb : 실행 중 쓴 바이트 (/proc/self/io wchar, 없으면 작업 폴더 크기 변화)
+
+측정 대상
+  load_qa_cache (JSON 캐시 없이 / 적중), save_qa_cache, get_categorized_cache, load_odapnote,
+  load_all_text_from_data (캐시 없이 / 적중), get_supported_files,
+  get_text_from_single_file (형식별: txt/pdf/pptx/xlsx, 추출 없음(cold) / 블롭 캐시(warm))
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import statistics
+import tracemalloc
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+SCALES = {
+    "small": {"qa": 10, "text_mb": 1, "odap": 1},
+    "medium": {"qa": 1000, "text_mb": 50, "odap": 100},
+    "large": {"qa": 10000, "text_mb": 500, "odap": 1000},
+}
+# 텍스트 파일 1개 크기 (이 크기의 txt 여러 개로 text_mb를 채움)
+TEXT_FILE_MB = 5
+WORDS = ("relation tuple schema index query transaction commit rollback buffer page log btree hash join "
+         "정규화 함수 종속성 트랜잭션 회복 동시성 제어 잠금 인덱스 질의 최적화 관계 대수").split()
+ACTION_TYPES = ["ask", "extract_all", "quiz_all", "grade_quiz", "generate_mindmap", "quiz_file"]
+USER_ID = "bench_user"
+# (형식별 샘플은 별도 사용자에 두어 load_all_text_from_data 측정에 섞이지 않게 함)
+FORMAT_USER_ID = "bench_formats"
+
+
+def _setup(workdir):
+    os.chdir(workdir)
+    import storage
+    return storage
+
+
+def _paragraph(rng, words=80):
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+
+def _write_text_file(path, size_bytes, rng):
+    # (같은 문단을 재사용해 생성 시간을 줄이되, 쪽 번호/머리글을 넣어 정규화 경로도 실제처럼 돌게 함)
+    paragraphs = [_paragraph(rng) for _ in range(64)]
+    written, page = 0, 1
+    with open(path, "w", encoding="utf-8") as f:
+        while written < size_bytes:
+            block = f"CS301 데이터베이스 - 강의자료\n{rng.choice(paragraphs)}\n{rng.choice(paragraphs)}\n{page}\n\n"
+            f.write(block)
+            written += len(block.encode("utf-8"))
+            page += 1
+
+
+def _make_format_samples(storage, rng):
+    """ 형식별 get_text_from_single_file 측정용 파일 (각 수 MB 규모) """
+    import fitz
+    import pptx
+    import openpyxl
+    data_dir = storage.get_user_data_path(FORMAT_USER_ID)
+    _write_text_file(os.path.join(data_dir, "fmt_sample.txt"), 2 * 1024 * 1024, rng)
+
+    doc = fitz.open()
+    for page_number in range(200):
+        page = doc.new_page()
+        page.insert_textbox(fitz.Rect(50, 50, 550, 800), _paragraph(rng, 300), fontsize=9)
+    doc.save(os.path.join(data_dir, "fmt_sample.pdf"))
+
+    prs = pptx.Presentation()
+    for _ in range(200):
+        slide = prs.slides.add_slide(prs.slide_layouts[1])
+        slide.shapes.title.text = _paragraph(rng, 6)
+        slide.placeholders[1].text = _paragraph(rng, 120)
+    prs.save(os.path.join(data_dir, "fmt_sample.pptx"))
+
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet("data")
+    for row in range(20000):
+        ws.append([row, rng.choice(WORDS), rng.random(), _paragraph(rng, 8)])
+    wb.save(os.path.join(data_dir, "fmt_sample.xlsx"))
+    return ["fmt_sample.txt", "fmt_sample.pdf", "fmt_sample.pptx", "fmt_sample.xlsx"]
+
+
+def build_user(storage, scale, rng):
+    """ 규모에 맞는 합성 사용자 생성: qa 캐시, 오답노트, 추출 텍스트(txt 파일 + 블롭) """
+    config = SCALES[scale]
+    qa_cache = {}
+    for i in range(config["qa"]):
+        action_type = ACTION_TYPES[i % len(ACTION_TYPES)]
+        qa_cache[f"{action_type}_{i:06d}"] = {
+            "answer": _paragraph(rng, 150), "question_text": _paragraph(rng, 10),
+            "action_type": action_type, "timestamp": f"2026-01-{1 + i % 28:02d} 12:{i % 60:02d}:00",
+        }
+    storage.save_qa_cache(USER_ID, qa_cache)
+
+    items = [storage.make_odap_item(f"<b>문제 {i}</b> {_paragraph(rng, 40)}", question=_paragraph(rng, 12),
+                                    answer=rng.choice("ABCD"), concepts=rng.sample(WORDS, 2))
+             for i in range(config["odap"])]
+    storage.save_odapnote(USER_ID, items)
+
+    data_dir = storage.get_user_data_path(USER_ID)
+    remaining = config["text_mb"] * 1024 * 1024
+    index = 0
+    while remaining > 0:
+        size = min(remaining, TEXT_FILE_MB * 1024 * 1024)
+        _write_text_file(os.path.join(data_dir, f"lecture_{index:03d}.txt"), size, rng)
+        remaining -= size
+        index += 1
+    # (블롭/매니페스트를 미리 만들어 load_all_text_from_data는 '추출 완료' 상태에서 측정)
+    storage.load_all_text_from_data(USER_ID)
+    return qa_cache
+
+
+def _dir_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+def _write_counter():
+    try:
+        with open("/proc/self/io") as f:
+            for line in f:
+                if line.startswith("wchar:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def measure(func, repeat, setup=None):
+    """ (중앙값 ms, 최대 메모리 MB, 쓴 KB) """
+    times = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        started = time.perf_counter()
+        func()
+        times.append((time.perf_counter() - started) * 1000)
+
+    if setup:
+        setup()
+    before_io, before_size = _write_counter(), _dir_size(".")
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    after_io = _write_counter()
+    written = (after_io - before_io) if before_io is not None and after_io is not None else max(0, _dir_size(".") - before_size)
+    return statistics.median(times), peak / (1024 * 1024), written / 1024
+
+
+def run_scale(scale, repeat, with_formats):
+    workdir = tempfile.mkdtemp(prefix=f"aiter_bench_{scale}_")
+    storage = _setup(workdir)
+    import normalize
+    rng = random.Random(42)
+
+    started = time.perf_counter()
+    qa_cache = build_user(storage, scale, rng)
+    print(f"\n[{scale}] 합성 사용자 생성 {time.perf_counter() - started:.1f}s  ({workdir})")
+
+    def clear_json_cache():
+        # (프로세스 내 JSON 캐시를 비워 매번 디스크에서 읽고 파싱하는 비용을 측정)
+        storage._json_cache.clear()
+
+    def clear_folder_caches():
+        normalize._cache.clear()
+        storage._corpus_cache.clear()
+
+    def clear_normalize():
+        # (조립된 자료 텍스트 캐시와 문서별 전처리 캐시까지 비워 정규화 + 조립 비용을 측정)
+        clear_folder_caches()
+        normalize._prepared.clear()
+        normalize._prepared_size = 0
+    cases = [
+        ("load_qa_cache", lambda: storage.load_qa_cache(USER_ID), clear_json_cache),
+        ("load_qa_cache (캐시 적중)", lambda: storage.load_qa_cache(USER_ID), None),
+        ("save_qa_cache", lambda: storage.save_qa_cache(USER_ID, qa_cache), None),
+        ("get_categorized_cache", lambda: storage.get_categorized_cache(qa_cache), None),
+        ("load_odapnote", lambda: storage.load_odapnote(USER_ID), clear_json_cache),
+        ("get_supported_files", lambda: storage.get_supported_files(USER_ID), None),
+        ("load_all_text_from_data", lambda: storage.load_all_text_from_data(USER_ID), clear_normalize),
+        # (파일 1개 업로드/삭제 직후: 문서별 지문은 재사용하고 중복 대조만 다시)
+        ("load_all_text_from_data (문서 캐시 적중)", lambda: storage.load_all_text_from_data(USER_ID), clear_folder_caches),
+        ("load_all_text_from_data (캐시 적중)", lambda: storage.load_all_text_from_data(USER_ID), None),
+    ]
+    if with_formats:
+        for filename in _make_format_samples(storage, rng):
+            fmt = filename.rsplit(".", 1)[1]
+            drop = (lambda name=filename: storage.delete_ocr_entry(FORMAT_USER_ID, name))
+            cases.append((f"get_text_from_single_file [{fmt}] cold",
+                          lambda name=filename: storage.get_text_from_single_file(FORMAT_USER_ID, name), drop))
+            cases.append((f"get_text_from_single_file [{fmt}] warm",
+                          lambda name=filename: storage.get_text_from_single_file(FORMAT_USER_ID, name), None))
+
+    rows = []
+    for name, func, setup in cases:
+        wall_ms, peak_mb, written_kb = measure(func, repeat, setup)
+        rows.append({"scale": scale, "op": name, "wall_ms": round(wall_ms, 2),
+                     "peak_mb": round(peak_mb, 2), "written_kb": round(written_kb, 1)})
+        print(f"  {name:<42} {wall_ms:10.2f} ms  {peak_mb:9.2f} MB  {written_kb:10.1f} KB written")
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scales", default="small,medium", help="쉼표로 구분 (small, medium, large)")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--no-formats", action="store_true", help="형식별 get_text_from_single_file 측정 생략")
+    parser.add_argument("--json", help="결과를 JSON 파일로 저장")
+    args = parser.parse_args()
+
+    rows = []
+    for scale in filter(None, args.scales.split(",")):
+        if scale not in SCALES:
+            parser.error(f"알 수 없는 scale: {scale}")
+        rows.extend(run_scale(scale, args.repeat, with_formats=not args.no_formats))
+        os.chdir(REPO_ROOT)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(rows, f, ensure_ascii=False, indent=2)
+        print(f"\n결과 저장: {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+멀티 프로세스 저장소 스트레스 테스트
+
+  python bench/stress_storage_multiproc.py [--workers 8] [--writes 50]
+
+gunicorn 워커 여러 개가 같은 사용자 캐시를 동시에 고치는 상황을 흉내 냅니다.
+  - 작성자 프로세스 N개가 각자 고유 키로 put_qa_entry / record_odap_items를 반복
+  - 읽기 프로세스 1개가 계속 load_qa_cache를 호출하며 깨진 JSON(=빈 캐시)을 보는지 확인
+끝난 뒤 잃어버린 업데이트가 없는지(키 개수 == N * writes) 검사하고, 실패 시 종료 코드 1을 반환합니다.
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+import multiprocessing
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+USER_ID = "stress_user"
+
+
+def _setup(workdir):
+    os.chdir(workdir)
+    import storage
+    return storage
+
+
+def writer(workdir, worker_index, writes, start_event):
+    storage = _setup(workdir)
+    start_event.wait()
+    for i in range(writes):
+        storage.put_qa_entry(USER_ID, f"w{worker_index}_{i}", {
+            "answer": "x" * 200, "question_text": f"q{i}", "action_type": "ask", "timestamp": f"{i:08d}"})
+        if i % 5 == 0:
+            storage.record_odap_items(USER_ID, [storage.make_odap_item(f"문제 {worker_index}-{i}")])
+
+
+def reader(workdir, stop_event, start_event, result_queue):
+    storage = _setup(workdir)
+    start_event.wait()
+    reads, empty_after_first_write = 0, 0
+    seen_data = False
+    while not stop_event.is_set():
+        qa_cache = storage.load_qa_cache(USER_ID)
+        reads += 1
+        if qa_cache:
+            seen_data = True
+        elif seen_data:
+            empty_after_first_write += 1
+    result_queue.put((reads, empty_after_first_write))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--writes", type=int, default=50)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="aiter_stress_")
+    ctx = multiprocessing.get_context("spawn")
+    start_event, stop_event, result_queue = ctx.Event(), ctx.Event(), ctx.Queue()
+
+    writers = [ctx.Process(target=writer, args=(workdir, i, args.writes, start_event)) for i in range(args.workers)]
+    reader_process = ctx.Process(target=reader, args=(workdir, stop_event, start_event, result_queue))
+    for process in writers + [reader_process]:
+        process.start()
+
+    started = time.perf_counter()
+    start_event.set()
+    for process in writers:
+        process.join()
+    elapsed = time.perf_counter() - started
+    stop_event.set()
+    reads, torn_reads = result_queue.get()
+    reader_process.join()
+
+    storage = _setup(workdir)
+    qa_cache = storage.load_qa_cache(USER_ID)
+    odap_items = storage.load_odapnote(USER_ID)
+    expected_qa = args.workers * args.writes
+    expected_odap = args.workers * len(range(0, args.writes, 5))
+
+    print(f"writers={args.workers} writes/worker={args.writes} elapsed={elapsed:.2f}s")
+    print(f"qa entries   : {len(qa_cache)} / {expected_qa}")
+    print(f"odap items   : {len(odap_items)} / {expected_odap}")
+    print(f"reader       : {reads} reads, {torn_reads} empty/torn reads after first write")
+
+    ok = len(qa_cache) == expected_qa and len(odap_items) == expected_odap and torn_reads == 0
+    print("RESULT: " + ("OK" if ok else "FAILED (lost updates or torn reads)"))
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
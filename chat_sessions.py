@@ -0,0 +1,181 @@
+import os
+import time
+import secrets
+import threading
+
+import storage
+import prompts
+import llm
+import metrics
+import normalize
+
+# ----------------------------
+# [!! ★★★ 신규 ★★★ !!]
+# 보조 질문창(플로팅 위젯) 대화 세션
+# 예전: 매 질문마다 브라우저가 메인 답변 HTML 전체를 previous_answer로 다시 보내고, 이전 대화는 전혀 기억하지 않음
+# 지금: 서버가 세션 ID별로 대화를 보관 (cache/chat_<user>.json)
+#   {세션 ID: {"context": 메인 화면 맥락(바뀔 때만 전송), "summary": 오래된 대화 요약,
+#             "turns": [{"n": 번호, "q": 질문, "a": 답변}, ...], "next": 다음 번호, "updated": 시각}}
+#   - 최근 턴은 원문 그대로, 넘치면 오래된 턴부터 LLM으로 요약에 접어 넣음 (백그라운드)
+#     -> 대화가 아무리 길어져도 프롬프트 = 맥락 + 요약 + 최근 턴 몇 개
+# 설정:
+#   AITER_CHAT_RECENT_TURNS=6       원문으로 유지할 최대 턴 수
+#   AITER_CHAT_HISTORY_TOKENS=3000  원문으로 유지할 최대 토큰(추정)
+#   AITER_CHAT_MAX_SESSIONS=20      사용자별 보관 세션 수 (오래 안 쓴 것부터 삭제)
+# ----------------------------
+
+RECENT_TURNS = int(os.getenv("AITER_CHAT_RECENT_TURNS", "6"))
+HISTORY_TOKENS = int(os.getenv("AITER_CHAT_HISTORY_TOKENS", "3000"))
+MAX_SESSIONS = int(os.getenv("AITER_CHAT_MAX_SESSIONS", "20"))
+# 요약이 계속 실패해도 원문 턴이 이 배수를 넘으면 오래된 턴을 잘라서 요약에 붙임
+HARD_LIMIT_FACTOR = 2
+# 요약 실패 시 잘라 붙이는 답변 길이 / 요약 최대 길이(글자)
+FALLBACK_ANSWER_CHARS = 200
+MAX_SUMMARY_CHARS = 2000
+
+_summarizing = set()
+_summarizing_lock = threading.Lock()
+
+
+def new_session_id():
+    return secrets.token_urlsafe(12)
+
+
+def _new_session():
+    return {"context": "", "summary": "", "turns": [], "next": 1, "updated": time.time()}
+
+
+def _turn_tokens(turn):
+    return normalize.estimate_tokens(turn["q"]) + normalize.estimate_tokens(turn["a"])
+
+
+def _over_budget(turns):
+    return len(turns) > RECENT_TURNS or sum(_turn_tokens(turn) for turn in turns) > HISTORY_TOKENS
+
+
+def _turns_to_fold(turns):
+    """ 요약에 넣을 오래된 턴 (남는 턴이 예산의 절반 이하가 될 때까지, 마지막 턴은 항상 남김) """
+    keep_turns, keep_tokens = max(1, RECENT_TURNS // 2), HISTORY_TOKENS // 2
+    fold = 0
+    while fold < len(turns) - 1:
+        rest = turns[fold:]
+        if len(rest) <= keep_turns and sum(_turn_tokens(turn) for turn in rest) <= keep_tokens:
+            break
+        fold += 1
+    return turns[:fold]
+
+
+def prepare(user_id, session_id, context=None):
+    """
+    질문 직전에 호출. 세션이 없으면 새로 만들고, context가 넘어오면(메인 화면 맥락이 바뀜) 교체합니다.
+    반환: (세션 ID, 세션 사본)
+    """
+    def mutate(sessions):
+        sid = session_id if session_id in sessions else new_session_id()
+        chat = sessions.setdefault(sid, _new_session())
+        if context is not None:
+            chat["context"] = context
+        chat["updated"] = time.time()
+        # (오래 안 쓴 세션 정리)
+        for old_sid in sorted(sessions, key=lambda key: sessions[key].get("updated", 0))[:max(0, len(sessions) - MAX_SESSIONS)]:
+            if old_sid != sid:
+                del sessions[old_sid]
+        return sid, dict(chat, turns=list(chat["turns"]))
+    return storage.update_chat_sessions(user_id, mutate)
+
+
+def build_contents(chat, question_text):
+    """ 최근 턴을 Gemini 멀티턴 contents로 (오래된 대화는 system 프롬프트의 요약으로 들어감) """
+    contents = []
+    for turn in chat["turns"]:
+        contents.append({"role": "user", "parts": [turn["q"]]})
+        contents.append({"role": "model", "parts": [turn["a"]]})
+    contents.append({"role": "user", "parts": [question_text]})
+    return contents
+
+
+def summary_section(chat):
+    return prompts.CHAT_SUMMARY_SECTION.format(summary=chat["summary"]) if chat.get("summary") else ""
+
+
+def append_turn(user_id, session_id, question_text, answer_text):
+    """ 응답이 끝난 턴을 저장하고, 원문 예산을 넘었으면 백그라운드 요약을 시작합니다. """
+    def mutate(sessions):
+        chat = sessions.setdefault(session_id, _new_session())
+        chat["turns"].append({"n": chat["next"], "q": question_text, "a": answer_text})
+        chat["next"] += 1
+        chat["updated"] = time.time()
+        return _over_budget(chat["turns"])
+    if storage.update_chat_sessions(user_id, mutate):
+        start_summarize(user_id, session_id)
+
+
+def _format_turns(turns):
+    return "\n\n".join(f"학생: {turn['q']}\n도우미: {turn['a']}" for turn in turns)
+
+
+def _fallback_summary(summary, turns):
+    lines = [f"- 학생: {turn['q'][:FALLBACK_ANSWER_CHARS]} / 도우미: {turn['a'][:FALLBACK_ANSWER_CHARS]}" for turn in turns]
+    return "\n".join(filter(None, [summary] + lines))[-MAX_SUMMARY_CHARS:]
+
+
+def summarize(user_id, session_id):
+    """ 오래된 턴을 요약에 접어 넣습니다. (LLM 호출은 잠금 밖에서, 반영은 최신 세션 위에) """
+    chat = storage.load_chat_sessions(user_id).get(session_id)
+    if not chat or not _over_budget(chat["turns"]):
+        return False
+    fold = _turns_to_fold(chat["turns"])
+    if not fold:
+        return False
+    started = time.perf_counter()
+    try:
+        system_content = prompts.CHAT_SUMMARIZE_PROMPT.format(summary=chat["summary"] or "(없음)", turns=_format_turns(fold))
+        response = llm.generate("summarize_chat", system_content, "위 대화를 요약해줘.", user_id=user_id)
+        new_summary = response.text.strip()[:MAX_SUMMARY_CHARS]
+    except Exception as e:
+        metrics.incr("chat_summarize_errors_total")
+        # (요약 실패: 원문이 한도를 크게 넘을 때만 잘라 붙여서라도 크기를 묶어 둠)
+        if len(chat["turns"]) <= RECENT_TURNS * HARD_LIMIT_FACTOR:
+            print(f"⚠️ [Chat] '{user_id}/{session_id}' 대화 요약 실패 (다음 턴에 재시도): {e}")
+            return False
+        print(f"⚠️ [Chat] '{user_id}/{session_id}' 대화 요약 실패, 오래된 턴을 잘라 붙입니다: {e}")
+        new_summary = _fallback_summary(chat["summary"], fold)
+    folded_upto = fold[-1]["n"]
+
+    def mutate(sessions):
+        current = sessions.get(session_id)
+        if not current:
+            return False
+        # (요약하는 동안 이미 다른 요약이 반영됐으면 버림)
+        if current["summary"] != chat["summary"]:
+            return False
+        current["summary"] = new_summary
+        current["turns"] = [turn for turn in current["turns"] if turn["n"] > folded_upto]
+        return True
+    applied = storage.update_chat_sessions(user_id, mutate)
+    metrics.observe("chat_summarize_seconds", time.perf_counter() - started)
+    print(f"🗜️ [Chat] '{user_id}/{session_id}' 오래된 대화 {len(fold)}턴 요약 {'완료' if applied else '(버림)'}")
+    return applied
+
+
+def _run_summarize(user_id, session_id):
+    try:
+        summarize(user_id, session_id)
+    except Exception as e:
+        print(f"💥 [Chat] '{user_id}/{session_id}' 요약 작업 오류: {e}")
+    finally:
+        with _summarizing_lock:
+            _summarizing.discard((user_id, session_id))
+
+
+def start_summarize(user_id, session_id):
+    with _summarizing_lock:
+        if (user_id, session_id) in _summarizing:
+            return False
+        _summarizing.add((user_id, session_id))
+    threading.Thread(target=_run_summarize, args=(user_id, session_id), daemon=True).start()
+    return True
+
+
+def delete_session(user_id, session_id):
+    return storage.update_chat_sessions(user_id, lambda sessions: sessions.pop(session_id, None) is not None)
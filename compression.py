@@ -0,0 +1,130 @@
+import os
+import zlib
+import importlib.util
+from flask import request
+
+import metrics
+
+# ----------------------------
+# [!! ★★★ 신규 ★★★ !!]
+# 응답 압축 (Accept-Encoding 협상: br > gzip)
+# - 일반 응답(JSON/HTML): AITER_COMPRESS_MIN_BYTES 이상이면 통째로 압축
+#   (퀴즈/채점/핵심 추출 답변의 <br> 섞인 긴 HTML 문자열, 기록이 모두 들어간 index.html)
+# - 스트리밍 응답(/stream_ask): 청크마다 압축 + flush -> 브라우저가 받는 즉시 풀 수 있어 첫 글자 시각이 그대로
+# - 이미 압축된 형식(tar.gz 내보내기, 이미지)과 정적 파일(send_file 직접 전달)은 건드리지 않음
+# 설정:
+#   AITER_COMPRESS=0             끄기 (훅 자체를 등록하지 않음)
+#   AITER_COMPRESS_MIN_BYTES=1024  AITER_COMPRESS_LEVEL=6 (gzip)  AITER_BROTLI_QUALITY=5
+# brotli는 'brotli' 패키지가 설치된 경우에만 사용합니다. (없으면 gzip)
+# ----------------------------
+
+BROTLI_AVAILABLE = importlib.util.find_spec("brotli") is not None
+
+COMPRESS_ENABLED = os.getenv("AITER_COMPRESS", "1") != "0"
+MIN_BYTES = int(os.getenv("AITER_COMPRESS_MIN_BYTES", "1024"))
+GZIP_LEVEL = int(os.getenv("AITER_COMPRESS_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("AITER_BROTLI_QUALITY", "5"))
+
+COMPRESSIBLE_TYPES = ("text/", "application/json", "application/javascript", "image/svg+xml")
+
+
+class _GzipEncoder:
+    name = "gzip"
+
+    def __init__(self):
+        # (wbits=31: gzip 헤더/트레일러 포함)
+        self._compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+
+    def chunk(self, data):
+        """ 청크 1개를 압축하고 지금까지의 출력을 모두 내보냄 (스트리밍용) """
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self, data=b""):
+        return self._compressor.compress(data) + self._compressor.flush()
+
+
+class _BrotliEncoder:
+    name = "br"
+
+    def __init__(self):
+        import brotli
+        self._compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+
+    def chunk(self, data):
+        return self._compressor.process(data) + self._compressor.flush()
+
+    def finish(self, data=b""):
+        return self._compressor.process(data) + self._compressor.finish()
+
+
+def _choose_encoder():
+    offered = ["br", "gzip"] if BROTLI_AVAILABLE else ["gzip"]
+    best = request.accept_encodings.best_match(offered)
+    if best == "br":
+        return _BrotliEncoder()
+    if best == "gzip":
+        return _GzipEncoder()
+    return None
+
+
+def _is_compressible(response):
+    if response.status_code < 200 or response.status_code in (204, 206, 304) or request.method == "HEAD":
+        return False
+    if response.direct_passthrough or "Content-Encoding" in response.headers:
+        return False
+    if "no-transform" in response.headers.get("Cache-Control", ""):
+        return False
+    return (response.mimetype or "").startswith(COMPRESSIBLE_TYPES)
+
+
+def _stream_compressed(iterable, encoder):
+    """ 청크별로 압축해 바로 내보냄. 연결이 끊기면(close) 원래 iterable도 닫아 upstream 취소가 전달되게 함 """
+    try:
+        for data in iterable:
+            if isinstance(data, str):
+                data = data.encode('utf-8')
+            if data:
+                compressed = encoder.chunk(data)
+                metrics.incr("http_compress_bytes_total", len(data), encoding=encoder.name, kind="in")
+                metrics.incr("http_compress_bytes_total", len(compressed), encoding=encoder.name, kind="out")
+                yield compressed
+        yield encoder.finish()
+    finally:
+        close = getattr(iterable, "close", None)
+        if callable(close):
+            close()
+
+
+def compress_response(response):
+    """ after_request: 협상된 인코딩으로 응답 본문을 압축합니다. """
+    if not _is_compressible(response):
+        return response
+    response.vary.add("Accept-Encoding")
+    encoder = _choose_encoder()
+    if encoder is None:
+        return response
+
+    if response.is_streamed:
+        response.response = _stream_compressed(response.response, encoder)
+        response.headers.pop("Content-Length", None)
+    else:
+        data = response.get_data()
+        if len(data) < MIN_BYTES:
+            return response
+        compressed = encoder.finish(data)
+        metrics.incr("http_compress_bytes_total", len(data), encoding=encoder.name, kind="in")
+        metrics.incr("http_compress_bytes_total", len(compressed), encoding=encoder.name, kind="out")
+        response.set_data(compressed)
+    response.headers["Content-Encoding"] = encoder.name
+    # (인코딩별로 본문 바이트가 다르므로 강한 ETag는 약한 ETag로)
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
+
+
+def init_app(app):
+    if not COMPRESS_ENABLED:
+        return
+    app.after_request(compress_response)
+    print(f"🗜️ [Compress] 응답 압축 사용 ({'br, ' if BROTLI_AVAILABLE else ''}gzip, {MIN_BYTES}B 이상)")
@@ -0,0 +1,177 @@
+import os
+import codecs
+from collections import namedtuple
+
+# ----------------------------
+# [!! ★★★ 신규 ★★★ !!]
+# 스트리밍 텍스트 추출기 (PDF / PPTX / XLSX / TXT)
+# 예전에는 형식마다 full_text += ... 로 문자열 하나를 계속 키웠습니다. (큰 엑셀에서 O(n^2) + 메모리 폭증)
+# 이제는 페이지/슬라이드/시트 행 묶음 단위의 Segment를 하나씩 yield 하고,
+# 저장(해시+블롭 쓰기)·청크 분할·색인은 이 Segment를 바로 소비합니다.
+# (fitz/pptx/openpyxl은 해당 형식 파일을 실제로 읽을 때만 import합니다)
+# ----------------------------
+
+# text : 구간 텍스트 (줄 끝 "\n" 포함 -> 이어 붙이면 예전 full_text와 동일)
+# unit : "page" | "slide" | "sheet" | "line" | "text"
+# index: 1부터 시작하는 페이지/슬라이드 번호 (시트는 시트 순번, TXT는 시작 줄 번호)
+# label: 사람이 읽는 위치 표시 (예: "p.3", "slide 2", "Sheet1!1-200")
+Segment = namedtuple("Segment", "text unit index label")
+
+
+def _env_int(name, default):
+    try:
+        return int(os.getenv(name, default))
+    except ValueError:
+        return default
+
+
+# 추출 제한 (환경 변수로 조정, 0 이하는 무제한)
+DEFAULT_LIMITS = {
+    "max_pages": _env_int("AITER_EXTRACT_MAX_PAGES", 2000),
+    "max_slides": _env_int("AITER_EXTRACT_MAX_SLIDES", 1000),
+    "max_sheets": _env_int("AITER_EXTRACT_MAX_SHEETS", 50),
+    "max_rows_per_sheet": _env_int("AITER_EXTRACT_MAX_ROWS", 20000),
+    "rows_per_segment": _env_int("AITER_EXTRACT_ROWS_PER_SEGMENT", 200),
+    "lines_per_segment": _env_int("AITER_EXTRACT_LINES_PER_SEGMENT", 500),
+    "max_chars": _env_int("AITER_EXTRACT_MAX_CHARS", 5_000_000),
+}
+
+TRUNCATED_NOTE = "[SYSTEM_NOTE: 파일이 너무 커서 이후 내용은 생략되었습니다.]\n"
+
+EXTRACTABLE_EXTENSIONS = ('.pdf', '.pptx', '.xlsx', '.txt')
+
+
+def _limit(limits, key):
+    value = limits.get(key, 0)
+    return value if value and value > 0 else None
+
+
+def iter_segments(file_path, limits=None, stats=None):
+    """
+    파일 형식에 맞는 추출기를 골라 Segment를 차례로 yield 합니다.
+    stats(dict)를 넘기면 units(전체 페이지/슬라이드/시트 수, TXT는 0), segments, chars, truncated를 채워 줍니다.
+    (지원하지 않는 형식이면 아무것도 yield 하지 않음)
+    """
+    limits = dict(DEFAULT_LIMITS, **(limits or {}))
+    stats = stats if stats is not None else {}
+    stats.update(units=0, segments=0, chars=0, truncated=False)
+    lower = file_path.lower()
+    if lower.endswith('.pdf'):
+        source = _iter_pdf(file_path, limits, stats)
+    elif lower.endswith('.pptx'):
+        source = _iter_pptx(file_path, limits, stats)
+    elif lower.endswith('.xlsx'):
+        source = _iter_xlsx(file_path, limits, stats)
+    elif lower.endswith('.txt'):
+        source = _iter_txt(file_path, limits, stats)
+    else:
+        return
+
+    max_chars = _limit(limits, "max_chars")
+    try:
+        for segment in source:
+            if max_chars and stats["chars"] + len(segment.text) > max_chars:
+                stats["truncated"] = True
+                break
+            stats["chars"] += len(segment.text)
+            stats["segments"] += 1
+            yield segment
+    finally:
+        # (중간에 멈춰도 열린 문서/파일을 바로 정리)
+        source.close()
+    if stats["truncated"]:
+        print(f"⚠️ [Extract] '{os.path.basename(file_path)}' 추출 제한 초과 -> 일부만 사용합니다. ({stats['segments']}개 구간)")
+        yield Segment(TRUNCATED_NOTE, "text", 0, "truncated")
+
+
+def _iter_pdf(file_path, limits, stats):
+    import fitz  # PyMuPDF
+    doc = fitz.open(file_path)
+    try:
+        stats["units"] = doc.page_count
+        max_pages = _limit(limits, "max_pages")
+        for page_number, page in enumerate(doc, start=1):
+            if max_pages and page_number > max_pages:
+                stats["truncated"] = True
+                break
+            yield Segment(page.get_text() + "\n", "page", page_number, f"p.{page_number}")
+    finally:
+        doc.close()
+
+
+def _iter_pptx(file_path, limits, stats):
+    import pptx
+    prs = pptx.Presentation(file_path)
+    stats["units"] = len(prs.slides)
+    max_slides = _limit(limits, "max_slides")
+    for slide_number, slide in enumerate(prs.slides, start=1):
+        if max_slides and slide_number > max_slides:
+            stats["truncated"] = True
+            break
+        # (슬라이드 1장 분량만 리스트로 모았다가 한 번에 join)
+        texts = [shape.text + "\n" for shape in slide.shapes if hasattr(shape, "text")]
+        if texts:
+            yield Segment("".join(texts), "slide", slide_number, f"slide {slide_number}")
+
+
+def _iter_xlsx(file_path, limits, stats):
+    import openpyxl
+    wb = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        stats["units"] = len(wb.sheetnames)
+        max_sheets = _limit(limits, "max_sheets")
+        max_rows = _limit(limits, "max_rows_per_sheet")
+        batch_size = _limit(limits, "rows_per_segment") or 200
+        for sheet_number, sheet_name in enumerate(wb.sheetnames, start=1):
+            if max_sheets and sheet_number > max_sheets:
+                stats["truncated"] = True
+                break
+            batch, first_row = [], 1
+            for row_number, row in enumerate(wb[sheet_name].iter_rows(values_only=True), start=1):
+                if max_rows and row_number > max_rows:
+                    stats["truncated"] = True
+                    break
+                batch.append(" ".join(str(value) for value in row if value is not None) + "\n")
+                if len(batch) >= batch_size:
+                    yield Segment("".join(batch), "sheet", sheet_number, f"{sheet_name}!{first_row}-{row_number}")
+                    batch, first_row = [], row_number + 1
+            if batch:
+                yield Segment("".join(batch), "sheet", sheet_number,
+                              f"{sheet_name}!{first_row}-{first_row + len(batch) - 1}")
+    finally:
+        wb.close()
+
+
+# 인코딩 판별에 읽는 앞부분 크기 (파일 전체를 두 번 읽지 않도록)
+ENCODING_SNIFF_BYTES = 256 * 1024
+
+
+def detect_text_encoding(file_path, candidates=("utf-8", "cp949")):
+    """
+    파일 앞부분(ENCODING_SNIFF_BYTES)을 디코딩해 보며 맞는 인코딩을 찾습니다.
+    (잘린 끝의 미완성 멀티바이트 문자는 오류로 보지 않음. 뒤쪽에만 있는 깨진 바이트는 읽을 때 errors='replace')
+    """
+    with open(file_path, 'rb') as f:
+        head = f.read(ENCODING_SNIFF_BYTES)
+        at_end = not f.read(1)
+    for encoding in candidates:
+        try:
+            codecs.getincrementaldecoder(encoding)().decode(head, final=at_end)
+            return encoding
+        except UnicodeDecodeError:
+            continue
+    return candidates[-1]
+
+
+def _iter_txt(file_path, limits, stats):
+    encoding = detect_text_encoding(file_path)
+    batch_size = _limit(limits, "lines_per_segment") or 500
+    with open(file_path, 'r', encoding=encoding, errors='replace') as f:
+        batch, first_line, line_number = [], 1, 0
+        for line_number, line in enumerate(f, start=1):
+            batch.append(line)
+            if len(batch) >= batch_size:
+                yield Segment("".join(batch), "line", first_line, f"L{first_line}-{line_number}")
+                batch, first_line = [], line_number + 1
+        if batch:
+            yield Segment("".join(batch), "line", first_line, f"L{first_line}-{line_number}")
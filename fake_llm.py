@@ -0,0 +1,117 @@
+import os
+import time
+import random
+import threading
+
+# ----------------------------
+# [!! ★★★ 신규 ★★★ !!]
+# 장애 주입용 가짜 LLM 백엔드 (API 키 없이 재시도/회로 차단기/헤지/취소 동작 확인용)
+#   AITER_LLM_BACKEND=fake
+#   AITER_FAKE_LLM="error_rate=0.3,fail_kind=unavailable,latency=0.2,slow_rate=0.1,slow_latency=5,seed=1"
+# fail_kind: unavailable(503) | rate_limited(429) | invalid(400) | disconnect
+# ----------------------------
+
+
+class FakeAPIError(Exception):
+    code = 500
+
+
+class ServiceUnavailable(FakeAPIError):
+    code = 503
+
+
+class ResourceExhausted(FakeAPIError):
+    code = 429
+
+
+class InvalidArgument(FakeAPIError):
+    code = 400
+
+
+class DeadlineExceeded(FakeAPIError):
+    code = 504
+
+
+_FAULTS = {
+    "unavailable": ServiceUnavailable,
+    "rate_limited": ResourceExhausted,
+    "invalid": InvalidArgument,
+    "disconnect": ConnectionResetError,
+}
+
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeStream:
+    """ 청크를 delay 간격으로 내보내는 스트림 (cancel() 지원) """
+
+    def __init__(self, text, chunk_size, delay):
+        self._chunks = [text[i:i + chunk_size] for i in range(0, len(text), chunk_size)] or [""]
+        self._delay = delay
+        self._cancelled = threading.Event()
+
+    def __iter__(self):
+        for chunk in self._chunks:
+            if self._cancelled.wait(self._delay):
+                raise ConnectionResetError("stream cancelled")
+            yield FakeResponse(chunk)
+
+    def cancel(self):
+        self._cancelled.set()
+
+
+class FakeBackend:
+    def __init__(self, error_rate=0.0, fail_kind="unavailable", latency=0.05, slow_rate=0.0, slow_latency=5.0,
+                 fail_first=0, chunk_size=20, chunk_delay=0.02, seed=None, reply=None):
+        self.error_rate = error_rate
+        self.fail_kind = fail_kind
+        self.latency = latency
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+        # 처음 N번 호출은 무조건 실패 (재시도/회로 차단기 확인용)
+        self.fail_first = int(fail_first)
+        self.chunk_size = int(chunk_size)
+        self.chunk_delay = chunk_delay
+        self.reply = reply
+        self.calls = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        options = {}
+        for pair in filter(None, os.getenv("AITER_FAKE_LLM", "").split(",")):
+            key, _, value = pair.partition("=")
+            key = key.strip()
+            if key in ("fail_kind", "reply"):
+                options[key] = value.strip()
+            elif key:
+                options[key] = float(value)
+        return cls(**options)
+
+    def _fault(self):
+        with self._lock:
+            self.calls += 1
+            call_number = self.calls
+            roll, slow_roll = self._random.random(), self._random.random()
+        if call_number <= self.fail_first or roll < self.error_rate:
+            return _FAULTS.get(self.fail_kind, ServiceUnavailable)(f"fake {self.fail_kind} (call #{call_number})"), 0.0
+        return None, (self.slow_latency if slow_roll < self.slow_rate else self.latency)
+
+    def generate(self, model_name, system_instruction, contents, stream, timeout, generation_config=None):
+        error, delay = self._fault()
+        if error is not None:
+            time.sleep(self.latency)
+            raise error
+        if timeout and delay > timeout:
+            time.sleep(timeout)
+            raise DeadlineExceeded(f"fake deadline exceeded ({timeout:.1f}s)")
+        text = self.reply or f"[fake:{model_name}] {str(contents)[:60]}"
+        if stream:
+            time.sleep(delay)
+            return FakeStream(text, self.chunk_size, self.chunk_delay)
+        time.sleep(delay)
+        return FakeResponse(text)
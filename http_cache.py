@@ -0,0 +1,126 @@
+import os
+import hashlib
+from datetime import datetime, timezone
+from flask import request, session, url_for, current_app, Response
+
+# ----------------------------
+# [!! ★★★ 신규 ★★★ !!]
+# HTTP 캐싱 정책
+# - 정적 파일: 내용 해시(?v=...)가 붙은 URL은 1년 immutable 캐시
+# - 기록/파일 목록/오답노트 화면: 캐시 버전 기반 ETag/Last-Modified + 304
+# - 그 외(로그인/변경 API 응답): 기존처럼 no-store
+# ----------------------------
+
+STATIC_MAX_AGE = 31536000  # 1년
+NO_STORE = 'no-store, no-cache, must-revalidate, max-age=0'
+# 매번 재검증하되, 변경이 없으면 브라우저 사본을 그대로 사용 (304)
+REVALIDATE = 'private, no-cache'
+
+# {파일 경로: (mtime_ns, 해시)}
+_static_hash_cache = {}
+
+
+def static_url(filename):
+    """ 파일 내용 해시를 붙인 정적 파일 URL (내용이 바뀌면 URL도 바뀜) """
+    path = os.path.join(current_app.static_folder, filename)
+    try:
+        mtime_ns = os.stat(path).st_mtime_ns
+    except OSError:
+        return url_for('static', filename=filename)
+    cached = _static_hash_cache.get(path)
+    if not cached or cached[0] != mtime_ns:
+        with open(path, 'rb') as f:
+            cached = (mtime_ns, hashlib.md5(f.read()).hexdigest()[:12])
+        _static_hash_cache[path] = cached
+    return url_for('static', filename=filename, v=cached[1])
+
+
+def make_etag(*parts):
+    """ 캐시 버전, 템플릿/정적 파일 버전 등 임의의 값들로 ETag 값을 만듭니다. """
+    return hashlib.sha1(repr(parts + (asset_version(),)).encode('utf-8')).hexdigest()[:20]
+
+
+# {앱 루트 경로: 템플릿/정적 파일 최신 mtime} (배포 = 재시작이므로 프로세스당 1회 계산)
+_asset_versions = {}
+
+
+def _scan_asset_version(app):
+    latest = 0
+    for folder in (app.template_folder, app.static_folder):
+        folder = os.path.join(app.root_path, folder) if folder else None
+        if not folder or not os.path.isdir(folder):
+            continue
+        for root, _, files in os.walk(folder):
+            for name in files:
+                try:
+                    latest = max(latest, os.stat(os.path.join(root, name)).st_mtime_ns)
+                except OSError:
+                    pass
+    return latest
+
+
+def asset_version():
+    """
+    템플릿/정적 파일이 배포로 바뀌면 ETag도 바뀌도록 최신 mtime을 반환합니다.
+    파일 트리는 처음 한 번만 훑습니다. (템플릿 자동 리로드(디버그) 모드에서만 매번 다시 확인)
+    """
+    app = current_app._get_current_object()
+    if not app.jinja_env.auto_reload:
+        version = _asset_versions.get(app.root_path)
+        if version is not None:
+            return version
+    version = _asset_versions[app.root_path] = _scan_asset_version(app)
+    return version
+
+
+def conditional_response(etag, last_modified=None):
+    """
+    요청의 If-None-Match / If-Modified-Since가 현재 버전과 같으면 304 응답을, 아니면 None을 반환합니다.
+    (flash 메시지가 남아 있으면 반드시 새로 렌더링해야 하므로 304를 쓰지 않습니다)
+    """
+    if session.get('_flashes'):
+        return None
+    matched = False
+    if request.if_none_match:
+        matched = request.if_none_match.contains_weak(etag)
+    elif last_modified and request.if_modified_since:
+        matched = last_modified.replace(microsecond=0) <= request.if_modified_since
+    if not matched:
+        return None
+    response = Response(status=304)
+    return mark_revalidate(response, etag, last_modified)
+
+
+def mark_revalidate(response, etag, last_modified=None):
+    """ 응답에 ETag/Last-Modified와 재검증 정책을 붙입니다. """
+    response.set_etag(etag, weak=True)
+    if last_modified:
+        response.last_modified = last_modified
+    response.headers['Cache-Control'] = REVALIDATE
+    response.headers['Vary'] = 'Cookie'
+    return response
+
+
+def mtime_to_datetime(mtime_ns):
+    if not mtime_ns:
+        return None
+    return datetime.fromtimestamp(mtime_ns / 1e9, tz=timezone.utc)
+
+
+def apply_cache_policy(response):
+    """ after_request: 경로/응답 종류별로 Cache-Control을 결정합니다. """
+    if request.path.startswith('/static'):
+        if request.args.get('v') and response.status_code == 200:
+            response.headers['Cache-Control'] = f'public, max-age={STATIC_MAX_AGE}, immutable'
+        else:
+            response.headers['Cache-Control'] = 'public, no-cache'
+        return response
+
+    # 뷰에서 이미 재검증 정책(ETag)을 지정한 응답은 그대로 둡니다.
+    if response.headers.get('Cache-Control') == REVALIDATE:
+        return response
+
+    response.headers['Cache-Control'] = NO_STORE
+    response.headers['Pragma'] = 'no-cache'
+    response.headers['Expires'] = '0'
+    return response
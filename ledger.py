@@ -0,0 +1,236 @@
+import os
+import json
+import time
+import threading
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+
+import metrics
+
+# ----------------------------
+# [!! ★★★ 신규 ★★★ !!]
+# LLM 사용량 원장 (사용자/작업별 토큰·비용 집계 + 일일 한도)
+# 모든 LLM 호출(llm.generate / llm.open_stream)과 결과 캐시 적중을 한 줄씩 추가 기록합니다.
+#   cache/ledger/YYYY-MM-DD.jsonl   (append-only, 날짜별 파일)
+#   {"t": 시각, "u": 사용자, "a": 작업, "m": 모델, "s": "ok"|"err"|"cancel"|"hit", "in": 입력 토큰, "out": 출력 토큰,
+#    "ms": 소요 ms, "est": 1(토큰 수를 응답 메타데이터 대신 추정한 경우)}
+# 한 줄은 O_APPEND 1회 쓰기 -> gunicorn 워커 여러 개가 같은 파일에 써도 줄이 섞이지 않습니다.
+# 일일 한도(입력+출력 토큰, 호출 전에 확인):
+#   AITER_DAILY_TOKEN_QUOTA=500000           모든 사용자 기본값 (0 또는 미설정이면 무제한)
+#   AITER_USER_QUOTAS='{"cs101": 2000000}'   사용자별 덮어쓰기 (0이면 무제한)
+# 비용(보고서 계산용, 100만 토큰당 USD): AITER_LLM_PRICES='{"gemini-flash-latest": [0.30, 2.50]}'
+# ----------------------------
+
+LEDGER_DIR = os.path.join("cache", "ledger")
+
+DEFAULT_PRICES = {
+    "gemini-flash-latest": (0.30, 2.50),
+    "gemini-flash-lite-latest": (0.10, 0.40),
+    "gemini-pro-latest": (1.25, 10.00),
+    "gemini-1.5-flash": (0.075, 0.30),
+}
+# 가격표에 없는 모델
+FALLBACK_PRICE = (0.30, 2.50)
+
+
+def _load_json_env(name, default):
+    try:
+        return json.loads(os.getenv(name, "")) if os.getenv(name) else default
+    except ValueError:
+        print(f"⚠️ [Ledger] {name} 형식이 잘못되어 무시합니다.")
+        return default
+
+
+DAILY_TOKEN_QUOTA = int(os.getenv("AITER_DAILY_TOKEN_QUOTA", "0") or 0)
+USER_QUOTAS = _load_json_env("AITER_USER_QUOTAS", {})
+PRICES = dict(DEFAULT_PRICES, **{model: tuple(price) for model, price in _load_json_env("AITER_LLM_PRICES", {}).items()})
+
+_write_lock = threading.Lock()
+_usage_lock = threading.Lock()
+# 오늘 파일을 어디까지 읽었는지 + 사용자별 토큰 합계 (다른 워커가 쓴 줄도 이어 읽어서 반영)
+_usage = {"day": None, "offset": 0, "tokens": Counter()}
+
+
+def _day_path(day):
+    return os.path.join(LEDGER_DIR, f"{day}.jsonl")
+
+
+def _today():
+    return datetime.now().strftime('%Y-%m-%d')
+
+
+def _append(entry):
+    line = (json.dumps(entry, ensure_ascii=False, separators=(",", ":")) + "\n").encode('utf-8')
+    os.makedirs(LEDGER_DIR, exist_ok=True)
+    with _write_lock:
+        fd = os.open(_day_path(_today()), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, line)
+        finally:
+            os.close(fd)
+
+
+def record(user_id, action_type, model_name, status, tokens_in=0, tokens_out=0, seconds=0.0, estimated=False):
+    """ 원장에 1건 추가 (기록 실패는 요청을 막지 않음) """
+    entry = {"t": int(time.time()), "u": user_id or "-", "a": action_type, "m": model_name or "-", "s": status,
+             "in": int(tokens_in or 0), "out": int(tokens_out or 0), "ms": int(seconds * 1000)}
+    if estimated:
+        entry["est"] = 1
+    try:
+        _append(entry)
+    except OSError as e:
+        print(f"💥 [Ledger] 기록 실패: {e}")
+        return
+    if entry["in"] or entry["out"]:
+        metrics.incr("llm_tokens_total", entry["in"], action=action_type, kind="input")
+        metrics.incr("llm_tokens_total", entry["out"], action=action_type, kind="output")
+
+
+def record_hit(user_id, action_type):
+    """ LLM을 부르지 않고 저장된 결과로 응답한 경우 (캐시 적중률 집계용) """
+    record(user_id, action_type, None, "hit")
+
+
+def usage_from_response(response):
+    """ genai 응답의 usage_metadata -> (입력, 출력) 토큰 / 없으면 None """
+    usage = getattr(response, "usage_metadata", None)
+    if usage is None:
+        return None
+    tokens_in = getattr(usage, "prompt_token_count", None)
+    tokens_out = getattr(usage, "candidates_token_count", None)
+    if not tokens_in and not tokens_out:
+        return None
+    return tokens_in or 0, tokens_out or 0
+
+
+# ----------------------------
+# 일일 한도
+# ----------------------------
+def get_quota(user_id):
+    quota = USER_QUOTAS.get(user_id, DAILY_TOKEN_QUOTA)
+    return int(quota or 0)
+
+
+def tokens_used_today(user_id):
+    """ 오늘 원장 파일을 마지막으로 읽은 위치부터 이어 읽어 사용자별 합계를 갱신합니다. """
+    day = _today()
+    with _usage_lock:
+        if _usage["day"] != day:
+            _usage.update(day=day, offset=0, tokens=Counter())
+        try:
+            with open(_day_path(day), 'rb') as f:
+                f.seek(_usage["offset"])
+                data = f.read()
+        except FileNotFoundError:
+            data = b""
+        # (마지막 줄이 아직 쓰이는 중일 수 있으므로 완전한 줄까지만)
+        complete = data[:data.rfind(b"\n") + 1]
+        _usage["offset"] += len(complete)
+        for line in complete.splitlines():
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            _usage["tokens"][entry.get("u")] += entry.get("in", 0) + entry.get("out", 0)
+        return _usage["tokens"][user_id]
+
+
+def quota_error(user_id, estimated_tokens=0):
+    """ 한도가 있고 (오늘 사용량 + 이번 입력 추정치)가 넘으면 안내 문구, 아니면 None """
+    if not user_id:
+        return None
+    quota = get_quota(user_id)
+    if quota <= 0:
+        return None
+    used = tokens_used_today(user_id)
+    if used + estimated_tokens <= quota:
+        return None
+    metrics.incr("llm_quota_rejected_total")
+    return f"오늘 사용할 수 있는 AI 사용량을 모두 썼습니다. (사용 {used:,} / 한도 {quota:,} 토큰) 내일 다시 시도해 주세요."
+
+
+# ----------------------------
+# 보고서
+# ----------------------------
+def _price(model_name):
+    return PRICES.get(model_name, FALLBACK_PRICE)
+
+
+def iter_entries(days=1):
+    """ 최근 days일(오늘 포함) 원장 항목 """
+    today = datetime.now().date()
+    for offset in range(days - 1, -1, -1):
+        path = _day_path((today - timedelta(days=offset)).strftime('%Y-%m-%d'))
+        if not os.path.exists(path):
+            continue
+        with open(path, 'rb') as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+
+
+def _empty_row():
+    return {"calls": 0, "errors": 0, "cancelled": 0, "cache_hits": 0, "tokens_in": 0, "tokens_out": 0, "cost_usd": 0.0,
+            "latency_ms_total": 0, "estimated_calls": 0}
+
+
+def _percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))] if ordered else 0
+
+
+def build_report(days=1, user_id=None):
+    """
+    {"by_user": {...}, "by_action": {...}, "by_user_action": {...}, "by_route": {...}, "total": {...}}
+    by_route: "작업 -> 모델"별 (모델 라우팅 조정용: p50/p95 지연, 호출당 비용 포함)
+    """
+    groups = {"by_user": defaultdict(_empty_row), "by_action": defaultdict(_empty_row),
+              "by_user_action": defaultdict(_empty_row), "by_route": defaultdict(_empty_row)}
+    total = _empty_row()
+    route_latencies = defaultdict(list)
+    for entry in iter_entries(days):
+        if user_id and entry.get("u") != user_id:
+            continue
+        rows = [groups["by_user"][entry.get("u")], groups["by_action"][entry.get("a")],
+                groups["by_user_action"][f"{entry.get('u')}/{entry.get('a')}"], total]
+        status = entry.get("s")
+        if status != "hit":
+            route = f"{entry.get('a')} -> {entry.get('m')}"
+            rows.append(groups["by_route"][route])
+            if status == "ok":
+                route_latencies[route].append(entry.get("ms", 0))
+        price_in, price_out = _price(entry.get("m"))
+        cost = (entry.get("in", 0) * price_in + entry.get("out", 0) * price_out) / 1_000_000
+        for row in rows:
+            if status == "hit":
+                row["cache_hits"] += 1
+                continue
+            row["calls"] += 1
+            row["latency_ms_total"] += entry.get("ms", 0)
+            if status == "err":
+                row["errors"] += 1
+            elif status == "cancel":
+                row["cancelled"] += 1
+            row["tokens_in"] += entry.get("in", 0)
+            row["tokens_out"] += entry.get("out", 0)
+            row["cost_usd"] += cost
+            row["estimated_calls"] += entry.get("est", 0)
+
+    def finish(row):
+        row["cost_usd"] = round(row["cost_usd"], 6)
+        row["avg_latency_ms"] = round(row.pop("latency_ms_total") / row["calls"]) if row["calls"] else 0
+        lookups = row["calls"] + row["cache_hits"]
+        row["cache_hit_rate"] = round(row["cache_hits"] / lookups, 3) if lookups else 0.0
+        return row
+
+    report = {name: {key: finish(row) for key, row in sorted(group.items())} for name, group in groups.items()}
+    for route, row in report["by_route"].items():
+        latencies = route_latencies.get(route, [])
+        row["p50_latency_ms"] = _percentile(latencies, 0.5)
+        row["p95_latency_ms"] = _percentile(latencies, 0.95)
+        row["cost_per_call_usd"] = round(row["cost_usd"] / row["calls"], 6) if row["calls"] else 0.0
+    report["total"] = finish(total)
+    report["days"] = days
+    return report
@@ -0,0 +1,589 @@
+import os
+import json
+import time
+import threading
+
+import ledger
+import metrics
+import normalize
+import resilience
+from scheduler import scheduler, QueueTimeout
+
+# ----------------------------
+# [!! ★★★ 신규 ★★★ !!]
+# LLM(Gemini) 클라이언트 (지연 로드)
+# google.generativeai는 import만으로도 무겁기 때문에, 실제로 LLM을 호출하는
+# 첫 요청에서 한 번만 import + API 키 설정을 합니다.
+# ----------------------------
+
+DEFAULT_MODEL = "gemini-flash-latest"
+
+_genai = None
+_genai_lock = threading.Lock()
+
+
+def get_genai():
+    """ google.generativeai 모듈을 (최초 1회) import하고 API 키를 설정해 반환합니다. """
+    global _genai
+    if _genai is None:
+        with _genai_lock:
+            if _genai is None:
+                import google.generativeai as genai
+                # [주의] 배포 환경 변수 또는 여기에 직접 키 입력
+                genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+                print("✅ Google Gemini API 키 설정 완료.")
+                _genai = genai
+    return _genai
+
+
+def get_model(system_instruction=None, model_name=DEFAULT_MODEL):
+    return get_genai().GenerativeModel(model_name, system_instruction=system_instruction)
+
+
+# ----------------------------
+# [!! ★★★ 신규 ★★★ !!] 백엔드 선택
+# 기본은 Gemini. AITER_LLM_BACKEND=fake 이면 장애 주입용 가짜 백엔드(fake_llm.py)를 씁니다.
+# ----------------------------
+class GeminiBackend:
+    def generate(self, model_name, system_instruction, contents, stream, timeout, generation_config=None):
+        model = get_model(system_instruction, model_name)
+        return model.generate_content(contents, stream=stream, generation_config=generation_config or None,
+                                      request_options={"timeout": timeout})
+
+
+_backend = None
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        if os.getenv("AITER_LLM_BACKEND", "gemini") == "fake":
+            from fake_llm import FakeBackend
+            print("⚠️ [LLM] 가짜 백엔드(AITER_LLM_BACKEND=fake)를 사용합니다.")
+            _backend = FakeBackend.from_env()
+        else:
+            _backend = GeminiBackend()
+    return _backend
+
+
+def set_backend(backend):
+    """ (테스트/벤치마크용) 백엔드 교체 """
+    global _backend
+    _backend = backend
+
+
+# ----------------------------
+# [!! ★★★ 신규 ★★★ !!] 작업별 마감 시간(초)
+# 환경 변수로 덮어쓰기: AITER_LLM_TIMEOUT_<ACTION>=60  또는  AITER_LLM_TIMEOUTS='{"grade_quiz": 60}'
+# (MODEL_ROUTES에 "timeout"이 있는 작업은 그 값이 우선)
+# ----------------------------
+DEFAULT_TIMEOUT = 120
+ACTION_TIMEOUTS = {
+    "stream_ask": 120,
+    "quiz_all": 90, "quiz_selected": 90, "quiz_weakness": 90, "quiz_file": 90, "analyze_weakness": 120,
+    "grade_quiz": 90, "extract_errors": 60, "explain_wrong_answers": 60,
+    "extract_all": 180, "generate_mindmap": 180,
+    "ocr": 300,
+    "summarize_chat": 60,
+}
+
+
+# ----------------------------
+# [!! ★★★ 신규 ★★★ !!] 작업별 모델 라우팅
+# 작업(action_type) -> 모델 + 생성 파라미터(temperature, max_output_tokens 등) (+ 선택: timeout)
+# - 짧고 응답 속도가 중요한 단계(오답 추출/해설, 대화 요약): 가장 빠른 모델
+# - 전체 자료를 넣는 무거운 단계(전체 핵심 추출, 취약점 분석, 연관 분석): 긴 맥락에 강한 큰 모델
+# 덮어쓰기 (작업별로 기본값 위에 병합):
+#   AITER_LLM_ROUTES='{"grade_quiz": {"model": "gemini-pro-latest", "temperature": 0}}'  (또는 JSON 파일 경로)
+#   AITER_LLM_MODEL_<ACTION>=gemini-flash-latest   (모델만)
+# 작업별 지연/비용은 /admin/ledger 의 by_route (작업 -> 모델) 항목으로 확인해 조정합니다.
+# ----------------------------
+FAST_MODEL = os.getenv("AITER_LLM_FAST_MODEL", "gemini-flash-lite-latest")
+LARGE_MODEL = os.getenv("AITER_LLM_LARGE_MODEL", "gemini-pro-latest")
+
+DEFAULT_ROUTE = {"model": DEFAULT_MODEL}
+MODEL_ROUTES = {
+    "stream_ask": {"model": DEFAULT_MODEL, "temperature": 0.4},
+    "extract_answer": {"model": DEFAULT_MODEL, "temperature": 0.2, "max_output_tokens": 8192},
+    "quiz_all": {"model": DEFAULT_MODEL, "temperature": 0.7, "max_output_tokens": 16384},
+    "quiz_selected": {"model": DEFAULT_MODEL, "temperature": 0.7, "max_output_tokens": 16384},
+    "quiz_file": {"model": DEFAULT_MODEL, "temperature": 0.7, "max_output_tokens": 16384},
+    "quiz_weakness": {"model": DEFAULT_MODEL, "temperature": 0.7, "max_output_tokens": 16384},
+    "grade_quiz": {"model": DEFAULT_MODEL, "temperature": 0.0, "max_output_tokens": 16384},
+    "extract_errors": {"model": FAST_MODEL, "temperature": 0.0, "max_output_tokens": 8192},
+    "explain_wrong_answers": {"model": FAST_MODEL, "temperature": 0.2, "max_output_tokens": 8192},
+    "summarize_chat": {"model": FAST_MODEL, "temperature": 0.2, "max_output_tokens": 1024},
+    # (큰 모델은 출력 속도가 느리고 출력 한도도 커서 ACTION_TIMEOUTS(flash 기준)보다 긴 마감 시간을 씀)
+    "analyze_weakness": {"model": LARGE_MODEL, "temperature": 0.3, "max_output_tokens": 16384, "timeout": 300},
+    "extract_all": {"model": LARGE_MODEL, "temperature": 0.2, "max_output_tokens": 65536, "timeout": 600},
+    "generate_mindmap": {"model": LARGE_MODEL, "temperature": 0.3, "max_output_tokens": 32768, "timeout": 420},
+    # (예전: storage.py에 gemini-1.5-flash 고정)
+    "ocr": {"model": DEFAULT_MODEL, "temperature": 0.0, "max_output_tokens": 65536},
+}
+# generation_config로 넘기는 키 (나머지 키는 라우팅 설정: model, timeout)
+GENERATION_KEYS = ("temperature", "top_p", "top_k", "max_output_tokens", "candidate_count", "stop_sequences",
+                   "response_mime_type")
+
+
+def _load_route_overrides():
+    raw = os.getenv("AITER_LLM_ROUTES", "").strip()
+    if not raw:
+        return {}
+    try:
+        if raw.startswith("{"):
+            overrides = json.loads(raw)
+        else:
+            with open(raw, 'r', encoding='utf-8') as f:
+                overrides = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"⚠️ [LLM] AITER_LLM_ROUTES를 읽지 못해 무시합니다: {e}")
+        return {}
+    return {action: route for action, route in overrides.items() if isinstance(route, dict)}
+
+
+_route_overrides = _load_route_overrides()
+
+
+def get_route(action_type):
+    """ 작업의 최종 라우팅 설정 {"model", 생성 파라미터..., ("timeout")} """
+    route = dict(MODEL_ROUTES.get(action_type, DEFAULT_ROUTE))
+    route.update(_route_overrides.get(action_type, {}))
+    env_model = os.getenv(f"AITER_LLM_MODEL_{action_type.upper()}")
+    if env_model:
+        route["model"] = env_model
+    return route
+
+
+def generation_config_for(route):
+    return {key: route[key] for key in GENERATION_KEYS if route.get(key) is not None}
+
+
+def route_table():
+    """ (관리자 화면용) 알려진 모든 작업의 최종 라우팅 + 마감 시간 """
+    actions = sorted(set(MODEL_ROUTES) | set(ACTION_TIMEOUTS) | set(_route_overrides))
+    return {action: dict(get_route(action), timeout=get_timeout(action)) for action in actions}
+
+
+class LLMTimeout(Exception):
+    """ 작업별 마감 시간 초과 """
+
+
+class LLMCancelled(Exception):
+    """ 사용자가 연결을 끊었거나 같은 질문창에서 다시 질문해 중단됨 """
+
+
+class LLMUnavailable(Exception):
+    """ 재시도해도 실패했거나, 회로 차단기가 열려 호출하지 않음 """
+
+
+class LLMQuotaExceeded(Exception):
+    """ [!! 신규 !!] 사용자 일일 토큰 한도 초과 (호출하지 않음, ledger.py) """
+
+
+# [!! 신규 !!] 헤지 요청 대상 (짧은 비스트리밍 호출만. AITER_LLM_HEDGE=0 이면 끔)
+HEDGE_ENABLED = os.getenv("AITER_LLM_HEDGE", "1") == "1"
+HEDGE_ACTIONS = set(filter(None, os.getenv("AITER_LLM_HEDGE_ACTIONS", "extract_errors,explain_wrong_answers").split(",")))
+# 최근 소요 시간이 충분히 쌓이기 전에는 이 지연(초) 후 헤지, 이후에는 작업별 p90 (최소 HEDGE_MIN_DELAY)
+HEDGE_DEFAULT_DELAY = float(os.getenv("AITER_LLM_HEDGE_DELAY", "2.0"))
+HEDGE_MIN_DELAY = 0.5
+
+
+def _load_timeout_overrides():
+    overrides = {}
+    try:
+        overrides.update(json.loads(os.getenv("AITER_LLM_TIMEOUTS", "{}")))
+    except ValueError:
+        print("⚠️ [LLM] AITER_LLM_TIMEOUTS 형식이 잘못되어 무시합니다.")
+    return overrides
+
+
+_timeout_overrides = _load_timeout_overrides()
+
+
+def get_timeout(action_type):
+    env_value = os.getenv(f"AITER_LLM_TIMEOUT_{action_type.upper()}")
+    if env_value:
+        try:
+            return float(env_value)
+        except ValueError:
+            pass
+    if action_type in _timeout_overrides:
+        return float(_timeout_overrides[action_type])
+    route_timeout = _route_overrides.get(action_type, {}).get("timeout") or MODEL_ROUTES.get(action_type, {}).get("timeout")
+    if route_timeout:
+        return float(route_timeout)
+    return float(ACTION_TIMEOUTS.get(action_type, DEFAULT_TIMEOUT))
+
+
+def estimate_request_tokens(system_instruction, contents):
+    """ 스케줄러 토큰 한도 계산용 입력 토큰 추정 (문자열 부분만) """
+    def texts(value):
+        if isinstance(value, str):
+            yield value
+        elif isinstance(value, dict):
+            for part in value.get("parts", []):
+                yield from texts(part)
+        elif isinstance(value, (list, tuple)):
+            for item in value:
+                yield from texts(item)
+    return sum(normalize.estimate_tokens(text) for text in texts([system_instruction or "", contents]))
+
+
+def _check_quota(user_id, tokens_in):
+    message = ledger.quota_error(user_id, tokens_in)
+    if message:
+        print(f"⚠️ [LLM] '{user_id}' 일일 한도 초과로 호출하지 않음")
+        raise LLMQuotaExceeded(message)
+
+
+def _record_call(user_id, action_type, model_name, status, started, tokens_in, response=None, output_text=None):
+    """ 원장 기록: 응답의 usage_metadata가 있으면 그 값, 없으면 입력/출력 문자열로 추정 """
+    usage = ledger.usage_from_response(response) if response is not None else None
+    if usage:
+        tokens_in, tokens_out = usage
+    else:
+        if output_text is None and response is not None:
+            try:
+                output_text = response.text
+            except Exception:
+                output_text = ""
+        tokens_out = normalize.estimate_tokens(output_text) if output_text else 0
+    ledger.record(user_id, action_type, model_name, status, tokens_in, tokens_out, time.monotonic() - started,
+                  estimated=not usage and status != "err")
+
+
+def _acquire_slot(user_id, action_type, system_instruction, contents, timeout, tokens_in=None):
+    """ 스케줄러 차례를 기다립니다. 반환: (Ticket, 실제 호출에 남은 시간) """
+    started = time.monotonic()
+    if tokens_in is None:
+        tokens_in = estimate_request_tokens(system_instruction, contents)
+    try:
+        ticket = scheduler.acquire(user_id, action_type, tokens_in, timeout)
+    except QueueTimeout as e:
+        raise LLMTimeout(str(e)) from e
+    # (대기한 시간만큼 호출 마감 시간을 줄임: 요청 전체 마감 시간 유지)
+    return ticket, max(1.0, timeout - (time.monotonic() - started))
+
+
+def _timeout_error(timeout):
+    return LLMTimeout(f"AI 응답 시간이 초과되었습니다. ({timeout:.0f}초) 잠시 후 다시 시도해 주세요.")
+
+
+def _call_model(action_type, system_instruction, contents, model_name, stream, timeout, generation_config=None):
+    """
+    백엔드 호출 + 복원력: 일시적 오류는 마감 시간 안에서 백오프 재시도, 회로가 열려 있으면 즉시 실패.
+    (스트림은 연결 수립까지만 여기서 처리하고, 첫 청크 전 오류 재시도는 LLMStream이 담당)
+    """
+    deadline = time.monotonic() + timeout
+    attempt = 0
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            metrics.incr("llm_timeouts_total", action=action_type)
+            raise _timeout_error(timeout)
+        try:
+            resilience.breaker.before_call()
+        except resilience.CircuitOpen:
+            raise LLMUnavailable("AI 서버가 일시적으로 응답하지 않아 요청을 잠시 멈췄습니다. 잠시 후 다시 시도해 주세요.")
+
+        print(f"💬 [LLM] '{action_type}' 요청 ({model_name}{', stream' if stream else ''}, timeout={remaining:.0f}s"
+              f"{f', 재시도 {attempt}' if attempt else ''})")
+        metrics.incr("llm_requests_total", action=action_type)
+        started = time.monotonic()
+        try:
+            response = get_backend().generate(model_name, system_instruction, contents, stream, remaining,
+                                              generation_config=generation_config)
+        except Exception as e:
+            kind = resilience.classify_error(e)
+            if kind == resilience.FATAL:
+                # (요청 자체 문제: 재시도/회로 판단에 넣지 않음)
+                resilience.breaker.release_trial()
+                metrics.incr("llm_errors_total", action=action_type, kind=kind)
+                raise
+            resilience.breaker.record_failure()
+            if kind == resilience.TIMEOUT:
+                metrics.incr("llm_timeouts_total", action=action_type)
+                raise _timeout_error(timeout) from e
+            metrics.incr("llm_errors_total", action=action_type, kind=kind)
+            attempt += 1
+            delay = resilience.retry_policy.backoff(attempt - 1)
+            if attempt >= resilience.retry_policy.max_attempts or delay >= deadline - time.monotonic():
+                raise LLMUnavailable(f"AI 서버 오류로 {attempt}회 시도했지만 실패했습니다: {e}") from e
+            print(f"🔁 [LLM] '{action_type}' 일시적 오류, {delay:.1f}초 후 재시도: {e}")
+            metrics.incr("llm_retries_total", action=action_type)
+            time.sleep(delay)
+            continue
+
+        if not stream:
+            elapsed = time.monotonic() - started
+            resilience.breaker.record_success()
+            resilience.latency.add(action_type, elapsed)
+            metrics.observe("llm_latency_seconds", elapsed, action=action_type, model=model_name)
+        return response
+
+
+def _hedge_delay(action_type):
+    observed = resilience.latency.quantile(action_type)
+    return max(HEDGE_MIN_DELAY, observed if observed is not None else HEDGE_DEFAULT_DELAY)
+
+
+def _metered_call(ticket, user_id, action_type, model_name, tokens_in, call):
+    """ 호출 1회 = 원장 1줄. 슬롯은 (헤지로 결과를 버리게 돼도) 이 호출이 실제로 끝날 때 반납합니다. """
+    started = time.monotonic()
+    try:
+        response = call()
+    except Exception:
+        _record_call(user_id, action_type, model_name, "err", started, 0)
+        raise
+    finally:
+        ticket.release()
+    _record_call(user_id, action_type, model_name, "ok", started, tokens_in, response=response)
+    return response
+
+
+def _start_hedge(user_id, action_type, model_name, tokens_in, deadline, make_call):
+    """
+    헤지 복제 호출: 원래 호출과 별도로 스케줄러 슬롯/토큰과 일일 한도를 차지하고 원장에도 따로 기록됩니다.
+    슬롯이 바로 나지 않거나 한도가 모자라면 복제하지 않음 (resilience.HedgeSkipped)
+    """
+    if ledger.quota_error(user_id, tokens_in):
+        raise resilience.HedgeSkipped()
+    try:
+        ticket = scheduler.acquire(user_id, action_type, tokens_in, timeout=0)
+    except QueueTimeout:
+        metrics.incr("llm_hedge_skipped_total", action=action_type)
+        raise resilience.HedgeSkipped()
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        ticket.release()
+        raise resilience.HedgeSkipped()
+    metrics.incr("llm_hedged_total", action=action_type)
+    return _metered_call(ticket, user_id, action_type, model_name, tokens_in, make_call(remaining))
+
+
+def generate(action_type, system_instruction, contents, model_name=None, stream=False, timeout=None, user_id=None):
+    """
+    모든 라우트의 공통 LLM 호출 지점.
+    stream=True면 청크 iterator를, 아니면 응답 객체(.text)를 반환합니다.
+    (마감 시간 안에 응답이 없으면 LLMTimeout - 취소/마감을 지원하는 스트리밍은 open_stream 사용)
+    user_id를 넘기면 사용자별 공정성/한도가 적용됩니다. (스케줄러 대기 시간도 마감 시간에 포함)
+    호출마다 사용량 원장(ledger.py)에 기록하고, 일일 한도를 넘은 사용자는 호출 전에 LLMQuotaExceeded.
+    모델/생성 파라미터는 작업별 라우팅(get_route)을 따르고, model_name을 넘기면 모델만 바꿉니다.
+    """
+    timeout = timeout or get_timeout(action_type)
+    route = get_route(action_type)
+    model_name = model_name or route["model"]
+    generation_config = generation_config_for(route)
+    if stream:
+        # (스트림은 끝나는 시점을 알 수 없으므로 슬롯을 잡지 않음 -> open_stream 권장)
+        return _call_model(action_type, system_instruction, contents, model_name, True, timeout, generation_config)
+    tokens_in = estimate_request_tokens(system_instruction, contents)
+    _check_quota(user_id, tokens_in)
+    ticket, remaining = _acquire_slot(user_id, action_type, system_instruction, contents, timeout, tokens_in)
+    deadline = time.monotonic() + remaining
+
+    def make_call(call_timeout):
+        return lambda: _call_model(action_type, system_instruction, contents, model_name, False, call_timeout,
+                                   generation_config)
+    primary = lambda: _metered_call(ticket, user_id, action_type, model_name, tokens_in, make_call(remaining))
+    if not (HEDGE_ENABLED and action_type in HEDGE_ACTIONS):
+        return primary()
+    hedge = lambda: _start_hedge(user_id, action_type, model_name, tokens_in, deadline, make_call)
+    return resilience.hedged_call(primary, _hedge_delay(action_type), action_type, hedge_func=hedge)
+
+
+# ----------------------------
+# [!! ★★★ 신규 ★★★ !!] 취소 가능한 스트리밍
+# - 마감 시간이 지나면 (청크를 기다리는 중이어도) 타이머가 upstream 스트림을 끊습니다.
+# - 클라이언트가 연결을 끊으면(GeneratorExit) 더 이상 청크를 받지 않고 upstream을 닫습니다.
+# - 같은 사용자가 같은 질문창에서 다시 질문하면 이전 스트림을 취소합니다. (같은 워커 프로세스 안에서)
+# ----------------------------
+_active_streams = {}
+_active_streams_lock = threading.Lock()
+
+
+def _close_upstream(response):
+    """ genai 스트리밍 응답의 하부 iterator(gRPC/REST)를 가능한 방식으로 닫습니다. """
+    iterator = getattr(response, "_iterator", None)
+    for target in (iterator, response):
+        for method in ("cancel", "close"):
+            func = getattr(target, method, None)
+            if callable(func):
+                try:
+                    func()
+                    return
+                except Exception:
+                    pass
+
+
+class LLMStream:
+    """
+    with llm.open_stream("stream_ask", system, contents, cancel_key=(user_id, source), user_id=user_id) as stream:
+        for text in stream: yield text
+    """
+
+    def __init__(self, action_type, system_instruction, contents, model_name=None, timeout=None, cancel_key=None,
+                 user_id=None):
+        self.action_type = action_type
+        self.timeout = timeout or get_timeout(action_type)
+        route = get_route(action_type)
+        model_name = model_name or route["model"]
+        self._generation_config = generation_config_for(route)
+        self.cancel_key = cancel_key
+        self.cancel_reason = None
+        self.finished = False
+        self._lock = threading.Lock()
+        self._started = time.monotonic()
+        # 원장 기록용 (마지막 청크의 usage_metadata가 스트림 전체 사용량)
+        self._user_id = user_id
+        self._model_name = model_name
+        self._tokens_in = estimate_request_tokens(system_instruction, contents)
+        self._usage_response = None
+        self._output = []
+        self._recorded = False
+        _check_quota(user_id, self._tokens_in)
+        self._register()
+        # (스케줄러 슬롯은 스트림이 닫힐 때까지 유지)
+        try:
+            self._ticket, remaining = _acquire_slot(user_id, action_type, system_instruction, contents, self.timeout,
+                                                    self._tokens_in)
+        except Exception:
+            self._unregister()
+            raise
+        self._timer = threading.Timer(remaining, self.cancel, args=("deadline",))
+        self._timer.daemon = True
+        self._deadline = time.monotonic() + remaining
+        self._request = (action_type, system_instruction, contents, model_name)
+        self._breaker_pending = True
+        try:
+            self._response = _call_model(action_type, system_instruction, contents, model_name, True, remaining,
+                                         self._generation_config)
+        except Exception:
+            self._ticket.release()
+            self._unregister()
+            self._record("err")
+            raise
+        self._timer.start()
+
+    def _register(self):
+        if self.cancel_key is None:
+            return
+        with _active_streams_lock:
+            previous = _active_streams.get(self.cancel_key)
+            _active_streams[self.cancel_key] = self
+        if previous is not None:
+            previous.cancel("superseded")
+
+    def _unregister(self):
+        if self.cancel_key is None:
+            return
+        with _active_streams_lock:
+            if _active_streams.get(self.cancel_key) is self:
+                del _active_streams[self.cancel_key]
+
+    def cancel(self, reason):
+        """ (다른 스레드에서도 호출 가능) upstream을 끊고 이후 청크를 버립니다. """
+        with self._lock:
+            if self.finished or self.cancel_reason:
+                return
+            self.cancel_reason = reason
+        print(f"🛑 [LLM] '{self.action_type}' 스트림 중단 ({reason})")
+        if reason == "deadline":
+            metrics.incr("llm_timeouts_total", action=self.action_type)
+        metrics.incr("llm_cancelled_total", action=self.action_type, reason=reason)
+        _close_upstream(getattr(self, "_response", None))
+
+    def _raise_if_cancelled(self):
+        if self.cancel_reason == "deadline":
+            raise LLMTimeout(f"AI 응답 시간이 초과되었습니다. ({self.timeout:.0f}초)")
+        if self.cancel_reason:
+            raise LLMCancelled(self.cancel_reason)
+
+    def _resolve_breaker(self, success):
+        if self._breaker_pending:
+            self._breaker_pending = False
+            if success:
+                resilience.breaker.record_success()
+            else:
+                resilience.breaker.record_failure()
+
+    def __iter__(self):
+        attempt = 0
+        while True:
+            received = False
+            try:
+                for chunk in self._response:
+                    self._raise_if_cancelled()
+                    if not received:
+                        received = True
+                        self._resolve_breaker(True)
+                    if ledger.usage_from_response(chunk):
+                        self._usage_response = chunk
+                    self._output.append(chunk.text)
+                    yield chunk.text
+                break
+            except (LLMTimeout, LLMCancelled):
+                raise
+            except Exception as e:
+                # (upstream을 끊으면 하부 iterator가 임의의 예외를 냄 -> 취소 사유로 바꿔서 전달)
+                self._raise_if_cancelled()
+                kind = resilience.classify_error(e)
+                if kind != resilience.FATAL:
+                    self._resolve_breaker(False)
+                attempt += 1
+                delay = resilience.retry_policy.backoff(attempt - 1)
+                # 이미 일부를 보낸 스트림은 이어 붙일 수 없으므로 첫 청크 전 오류만 재시도
+                if received or kind != resilience.RETRYABLE or attempt >= resilience.retry_policy.max_attempts \
+                        or delay >= self._deadline - time.monotonic():
+                    raise
+                print(f"🔁 [LLM] '{self.action_type}' 스트림 시작 전 오류, {delay:.1f}초 후 재시도: {e}")
+                metrics.incr("llm_retries_total", action=self.action_type)
+                time.sleep(delay)
+                self._raise_if_cancelled()
+                self._breaker_pending = True
+                action_type, system_instruction, contents, model_name = self._request
+                self._response = _call_model(action_type, system_instruction, contents, model_name, True,
+                                             self._deadline - time.monotonic(), self._generation_config)
+        self._raise_if_cancelled()
+        self._resolve_breaker(True)
+        with self._lock:
+            self.finished = True
+        metrics.observe("llm_latency_seconds", time.monotonic() - self._started, action=self.action_type,
+                        model=self._model_name)
+
+    def _record(self, status):
+        if self._recorded:
+            return
+        self._recorded = True
+        _record_call(self._user_id, self.action_type, self._model_name, status, self._started,
+                     self._tokens_in if status != "err" else 0, response=self._usage_response,
+                     output_text="".join(self._output))
+
+    def close(self):
+        self._timer.cancel()
+        self._ticket.release()
+        self._unregister()
+        # (중간에 끊긴 스트림도 받은 만큼은 과금되므로 'cancel'로 토큰을 기록, 한 청크도 못 받았으면 'err')
+        self._record("ok" if self.finished else "cancel" if self._output else "err")
+        if self._breaker_pending:
+            # (첫 청크 전에 취소됨: 성공/실패 판단 없이 시험 호출만 해제)
+            self._breaker_pending = False
+            resilience.breaker.release_trial()
+        if not self.finished:
+            self.cancel("closed")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is GeneratorExit:
+            # 응답을 쓰던 중 클라이언트가 연결을 끊음 (WSGI 서버가 제너레이터를 close)
+            self.cancel("client_disconnect")
+        self.close()
+        return False
+
+
+def open_stream(action_type, system_instruction, contents, model_name=None, timeout=None, cancel_key=None,
+                user_id=None):
+    return LLMStream(action_type, system_instruction, contents, model_name=model_name, timeout=timeout,
+                     cancel_key=cancel_key, user_id=user_id)
@@ -0,0 +1,76 @@
+import os
+import threading
+from collections import Counter
+
+# ----------------------------
+# [!! ★★★ 신규 ★★★ !!]
+# 간단한 프로세스 내부 지표 (카운터 + 소요 시간 요약)
+# 외부 라이브러리 없이 /admin/metrics에서 Prometheus 텍스트 형식으로 내보냅니다.
+# (gunicorn 워커가 여러 개면 워커별 값입니다: pid 라벨로 구분)
+# ----------------------------
+
+_lock = threading.Lock()
+_counters = Counter()
+# {키: [count, sum, max]}
+_timings = {}
+_gauges = {}
+
+
+def _key(name, labels):
+    if not labels:
+        return name
+    return name + "{" + ",".join(f'{k}="{v}"' for k, v in sorted(labels.items())) + "}"
+
+
+def incr(name, value=1, **labels):
+    """ 카운터 증가. 예) metrics.incr("llm_cancelled_total", action="stream_ask", reason="client_disconnect") """
+    with _lock:
+        _counters[_key(name, labels)] += value
+
+
+def observe(name, seconds, **labels):
+    """ 소요 시간 기록 (횟수/합계/최댓값) """
+    key = _key(name, labels)
+    with _lock:
+        entry = _timings.setdefault(key, [0, 0.0, 0.0])
+        entry[0] += 1
+        entry[1] += seconds
+        entry[2] = max(entry[2], seconds)
+
+
+def set_gauge(name, value, **labels):
+    """ 현재 값 기록 (실행 중/대기 중 개수 등) """
+    with _lock:
+        _gauges[_key(name, labels)] = value
+
+
+def snapshot():
+    with _lock:
+        return {
+            "pid": os.getpid(),
+            "counters": dict(_counters),
+            "gauges": dict(_gauges),
+            "timings": {key: {"count": c, "sum": round(s, 6), "max": round(m, 6)} for key, (c, s, m) in _timings.items()},
+        }
+
+
+def render_text():
+    """ Prometheus 텍스트 형식 """
+    data = snapshot()
+    lines = [f"# pid {data['pid']}"]
+    for key, value in sorted(data["counters"].items()) + sorted(data["gauges"].items()):
+        lines.append(f"{key} {value}")
+    for key, timing in sorted(data["timings"].items()):
+        name, _, labels = key.partition("{")
+        labels = "{" + labels if labels else ""
+        lines.append(f"{name}_count{labels} {timing['count']}")
+        lines.append(f"{name}_sum{labels} {timing['sum']}")
+        lines.append(f"{name}_max{labels} {timing['max']}")
+    return "\n".join(lines) + "\n"
+
+
+def reset():
+    with _lock:
+        _counters.clear()
+        _timings.clear()
+        _gauges.clear()
@@ -0,0 +1,313 @@
+import os
+import re
+import hashlib
+import threading
+from collections import Counter, OrderedDict
+
+# ----------------------------
+# [!! ★★★ 신규 ★★★ !!]
+# 프롬프트 입력 정규화 (반복 머리글/바닥글/쪽 번호 + 중복 문단 제거)
+# 강의 PDF/슬라이드는 매 페이지마다 과목명, 교수명, 쪽 번호가 반복되고
+# 같은 슬라이드가 여러 파일에 들어 있는 경우도 많습니다. 이 내용이 모든 프롬프트에 그대로 들어가므로
+# load_all_text_from_data에서 한 번 걸러 토큰(=비용)을 줄입니다.
+# ----------------------------
+
+NORMALIZE_ENABLED = os.getenv("AITER_NORMALIZE", "1") == "1"
+# 이 길이 이하의 줄만 머리글/바닥글 후보로 봅니다.
+BOILERPLATE_MAX_LINE = 80
+# 한 파일의 페이지(구간) 중 이 비율 이상에서 반복되면 머리글/바닥글로 판단
+BOILERPLATE_MIN_RATIO = 0.5
+BOILERPLATE_MIN_PAGES = 3
+# 이 길이 미만의 문단은 중복 검사하지 않음 (짧은 문장은 우연히 같을 수 있음)
+DUPLICATE_MIN_CHARS = 80
+# simhash 해밍 거리 허용치 (64비트 중)
+DUPLICATE_MAX_DISTANCE = 2
+
+# 머리글/바닥글/쪽 번호를 지우는 형식 (XLSX 행, TXT 줄은 숫자만 있는 줄도 내용이므로 건드리지 않음)
+PAGINATED_EXTENSIONS = ('.pdf', '.pptx')
+# 문서별 전처리 결과(줄 정리 + 문단 지문)를 블롭 해시별로 보관할 최대 크기 (원문 바이트 기준)
+PREPARED_CACHE_BYTES = int(os.getenv("AITER_NORMALIZE_CACHE_MB", "256")) * 1024 * 1024
+
+_PAGE_NUMBER_PATTERNS = [
+    re.compile(r"^\s*[-–—(\[]?\s*\d{1,4}\s*[-–—)\]]?\s*$"),                 # "3", "- 3 -", "(3)"
+    re.compile(r"^\s*\d{1,4}\s*/\s*\d{1,4}\s*$"),                            # "3 / 20"
+    re.compile(r"^\s*(page|p\.|slide)\s*\d{1,4}(\s*(of|/)\s*\d{1,4})?\s*$", re.I),  # "Page 3 of 20"
+    re.compile(r"^\s*\d{1,4}\s*(쪽|페이지)\s*$"),                             # "3쪽"
+]
+_DIGITS = re.compile(r"\d+")
+_SPACES = re.compile(r"\s+")
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+
+def estimate_tokens(text):
+    """
+    대략적인 토큰 수. (영문/숫자는 약 4글자당 1토큰, 한글 등 비ASCII는 약 1.5글자당 1토큰)
+    정확한 토크나이저 호출 없이 절감량/한도 계산에 씁니다.
+    """
+    if not text:
+        return 0
+    # (글자 단위 루프 대신 UTF-8 길이 차이로 비ASCII 글자 수를 근사: 한글 1글자 = 3바이트)
+    non_ascii = (len(text.encode('utf-8')) - len(text)) // 2
+    return int((len(text) - non_ascii) / 4 + non_ascii / 1.5) + 1
+
+
+def is_page_number_line(line):
+    return any(pattern.match(line) for pattern in _PAGE_NUMBER_PATTERNS)
+
+
+def _line_key(line):
+    """ 반복 줄 비교용 키 (공백/대소문자만 무시, 숫자는 그대로: "Step 1" != "Step 2") """
+    return _SPACES.sub(" ", line.strip().lower())
+
+
+def _page_number_shape(line):
+    """ 쪽 번호 줄의 모양 ("- 3 -" -> "- # -") : 페이지마다 숫자만 바뀌며 반복되는지 볼 때만 씁니다. """
+    return _DIGITS.sub("#", _line_key(line))
+
+
+def is_paginated(filename):
+    return (filename or "").lower().endswith(PAGINATED_EXTENSIONS)
+
+
+def split_pages(text, segment_index):
+    """ 매니페스트 구간 색인([[label, 오프셋], ...])으로 텍스트를 페이지/슬라이드 단위로 나눕니다. """
+    if not segment_index:
+        return [("", text)]
+    pages = []
+    for i, (label, start) in enumerate(segment_index):
+        end = segment_index[i + 1][1] if i + 1 < len(segment_index) else len(text)
+        pages.append((label, text[start:end]))
+    return pages
+
+
+def _repeat_threshold(page_count):
+    return max(BOILERPLATE_MIN_PAGES, int(page_count * BOILERPLATE_MIN_RATIO + 0.5))
+
+
+def _edge_lines(page_text):
+    """ 페이지의 첫/마지막 비어 있지 않은 줄 번호 """
+    filled = [i for i, line in enumerate(page_text.splitlines()) if line.strip()]
+    return {filled[0], filled[-1]} if filled else set()
+
+
+def find_boilerplate(pages):
+    """ 한 파일 안에서 여러 페이지에 글자 그대로 반복되는 짧은 줄(머리글/바닥글/과목명)의 키 집합 """
+    if len(pages) < BOILERPLATE_MIN_PAGES:
+        return set()
+    counts = Counter()
+    for _, page_text in pages:
+        counts.update({_line_key(line) for line in page_text.splitlines()
+                       if line.strip() and len(line.strip()) <= BOILERPLATE_MAX_LINE})
+    threshold = _repeat_threshold(len(pages))
+    return {key for key, count in counts.items() if count >= threshold}
+
+
+def find_page_number_shapes(pages):
+    """ 페이지 첫/마지막 줄에서 같은 모양의 쪽 번호가 여러 페이지에 반복되면 그 모양의 집합 """
+    if len(pages) < BOILERPLATE_MIN_PAGES:
+        return set()
+    counts = Counter()
+    for _, page_text in pages:
+        lines = page_text.splitlines()
+        counts.update({_page_number_shape(lines[i]) for i in _edge_lines(page_text) if is_page_number_line(lines[i])})
+    threshold = _repeat_threshold(len(pages))
+    return {shape for shape, count in counts.items() if count >= threshold}
+
+
+def strip_boilerplate(pages, filename=""):
+    """
+    파일 1개의 페이지들에서 반복 머리글/바닥글 줄과 쪽 번호 줄을 지웁니다. 반환: ([(label, text)], 지운 줄 수)
+    - 페이지 구분이 있는 형식(PDF/PPTX)만 처리 (XLSX/TXT는 그대로)
+    - 쪽 번호: 페이지의 첫/마지막 줄이면서 같은 모양이 여러 페이지에 반복될 때만
+    """
+    if not is_paginated(filename):
+        return pages, 0
+    boilerplate = find_boilerplate(pages)
+    page_numbers = find_page_number_shapes(pages)
+    if not boilerplate and not page_numbers:
+        return pages, 0
+    cleaned, removed = [], 0
+    for label, page_text in pages:
+        edges = _edge_lines(page_text) if page_numbers else ()
+        kept_lines = []
+        for i, line in enumerate(page_text.splitlines()):
+            if line.strip() and (_line_key(line) in boilerplate or
+                                 (i in edges and is_page_number_line(line) and _page_number_shape(line) in page_numbers)):
+                removed += 1
+                continue
+            kept_lines.append(line)
+        cleaned.append((label, "\n".join(kept_lines)))
+    return cleaned, removed
+
+
+def simhash(text):
+    """ 단어 3-gram 기반 64비트 simhash (문장 일부만 다른 '거의 같은' 문단 비교용) """
+    words = _WORD.findall(text.lower())
+    shingles = [" ".join(words[i:i + 3]) for i in range(max(1, len(words) - 2))]
+    vector = [0] * 64
+    for shingle in shingles:
+        h = int.from_bytes(hashlib.blake2b(shingle.encode('utf-8'), digest_size=8).digest(), 'big')
+        for bit in range(64):
+            vector[bit] += 1 if (h >> bit) & 1 else -1
+    return sum(1 << bit for bit in range(64) if vector[bit] > 0)
+
+
+class _DuplicateIndex:
+    """ 폴더 전체에서 이미 본 문단(정확히 같음 / simhash 근접)을 기억합니다. """
+
+    def __init__(self):
+        self.exact = {}
+        # simhash를 16비트 4조각으로 나눠 버킷팅: 해밍 거리 3 이하면 적어도 한 조각은 반드시 같음
+        self.bands = [dict() for _ in range(4)]
+
+    def find(self, exact_key, fingerprint):
+        if exact_key in self.exact:
+            return self.exact[exact_key]
+        for band, buckets in enumerate(self.bands):
+            for other, origin in buckets.get((fingerprint >> (16 * band)) & 0xFFFF, ()):
+                if bin(fingerprint ^ other).count("1") <= DUPLICATE_MAX_DISTANCE:
+                    return origin
+        return None
+
+    def add(self, exact_key, fingerprint, origin):
+        self.exact[exact_key] = origin
+        for band, buckets in enumerate(self.bands):
+            buckets.setdefault((fingerprint >> (16 * band)) & 0xFFFF, []).append((fingerprint, origin))
+
+
+def _split_blocks(page_text):
+    """ 빈 줄 기준 문단 분리 (빈 줄이 없는 PDF 페이지는 페이지 전체가 한 문단) """
+    return [block.strip("\n") for block in re.split(r"\n\s*\n", page_text) if block.strip()]
+
+
+def content_hash(text):
+    """ 블롭 해시와 같은 방식 (매니페스트에 해시가 없는 문서용) """
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+# --- 문서별 전처리 캐시 (블롭 해시 -> 줄 정리 결과 + 문단 지문) ---
+# simhash는 순수 Python이라 MB당 약 1초가 걸립니다. 폴더에 파일 1개가 추가/삭제돼도
+# 나머지 문서는 저장된 지문으로 중복 대조만 다시 합니다.
+_prepared = OrderedDict()
+_prepared_size = 0
+_prepared_lock = threading.Lock()
+
+
+def _prepare(filename, text, segment_index):
+    pages, removed_lines = strip_boilerplate(split_pages(text, segment_index), filename)
+    prepared_pages = []
+    for label, page_text in pages:
+        blocks = []
+        for block in _split_blocks(page_text):
+            if len(block.strip()) < DUPLICATE_MIN_CHARS:
+                blocks.append((block, None, None))
+                continue
+            # (문단 비교는 숫자까지 그대로: 수식/예제 번호가 다른 문단을 같은 것으로 보지 않도록)
+            exact_key = hashlib.sha1(_SPACES.sub(" ", block.strip().lower()).encode('utf-8')).digest()
+            blocks.append((block, exact_key, simhash(block)))
+        prepared_pages.append((label, blocks))
+    return prepared_pages, removed_lines, len(text.encode('utf-8')), estimate_tokens(text)
+
+
+def prepare_document(filename, text, segment_index, blob_hash=None):
+    """
+    문서 1개의 머리글/바닥글/쪽 번호를 지우고 문단별 비교 키를 계산합니다. (블롭 해시가 같으면 캐시 사용)
+    반환: ([(label, [(문단, 정확 일치 키, simhash)])], 지운 줄 수, 원본 바이트, 원본 토큰 추정치)
+          (DUPLICATE_MIN_CHARS 미만 문단은 키/simhash가 None)
+    """
+    global _prepared_size
+    key = (is_paginated(filename), blob_hash or content_hash(text), len(segment_index or ()))
+    with _prepared_lock:
+        prepared = _prepared.get(key)
+        if prepared is not None:
+            _prepared.move_to_end(key)
+            return prepared
+    prepared = _prepare(filename, text, segment_index)
+    with _prepared_lock:
+        if key not in _prepared:
+            _prepared[key] = prepared
+            _prepared_size += prepared[2]
+        while _prepared_size > PREPARED_CACHE_BYTES and len(_prepared) > 1:
+            _, old = _prepared.popitem(last=False)
+            _prepared_size -= old[2]
+    return prepared
+
+
+def prepared_pages(prepared):
+    """ prepare_document 결과 -> [(label, 정리된 페이지 텍스트)] """
+    return [(label, "\n\n".join(block for block, _, _ in blocks)) for label, blocks in prepared[0]]
+
+
+def normalize_documents(documents):
+    """
+    documents: [(파일명, 텍스트, 구간 색인[, 블롭 해시]), ...]  (파일 순서 = 프롬프트 순서)
+    반환: ([(파일명, 정규화된 텍스트), ...], {파일명: 절감 리포트})
+    - 파일별 반복 머리글/바닥글 줄과 쪽 번호 줄 삭제 (문서별 캐시)
+    - 폴더 전체에서 (거의) 같은 문단은 처음 나온 곳만 남기고 '[중복 생략: 파일 위치]' 표시로 대체
+    """
+    duplicates = _DuplicateIndex()
+    results, report = [], {}
+    for document in documents:
+        filename, text, segment_index = document[:3]
+        pages, removed_lines, original_bytes, original_tokens = prepare_document(
+            filename, text, segment_index, document[3] if len(document) > 3 else None)
+        duplicate_blocks, out_pages = 0, []
+        for label, blocks in pages:
+            out_blocks = []
+            for block, exact_key, fingerprint in blocks:
+                if exact_key is None:
+                    out_blocks.append(block)
+                    continue
+                origin = duplicates.find(exact_key, fingerprint)
+                if origin:
+                    duplicate_blocks += 1
+                    out_blocks.append(f"[중복 생략: {origin}]")
+                    continue
+                duplicates.add(exact_key, fingerprint, f"{filename} {label}".strip())
+                out_blocks.append(block)
+            if out_blocks:
+                out_pages.append("\n\n".join(out_blocks))
+        normalized = "\n\n".join(out_pages)
+        results.append((filename, normalized))
+
+        normalized_bytes = len(normalized.encode('utf-8'))
+        report[filename] = {
+            "original_bytes": original_bytes,
+            "normalized_bytes": normalized_bytes,
+            "bytes_saved": original_bytes - normalized_bytes,
+            "tokens_saved": original_tokens - estimate_tokens(normalized),
+            "boilerplate_lines_removed": removed_lines,
+            "duplicate_blocks_removed": duplicate_blocks,
+        }
+    return results, report
+
+
+# --- 결과 캐시 (사용자별 최근 1건: 파일 구성/내용 해시가 같으면 재계산하지 않음) ---
+_cache = {}
+_cache_lock = threading.Lock()
+_CACHE_MAX_USERS = 64
+
+
+def normalize_cached(user_id, version_key, documents):
+    """
+    version_key(파일명+블롭 해시 튜플)가 같으면 이전 정규화 결과를 그대로 재사용합니다.
+    (다르면 바뀐 문서만 전처리하고, 나머지는 문서별 캐시의 지문으로 중복 대조만 다시 합니다)
+    """
+    with _cache_lock:
+        cached = _cache.get(user_id)
+        if cached and cached[0] == version_key:
+            return cached[1], cached[2]
+    results, report = normalize_documents(documents)
+    with _cache_lock:
+        if len(_cache) >= _CACHE_MAX_USERS and user_id not in _cache:
+            _cache.pop(next(iter(_cache)))
+        _cache[user_id] = (version_key, results, report)
+    return results, report
+
+
+def summarize_report(report):
+    """ 파일별 리포트 합계 """
+    total = Counter()
+    for entry in report.values():
+        total.update(entry)
+    return dict(total)
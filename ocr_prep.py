@@ -0,0 +1,350 @@
+import os
+import io
+import json
+import time
+import shutil
+import hashlib
+import threading
+import importlib.util
+from collections import Counter, namedtuple
+
+import metrics
+
+# ----------------------------
+# [!! ★★★ 신규 ★★★ !!]
+# OCR 전처리 (Gemini 업로드 전에 로컬에서 크기 줄이기)
+# 예전: 20MB 휴대폰 사진/고해상도 스캔 PDF 원본을 그대로 업로드 -> 업로드 시간 + 모델 처리 시간 낭비
+# 지금: - 이미지: 긴 변 AITER_OCR_MAX_EDGE px 이하로 축소 + 흑백 + JPEG 재압축 (AITER_OCR_MAX_BYTES 이하가 될 때까지)
+#       - PDF: 텍스트 층이 있는 페이지는 그 텍스트를 그대로 쓰고,
+#              텍스트가 없는(스캔) 페이지만 AITER_OCR_DPI로 래스터화해 '연속 구간별' 작은 PDF로 묶음
+#       - 결과물은 cache/ocr_prep/에 (원본 해시 + 설정) 키로 저장해 재시도/재실행 시 재사용
+# 설정:
+#   AITER_OCR_PREP=0           전처리 끄기 (원본 업로드, 비교용)
+#   AITER_OCR_DPI=150  AITER_OCR_MAX_EDGE=2200  AITER_OCR_MAX_BYTES=1500000
+#   AITER_OCR_GRAYSCALE=1  AITER_OCR_JPEG_QUALITY=75  AITER_OCR_PREP_CACHE_MB=500
+# 지표: ocr_upload_bytes_total{prepared}, ocr_prep_bytes_saved_total, ocr_prep_seconds, ocr_seconds{prepared}
+# [!! 신규 !!] 분할 OCR (수백 쪽 스캔 PDF)
+#   OCR할 페이지 구간을 AITER_OCR_SPLIT_PAGES쪽 이하 단위로 나눠 동시에 OCR하고(storage._run_manual_ocr),
+#   끝난 구간은 cache/ocr_parts/<user>/<원본 해시>/에 바로 저장 -> 실패하면 다시 실행할 때 남은 구간만 처리
+#   (전처리를 끈 경우에도 PDF는 페이지 구간별 PDF로 잘라서 보냄)
+#   AITER_OCR_SPLIT_PAGES=20 (0이면 나누지 않음)  AITER_OCR_CONCURRENCY=4 (스케줄러 사용자별 동시 실행 수도 적용됨)
+# ----------------------------
+
+PIL_AVAILABLE = importlib.util.find_spec("PIL") is not None
+
+
+def _env_int(name, default):
+    try:
+        return int(os.getenv(name, default))
+    except ValueError:
+        return default
+
+
+PREP_ENABLED = os.getenv("AITER_OCR_PREP", "1") != "0"
+OCR_DPI = _env_int("AITER_OCR_DPI", 150)
+MAX_EDGE = _env_int("AITER_OCR_MAX_EDGE", 2200)
+MAX_IMAGE_BYTES = _env_int("AITER_OCR_MAX_BYTES", 1_500_000)
+GRAYSCALE = os.getenv("AITER_OCR_GRAYSCALE", "1") != "0"
+JPEG_QUALITY = _env_int("AITER_OCR_JPEG_QUALITY", 75)
+CACHE_LIMIT_BYTES = _env_int("AITER_OCR_PREP_CACHE_MB", 500) * 1024 * 1024
+SPLIT_PAGES = _env_int("AITER_OCR_SPLIT_PAGES", 20)
+OCR_CONCURRENCY = max(1, _env_int("AITER_OCR_CONCURRENCY", 4))
+# 이 글자 수 이상 텍스트 층이 있는 PDF 페이지는 OCR 없이 그 텍스트를 사용
+MIN_PAGE_TEXT_CHARS = 50
+PREP_DIR = os.path.join("cache", "ocr_prep")
+CHECKPOINT_DIR = os.path.join("cache", "ocr_parts")
+# 끝까지 마치지 못한 문서의 구간 결과 보관 기간(초)
+CHECKPOINT_MAX_AGE = 7 * 24 * 3600
+# 최근 이 시간(초) 안에 만들었거나 재사용한 결과물은 정리하지 않음 (다른 워커 프로세스의 진행 중인 작업 보호)
+TRIM_GRACE_SECONDS = 600
+
+# 이 프로세스에서 진행 중인 OCR 작업이 쓰는 결과물 {경로: 작업 수} (업로드 전에 정리되지 않도록)
+_in_use = Counter()
+_in_use_lock = threading.Lock()
+
+# OCR 작업 단위
+# pages: 해당하는 PDF 페이지 번호 목록 (이미지 파일은 [1])
+# label: 위치 표시 ("p.3", "p.4-9") - 매니페스트 segments 색인에 그대로 들어감
+# text : 텍스트 층에서 바로 얻은 텍스트 (OCR 불필요) / None
+# path : 업로드할 파일 경로 (전처리 결과물 또는 원본) / None
+# mime : 업로드 MIME 타입
+OcrPart = namedtuple("OcrPart", "pages label text path mime")
+
+
+def _settings_key():
+    return json.dumps([OCR_DPI, MAX_EDGE, MAX_IMAGE_BYTES, GRAYSCALE, JPEG_QUALITY, MIN_PAGE_TEXT_CHARS])
+
+
+def _file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _page_label(pages):
+    return f"p.{pages[0]}" if len(pages) == 1 else f"p.{pages[0]}-{pages[-1]}"
+
+
+def _split_run(pages):
+    """ 연속 OCR 구간을 SPLIT_PAGES쪽 이하 조각으로 (출력 한도 초과/전체 재시도 방지) """
+    if SPLIT_PAGES <= 0:
+        return [pages]
+    return [pages[i:i + SPLIT_PAGES] for i in range(0, len(pages), SPLIT_PAGES)]
+
+
+def encode_image(image):
+    """ PIL 이미지를 OCR용 JPEG 바이트로 (축소/흑백/재압축, 바이트 예산을 넘으면 품질 -> 크기 순으로 낮춤) """
+    from PIL import Image, ImageOps
+    image = ImageOps.exif_transpose(image)  # (휴대폰 사진 회전 정보 반영)
+    image = image.convert("L" if GRAYSCALE else "RGB")
+    if max(image.size) > MAX_EDGE:
+        image.thumbnail((MAX_EDGE, MAX_EDGE), Image.LANCZOS)
+    quality = JPEG_QUALITY
+    while True:
+        buffer = io.BytesIO()
+        image.save(buffer, format="JPEG", quality=quality, optimize=True)
+        data = buffer.getvalue()
+        if len(data) <= MAX_IMAGE_BYTES or min(image.size) < 600:
+            return data
+        if quality > 45:
+            quality -= 15
+        else:
+            image = image.resize((int(image.width * 0.8), int(image.height * 0.8)), Image.LANCZOS)
+
+
+def _render_pages(doc, pages):
+    """ 지정 페이지만 래스터화해 (페이지당 JPEG 1장인) 작은 PDF 바이트로 """
+    import fitz
+    from PIL import Image
+    out = fitz.open()
+    try:
+        for page_number in pages:
+            page = doc[page_number - 1]
+            pix = page.get_pixmap(dpi=OCR_DPI, colorspace=fitz.csGRAY if GRAYSCALE else fitz.csRGB, alpha=False)
+            image = Image.frombytes("L" if GRAYSCALE else "RGB", (pix.width, pix.height), pix.samples)
+            new_page = out.new_page(width=page.rect.width, height=page.rect.height)
+            new_page.insert_image(new_page.rect, stream=encode_image(image))
+        return out.tobytes(garbage=3, deflate=True)
+    finally:
+        out.close()
+
+
+def _plan_pdf(doc):
+    """ 페이지별로 텍스트 층 사용/OCR 여부를 정하고, OCR 페이지는 연속 구간으로 묶습니다. [(pages, text or None)] """
+    plan, run = [], []
+    for page_number, page in enumerate(doc, start=1):
+        text = page.get_text()
+        if len(text.strip()) >= MIN_PAGE_TEXT_CHARS:
+            if run:
+                plan.extend((pages, None) for pages in _split_run(run))
+                run = []
+            plan.append(([page_number], text + "\n"))
+        else:
+            run.append(page_number)
+    if run:
+        plan.extend((pages, None) for pages in _split_run(run))
+    if all(text is not None for _, text in plan):
+        # (모든 페이지에 텍스트 층이 있는데 사용자가 OCR을 요청 -> 텍스트 층을 믿지 않고 전체를 OCR)
+        return [(pages, None) for pages in _split_run(list(range(1, doc.page_count + 1)))]
+    return plan
+
+
+def _slice_pdf(doc, pages):
+    """ (전처리 없이) 원본 PDF에서 연속 페이지 구간만 잘라낸 PDF 바이트 """
+    import fitz
+    out = fitz.open()
+    try:
+        out.insert_pdf(doc, from_page=pages[0] - 1, to_page=pages[-1] - 1)
+        return out.tobytes(garbage=3, deflate=True)
+    finally:
+        out.close()
+
+
+def _split_original(file_path, source_hash):
+    """ 전처리를 못 하는 경우: 쪽수가 많은 PDF만 페이지 구간별 원본 PDF 조각으로, 나머지는 원본 1개 """
+    if file_path.lower().endswith('.pdf') and SPLIT_PAGES > 0 and importlib.util.find_spec("fitz") is not None:
+        import fitz
+        doc = fitz.open(file_path)
+        try:
+            if doc.page_count > SPLIT_PAGES:
+                parts = []
+                for pages in _split_run(list(range(1, doc.page_count + 1))):
+                    path, _ = _cached_artifact(_artifact_path(source_hash, f"raw-{pages[0]}-{pages[-1]}.pdf"),
+                                               lambda pages=pages: _slice_pdf(doc, pages))
+                    parts.append(OcrPart(pages, _page_label(pages), None, path, "application/pdf"))
+                return parts
+        finally:
+            doc.close()
+    return [OcrPart([1], "", None, file_path, None)]
+
+
+def _artifact_path(source_hash, suffix):
+    os.makedirs(PREP_DIR, exist_ok=True)
+    key = hashlib.sha256(f"{source_hash}|{_settings_key()}|{suffix}".encode('utf-8')).hexdigest()[:32]
+    return os.path.join(PREP_DIR, key + os.path.splitext(suffix)[1])
+
+
+def _write_artifact(path, data):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def _cached_artifact(path, build):
+    """ 결과물이 있으면 재사용(mtime 갱신 -> LRU), 없으면 build()로 만들어 저장 """
+    if os.path.exists(path):
+        os.utime(path)
+        return path, True
+    _write_artifact(path, build())
+    return path, False
+
+
+def prepare(file_path):
+    """
+    OCR할 파일을 작업 단위(OcrPart) 목록으로 바꿉니다.
+    반환: (parts, report)  report = {"original_bytes", "upload_bytes", "cache_hits", "text_pages", "ocr_pages", "seconds"}
+    (전처리를 끄거나 Pillow가 없으면 원본 1개를 그대로 업로드하는 단위 1개)
+    """
+    started = time.perf_counter()
+    original_bytes = os.path.getsize(file_path)
+    lower = file_path.lower()
+    source_hash = _file_sha256(file_path)
+    if not PREP_ENABLED or not PIL_AVAILABLE:
+        parts = _split_original(file_path, source_hash)
+        _hold(parts)
+        return parts, {
+            "original_bytes": original_bytes, "upload_bytes": sum(os.path.getsize(part.path) for part in parts),
+            "cache_hits": 0, "text_pages": 0, "ocr_pages": None, "seconds": round(time.perf_counter() - started, 3),
+            "prepared": False, "source_hash": source_hash}
+
+    parts, cache_hits = [], 0
+    if lower.endswith('.pdf'):
+        import fitz
+        doc = fitz.open(file_path)
+        try:
+            for pages, text in _plan_pdf(doc):
+                if text is not None:
+                    parts.append(OcrPart(pages, _page_label(pages), text, None, None))
+                    continue
+                path, hit = _cached_artifact(_artifact_path(source_hash, f"{pages[0]}-{pages[-1]}.pdf"),
+                                             lambda pages=pages: _render_pages(doc, pages))
+                cache_hits += hit
+                parts.append(OcrPart(pages, _page_label(pages), None, path, "application/pdf"))
+        finally:
+            doc.close()
+    else:
+        from PIL import Image
+
+        def build():
+            with Image.open(file_path) as image:
+                return encode_image(image)
+        path, hit = _cached_artifact(_artifact_path(source_hash, "image.jpg"), build)
+        cache_hits += hit
+        parts.append(OcrPart([1], "", None, path, "image/jpeg"))
+
+    upload_bytes = sum(os.path.getsize(part.path) for part in parts if part.path)
+    report = {
+        "original_bytes": original_bytes, "upload_bytes": upload_bytes, "cache_hits": cache_hits,
+        "text_pages": sum(len(part.pages) for part in parts if part.text is not None),
+        "ocr_pages": sum(len(part.pages) for part in parts if part.path),
+        "seconds": round(time.perf_counter() - started, 3), "prepared": True, "source_hash": source_hash,
+    }
+    metrics.observe("ocr_prep_seconds", report["seconds"])
+    metrics.incr("ocr_prep_bytes_saved_total", max(0, original_bytes - upload_bytes))
+    _hold(parts)
+    print(f"🗜️ [OCR-Prep] '{os.path.basename(file_path)}' {original_bytes / 1e6:.2f}MB -> {upload_bytes / 1e6:.2f}MB "
+          f"(텍스트 층 {report['text_pages']}쪽, OCR {report['ocr_pages']}쪽, 캐시 {cache_hits}건, {report['seconds']:.2f}s)")
+    return parts, report
+
+
+def _hold(parts):
+    with _in_use_lock:
+        _in_use.update(part.path for part in parts if part.path)
+
+
+def release(parts):
+    """
+    prepare()로 받은 결과물을 다 썼을 때 호출 (OCR 끝난 뒤, 요청 처리 경로 밖에서).
+    사용 표시를 풀고 캐시 폴더가 한도를 넘었으면 정리합니다.
+    """
+    with _in_use_lock:
+        _in_use.subtract(part.path for part in parts if part.path)
+        for path in [path for path, count in _in_use.items() if count <= 0]:
+            del _in_use[path]
+    _trim_cache()
+
+
+def _trim_cache():
+    """ 전처리 결과물 폴더가 한도를 넘으면 오래 쓰지 않은 것부터 삭제 (진행 중인 작업의 결과물은 제외) """
+    try:
+        entries = [(entry.stat().st_mtime, entry.stat().st_size, entry.path) for entry in os.scandir(PREP_DIR)
+                   if entry.is_file() and not entry.name.endswith(".tmp")]
+    except OSError:
+        return
+    with _in_use_lock:
+        in_use = {os.path.abspath(path) for path in _in_use}
+    recent = time.time() - TRIM_GRACE_SECONDS
+    total = sum(size for _, size, _ in entries)
+    for mtime, size, path in sorted(entries):
+        if total <= CACHE_LIMIT_BYTES:
+            break
+        if mtime >= recent or os.path.abspath(path) in in_use:
+            continue
+        try:
+            os.remove(path)
+            total -= size
+        except OSError:
+            pass
+
+
+# ----------------------------
+# 구간별 OCR 결과 체크포인트
+# ----------------------------
+def checkpoint_dir(user_id, report):
+    """ 원본 내용 + 전처리 설정이 같을 때만 같은 폴더 (원본이 바뀌면 이전 구간 결과는 쓰지 않음) """
+    settings = hashlib.sha256(f"{_settings_key()}|{SPLIT_PAGES}|{report.get('prepared')}".encode('utf-8')).hexdigest()[:8]
+    return os.path.join(CHECKPOINT_DIR, user_id, f"{report['source_hash'][:32]}_{settings}")
+
+
+def _checkpoint_file(directory, part):
+    return os.path.join(directory, f"{part.pages[0]}-{part.pages[-1]}.txt")
+
+
+def load_checkpoint(directory, part):
+    try:
+        with open(_checkpoint_file(directory, part), 'r', encoding='utf-8') as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+
+def save_checkpoint(directory, part, text):
+    os.makedirs(directory, exist_ok=True)
+    _write_artifact(_checkpoint_file(directory, part), (text or "").encode('utf-8'))
+
+
+def clear_checkpoints(directory):
+    """ 문서 전체가 저장된 뒤 호출: 이 문서의 구간 결과 + 오래 방치된 다른 문서의 구간 결과 삭제 """
+    shutil.rmtree(directory, ignore_errors=True)
+    user_dir = os.path.dirname(directory)
+    try:
+        entries = list(os.scandir(user_dir))
+    except OSError:
+        return
+    for entry in entries:
+        try:
+            if entry.is_dir() and time.time() - entry.stat().st_mtime > CHECKPOINT_MAX_AGE:
+                shutil.rmtree(entry.path, ignore_errors=True)
+        except OSError:
+            pass
+
+
+def record_ocr(report, seconds):
+    """ OCR 1건의 업로드 바이트/소요 시간 기록 (prepared 라벨로 전처리 전후 비교) """
+    prepared = "1" if report.get("prepared") else "0"
+    metrics.incr("ocr_upload_bytes_total", report["upload_bytes"], prepared=prepared)
+    metrics.incr("ocr_original_bytes_total", report["original_bytes"], prepared=prepared)
+    metrics.observe("ocr_seconds", seconds, prepared=prepared)
@@ -0,0 +1,208 @@
+import os
+import sys
+import time
+import random
+import threading
+from collections import Counter
+from flask import request, g
+
+import metrics
+
+# ----------------------------
+# [!! ★★★ 신규 ★★★ !!]
+# 요청 단위 프로파일링 (운영 환경에서 느린 라우트 원인 찾기)
+#   AITER_PROFILE=1            훅 등록 (설정하지 않으면 훅 자체를 등록하지 않음 -> 오버헤드 0)
+#   AITER_PROFILE_RATE=0.01    무작위로 프로파일링할 요청 비율
+#   AITER_PROFILE_MODE=sample  sample(스택 샘플링, 기본) | cprofile
+#   AITER_PROFILE_INTERVAL=0.005  샘플링 간격(초)
+# 특정 요청만: 헤더 `X-Profile: 1` + `X-Admin-Token: <AITER_ADMIN_TOKEN>`
+# 결과: cache/profiles/<endpoint>.folded  (flamegraph.pl / speedscope에 바로 넣을 수 있는 collapsed stack)
+#       cache/profiles/<endpoint>/<시각>.prof  (cprofile 모드, pstats로 열기)
+# 조회: /admin/profiles, /admin/profiles/<endpoint>
+# ----------------------------
+
+PROFILE_DIR = os.path.join("cache", "profiles")
+MAX_PROF_FILES_PER_ROUTE = 20
+
+_lock = threading.Lock()
+# {endpoint: Counter({"a;b;c": 샘플 수})}
+_stacks = {}
+# {endpoint: {"requests": n, "total_ms": x, "max_ms": y}}
+_summary = {}
+_sampler = None
+
+
+def _safe_name(endpoint):
+    return "".join(ch if ch.isalnum() or ch in "._-" else "_" for ch in endpoint or "unknown")
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _collapse(frame):
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    return ";".join(reversed(labels))
+
+
+class _StackSampler:
+    """ 프로파일링 중인 요청 스레드들의 스택을 일정 간격으로 수집하는 단일 백그라운드 스레드 """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self._active = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+        self._thread.start()
+
+    def start(self, thread_id):
+        counter = Counter()
+        with self._lock:
+            self._active[thread_id] = counter
+        self._wakeup.set()
+        return counter
+
+    def stop(self, thread_id):
+        with self._lock:
+            return self._active.pop(thread_id, Counter())
+
+    def _run(self):
+        me = threading.get_ident()
+        while True:
+            with self._lock:
+                active = dict(self._active)
+            if not active:
+                # (프로파일링 중인 요청이 없으면 잠들어 있음)
+                self._wakeup.wait()
+                self._wakeup.clear()
+                continue
+            frames = sys._current_frames()
+            stacks = {thread_id: _collapse(frames[thread_id]) for thread_id in active
+                      if thread_id in frames and thread_id != me}
+            del frames
+            # (수집하는 사이 stop()된 요청은 건너뜀: 넘겨준 카운터를 요청 스레드가 읽는 중일 수 있음)
+            with self._lock:
+                for thread_id, stack in stacks.items():
+                    counter = self._active.get(thread_id)
+                    if counter is active[thread_id]:
+                        counter[stack] += 1
+            time.sleep(self.interval)
+
+
+def _should_profile():
+    if request.path.startswith('/static') or request.blueprint == 'admin':
+        return False
+    if request.headers.get("X-Profile") == "1":
+        from routes_admin import is_admin_request
+        if is_admin_request():
+            return True
+    return random.random() < float(os.getenv("AITER_PROFILE_RATE", "0.01"))
+
+
+def _before_request():
+    if not _should_profile():
+        return
+    g._profile_started = time.perf_counter()
+    if os.getenv("AITER_PROFILE_MODE", "sample") == "cprofile":
+        import cProfile
+        g._profiler = cProfile.Profile()
+        g._profiler.enable()
+    else:
+        g._profile_thread = threading.get_ident()
+        _sampler.start(g._profile_thread)
+
+
+def _teardown_request(error=None):
+    started = g.pop("_profile_started", None)
+    if started is None:
+        return
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    endpoint = request.endpoint or "unknown"
+    profiler = g.pop("_profiler", None)
+    if profiler is not None:
+        profiler.disable()
+        _save_cprofile(endpoint, profiler)
+    else:
+        _record_samples(endpoint, _sampler.stop(g.pop("_profile_thread")))
+    with _lock:
+        summary = _summary.setdefault(endpoint, {"requests": 0, "total_ms": 0.0, "max_ms": 0.0})
+        summary["requests"] += 1
+        summary["total_ms"] += elapsed_ms
+        summary["max_ms"] = max(summary["max_ms"], elapsed_ms)
+    metrics.incr("profiled_requests_total", endpoint=endpoint)
+    print(f"🔬 [Profile] '{endpoint}' {elapsed_ms:.1f}ms 프로파일 저장")
+
+
+def _record_samples(endpoint, samples):
+    if not samples:
+        return
+    with _lock:
+        stacks = _stacks.setdefault(endpoint, Counter())
+        stacks.update(samples)
+        text = "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    path = os.path.join(PROFILE_DIR, _safe_name(endpoint) + ".folded")
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(path + ".tmp", path)
+
+
+def _save_cprofile(endpoint, profiler):
+    route_dir = os.path.join(PROFILE_DIR, _safe_name(endpoint))
+    os.makedirs(route_dir, exist_ok=True)
+    profiler.dump_stats(os.path.join(route_dir, f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}.prof"))
+    # (오래된 파일 정리)
+    files = sorted(os.listdir(route_dir))
+    for name in files[:-MAX_PROF_FILES_PER_ROUTE]:
+        try: os.remove(os.path.join(route_dir, name))
+        except OSError: pass
+
+
+def list_profiles():
+    """ 라우트별 프로파일 요약 (이 워커 프로세스 기준 + 디스크에 남은 파일) """
+    with _lock:
+        result = {endpoint: dict(summary, samples=sum(_stacks.get(endpoint, Counter()).values()))
+                  for endpoint, summary in _summary.items()}
+    if os.path.isdir(PROFILE_DIR):
+        for name in os.listdir(PROFILE_DIR):
+            endpoint = name[:-len(".folded")] if name.endswith(".folded") else name
+            entry = result.setdefault(endpoint, {})
+            if name.endswith(".folded"):
+                entry["folded_file"] = os.path.join(PROFILE_DIR, name)
+            elif os.path.isdir(os.path.join(PROFILE_DIR, name)):
+                entry["prof_files"] = sorted(os.listdir(os.path.join(PROFILE_DIR, name)))
+    return result
+
+
+def read_folded(endpoint):
+    path = os.path.join(PROFILE_DIR, _safe_name(endpoint) + ".folded")
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return f.read()
+
+
+def reset_profiles():
+    with _lock:
+        _stacks.clear()
+        _summary.clear()
+
+
+def init_app(app):
+    """ AITER_PROFILE=1일 때만 훅과 샘플러 스레드를 등록합니다. """
+    global _sampler
+    if os.getenv("AITER_PROFILE", "0") != "1":
+        return False
+    if os.getenv("AITER_PROFILE_MODE", "sample") != "cprofile" and _sampler is None:
+        _sampler = _StackSampler(float(os.getenv("AITER_PROFILE_INTERVAL", "0.005")))
+    # (로그인 확인 등 다른 훅보다 먼저 실행되도록 맨 앞에 등록)
+    app.before_request_funcs.setdefault(None, []).insert(0, _before_request)
+    app.teardown_request(_teardown_request)
+    print(f"🔬 [Profile] 요청 프로파일링 활성화 (비율 {os.getenv('AITER_PROFILE_RATE', '0.01')}, "
+          f"모드 {os.getenv('AITER_PROFILE_MODE', 'sample')})")
+    return True
@@ -14,6 +14,19 @@ LATEX_FIX_INSTRUCTION = """[중요 지시]:
 # 3. .format()으로 주입될 변수(예: context_to_use)는 {단일 중괄호}를 씁니다.
 # 4. .format()이 무시해야 할 LaTeX 수식(예: t+1)은 {{이중 중괄호}}를 씁니다.
 
+# [정답 키] 퀴즈 생성 프롬프트 끝에 붙이는 구조화 정답 지시어
+# (.format()을 거치므로 JSON 예시의 중괄호는 {{이중 중괄호}}로 씁니다.)
+ANSWER_KEY_INSTRUCTION = """
+
+[정답 키 출력 규칙]
+1. 모든 문제의 보기는 반드시 A, B, C, D 네 개로 표기하세요. (예: "A) ...")
+2. 문제를 모두 출력한 뒤, 맨 마지막에 [ANSWER_KEY] 와 [/ANSWER_KEY] 사이에 아래 형식의 JSON만 출력하세요.
+3. 이 JSON은 채점용이며 사용자에게 보이지 않습니다. JSON 바깥(문제 본문)에는 절대로 정답이나 정답 목록을 쓰지 마세요.
+4. "concept"에는 문제가 묻는 핵심 개념명을, "source"에는 근거 파일명을, "evidence"에는 정답의 근거가 되는 문서 속 문장을 짧게 그대로 옮겨 적으세요.
+[ANSWER_KEY]
+{{"questions": [{{"no": 1, "question": "문제 내용", "choices": {{"A": "...", "B": "...", "C": "...", "D": "..."}}, "answer": "B", "concept": "핵심 개념", "source": "파일명", "evidence": "근거 문장"}}]}}
+[/ANSWER_KEY]"""
+
 # 1. 답변 핵심 추출
 EXTRACT_ANSWER_PROMPT = """당신은 [텍스트]의 모든 개념을 추출하는 '핵심 정리 봇'입니다.
 [중요 지시]: 절대로 \\msubGt, \\msubRt 같은 \\msub... 코드를 사용하지 마세요. 항상 $G_t$, $R_t$ 처럼 정상적인 LaTeX 수식($...$ 또는 $$...$$)을 사용하세요.
@@ -30,7 +43,7 @@ EXTRACT_ALL_PROMPT = """당신은 제공된 [전체 문서]의 모든 개념을
 QUIZ_ALL_PROMPT = """당신은 제공된 [전체 문서]에서 중요한 개념을 바탕으로 객관식 퀴즈 20개를 생성하는 퀴즈 봇입니다.
 [중요 지시]: 절대로 \\msubGt, \\msubRt 같은 \\msub... 코드를 사용하지 마세요. 항상 $G_t$, $R_t$ 처럼 정상적인 LaTeX 수식($...$ 또는 $$...$$)을 사용하세요.
 [전체 문서]
-{context_to_use}"""
+{context_to_use}""" + ANSWER_KEY_INSTRUCTION
 
 # 4. 퀴즈 채점하기
 GRADE_QUIZ_PROMPT = """당신은 [원본 문서]를 기준으로 [퀴즈 문제]에 대한 [사용자 답안]을 채점하는 교사입니다.
@@ -78,15 +91,15 @@ QUIZ_WEAKNESS_PROMPT = """당신은 퀴즈 봇입니다.
 [작업 지시]
 1. [학생의 약점] 목록은 학생이 이전에 틀렸던 개념들입니다.
 2. 이 개념들을 **유사하지만 새로운 방식**으로 묻는 객관식 퀴즈 5개를 생성합니다.
-3. 절대로, 절대로 정답(A)이나 [정답 목록]을 생성하지 마세요.
+3. 절대로, 절대로 문제 본문에 정답(A)이나 [정답 목록]을 쓰지 마세요. 정답은 아래 [정답 키]에만 적습니다.
 [학생의 약점]
-{odap_content}"""
+{odap_content}""" + ANSWER_KEY_INSTRUCTION
 
 # 8. 선택 파일 퀴즈
 QUIZ_SELECTED_PROMPT = """당신은 제공된 [선택 문서]에서 중요한 개념을 바탕으로 객관식 퀴즈 20개를 생성하는 퀴즈 봇입니다.
 [중요 지시]: 절대로 \\msubGt, \\msubRt 같은 \\msub... 코드를 사용하지 마세요. 항상 $G_t$, $R_t$ 처럼 정상적인 LaTeX 수식($...$ 또는 $$...$$)을 사용하세요.
 [선택 문서]
-{context_to_use}"""
+{context_to_use}""" + ANSWER_KEY_INSTRUCTION
 
 # 9. 연관 분석 (마인드맵)
 CORRELATION_PROMPT = """당신은 [전체 문서] 내에서 여러 주제(Topic) 간의 '상호 연관 관계'를 상세하게 분석하는 전문가입니다.
@@ -119,6 +132,35 @@ CORRELATION_PROMPT = """당신은 [전체 문서] 내에서 여러 주제(Topic)
 [전체 문서]
 {context_to_use}"""
 
+# 9-1. 연관 분석 (유사 구절 기반, 신규)
+# 파일 전체 대신 로컬 TF-IDF로 찾은 '파일 간 연결 구절 쌍'만 전달합니다. (similarity.py)
+CORRELATION_PASSAGES_PROMPT = """당신은 여러 문서 사이의 '상호 연관 관계'를 상세하게 분석하는 전문가입니다.
+[중요 지시]: 절대로 \\msubGt, \\msubRt 같은 \\msub... 코드를 사용하지 마세요. 항상 $G_t$, $R_t$ 처럼 정상적인 LaTeX 수식($...$ 또는 $$...$$)을 사용하세요.
+
+[입력 설명]
+- [파일 간 연관도]: 로컬 유사도 분석으로 계산한 파일 쌍별 내용 겹침 정도 (0~1)
+- [연결 구절]: 서로 다른 파일에서 내용이 가장 많이 겹치는 구절 쌍 (출처: 파일명 + 페이지/슬라이드)
+
+[작업 지시]
+1.  [연결 구절]에 나타나는 주요 주제(Topic)들을 식별하고, 주제별로 `## 주제명` 섹션을 생성합니다.
+2.  `**설명:**` 항목에는 해당 주제를 [연결 구절]의 내용으로 상세히 설명합니다. **구절에 수식(LaTeX)이 있다면 반드시 원본 그대로 포함하세요.**
+3.  `**연관 항목:**` 항목에는 이 주제가 다른 파일/주제와 어떻게 연결되는지 구체적으로 명시하고, 근거 출처를 `(파일명 p.3)`처럼 표기합니다.
+4.  연관도가 높은 파일 쌍부터 다루고, 구절에 없는 내용을 지어내지 마세요.
+
+[출력 형식 예시]
+## 주제 A (예: 몬테카를로 방법)
+**설명:**
+(구절에 근거한 상세 설명... $V(S_t)$의 타겟값은 $G_t$입니다.)
+
+**연관 항목:**
+* **시간차 학습(TD):** MC는 TD와 달리 부트스트랩을 사용하지 않습니다. (강의5.pdf p.3 / 강의6.pdf p.2)
+
+[파일 간 연관도]
+{file_links}
+
+[연결 구절]
+{passage_pairs}"""
+
 # 10. 스트리밍 질문하기
 # [!! ★★★ 수정 ★★★ !!]
 # '에만 근거하여' -> '을 참고하여'로 변경.
@@ -149,4 +191,39 @@ STREAM_CHAT_PROMPT = """당신은 [현재 대화 맥락]을 바탕으로 사용
 
 [현재 대화 맥락]
 {context_to_use}
-"""
\ No newline at end of file
+"""
+
+# 12. 오답 해설 (신규)
+# 채점은 [정답 키]로 로컬에서 끝내고, 틀린 문제의 해설만 관련 원문 구절과 함께 요청합니다.
+EXPLAIN_WRONG_ANSWERS_PROMPT = """당신은 학생이 틀린 [오답 목록]의 각 문제에 대해 [관련 원문]에 근거한 해설을 작성하는 교사입니다.
+[중요 지시]: 절대로 \\msubGt, \\msubRt 같은 \\msub... 코드를 사용하지 마세요. 항상 $G_t$, $R_t$ 처럼 정상적인 LaTeX 수식($...$ 또는 $$...$$)을 사용하세요.
+[작업 지시]
+1. 각 문제마다 왜 [정답]이 맞고 [학생 답]이 틀렸는지 2~4문장으로 설명하세요.
+2. 설명은 [관련 원문]에 근거하되, 원문이 부족하면 당신의 지식으로 보충하세요.
+3. 반드시 문제 번호를 키로 하는 JSON 객체 하나만 출력하세요. 예: {{"3": "해설...", "7": "해설..."}}
+
+[오답 목록]
+{wrong_items}
+
+[관련 원문]
+{passages}
+"""
+# 13. 보조 질문창 대화 요약 (신규)
+# (오래된 대화 턴을 요약에 접어 넣어 매 요청 프롬프트 크기를 일정하게 유지)
+CHAT_SUMMARIZE_PROMPT = """당신은 학습 도우미와 학생의 대화를 짧게 요약하는 봇입니다.
+[기존 요약]과 [새 대화]를 합쳐, 이후 대화에 필요한 내용(학생이 물어본 것, 확인된 사실, 남은 궁금증)만 한국어 10줄 이내로 정리하세요.
+인사말이나 군더더기 없이 요약만 출력하고, 마크다운 문법(예: **, ##)은 사용하지 마세요.
+
+[기존 요약]
+{summary}
+
+[새 대화]
+{turns}
+"""
+
+# 13-1. 스트리밍 프롬프트 뒤에 붙이는 이전 대화 요약 (요약이 있을 때만)
+CHAT_SUMMARY_SECTION = """
+
+[이전 대화 요약]
+{summary}
+"""
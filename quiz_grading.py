@@ -0,0 +1,232 @@
+import re
+import json
+import html
+
+# ----------------------------
+# [!! ★★★ 신규 ★★★ !!]
+# 구조화된 퀴즈 정답 키 파싱 + 로컬 채점
+# (객관식은 LLM 없이 즉시 채점하고, 틀린 문제의 해설만 LLM에 요청합니다)
+# ----------------------------
+
+ANSWER_KEY_PATTERN = re.compile(r"\[ANSWER_KEY\](.*?)(?:\[/ANSWER_KEY\]|$)", re.DOTALL)
+CHOICE_LETTERS = "ABCDE"
+# '①', '1' 같은 보기 번호를 알파벳으로 통일합니다.
+CHOICE_ALIASES = {
+    "①": "A", "②": "B", "③": "C", "④": "D", "⑤": "E",
+    "1": "A", "2": "B", "3": "C", "4": "D", "5": "E",
+    "ㄱ": "A", "ㄴ": "B", "ㄷ": "C", "ㄹ": "D",
+}
+# 문제 번호 + ('번' 또는 구분 기호) + 보기. 구분 없이 붙은 "2 3"은 숫자 나열(목록 입력)로 봅니다.
+USER_ANSWER_PATTERN = re.compile(r"(\d{1,3})\s*(번?)\s*([.):\-=]?)\s*([A-Ea-e①②③④⑤](?![A-Za-z])|[1-5](?!\d))")
+# 해설에 넣을 원문 구절 예산 (문자 수)
+MAX_PASSAGE_CHARS = 6000
+PASSAGES_PER_QUESTION = 2
+
+
+def normalize_choice(value):
+    """ 'b', '②', '2' -> 'B' 처럼 보기 표기를 통일합니다. (인식 불가 시 None) """
+    if value is None:
+        return None
+    value = str(value).strip().strip(".)]").upper()
+    if not value:
+        return None
+    if value[0] in CHOICE_LETTERS:
+        return value[0]
+    return CHOICE_ALIASES.get(value[0])
+
+
+def split_answer_key(raw_text):
+    """
+    LLM이 생성한 퀴즈 원문에서 [ANSWER_KEY] JSON 블록을 떼어냅니다.
+    반환: (사용자에게 보여줄 텍스트, 정답 키 리스트 또는 None)
+    """
+    match = ANSWER_KEY_PATTERN.search(raw_text or "")
+    if not match:
+        return (raw_text or "").strip(), None
+
+    display_text = (raw_text[:match.start()] + raw_text[match.end():]).strip()
+    body = match.group(1).strip()
+    # ```json ... ``` 코드 펜스가 섞여 오는 경우 제거
+    body = re.sub(r"^```(?:json)?|```$", "", body, flags=re.MULTILINE).strip()
+
+    try:
+        parsed = json.loads(body)
+    except ValueError:
+        print("⚠️ [Quiz] 정답 키 JSON 파싱 실패. LLM 채점으로 대체됩니다.")
+        return display_text, None
+
+    questions = parsed.get("questions", []) if isinstance(parsed, dict) else parsed
+    answer_key = []
+    for index, item in enumerate(questions if isinstance(questions, list) else []):
+        if not isinstance(item, dict):
+            continue
+        answer = normalize_choice(item.get("answer"))
+        if not answer:
+            continue
+        try:
+            number = int(item.get("no", index + 1))
+        except (TypeError, ValueError):
+            number = index + 1
+        choices = item.get("choices") if isinstance(item.get("choices"), dict) else {}
+        answer_key.append({
+            "no": number,
+            "question": str(item.get("question", "")).strip(),
+            "choices": {normalize_choice(k) or str(k): str(v) for k, v in choices.items()},
+            "answer": answer,
+            "concept": str(item.get("concept", "")).strip(),
+            "source": str(item.get("source", "")).strip(),
+            "evidence": str(item.get("evidence", "")).strip(),
+        })
+
+    return display_text, (answer_key or None)
+
+
+def parse_user_answers(text, question_count):
+    """
+    사용자 답안 문자열을 {문제 번호: 'A'} 로 변환합니다.
+    지원 형식: "1.A 2.B", "1번 C", "1) ②", "1 A", 줄/공백 단위 "B" 또는 "2" 나열, "ABCD..." 연속 입력
+    (번호 뒤 보기가 숫자이면 '번'이나 구분 기호가 있어야 번호로 봄: "2 3 1 4"는 4문제의 답 나열)
+
+    >>> parse_user_answers("1.A 2.b 3) ③ 4번 4", 4)
+    {1: 'A', 2: 'B', 3: 'C', 4: 'D'}
+    >>> parse_user_answers("1 A 2 C", 2)
+    {1: 'A', 2: 'C'}
+    >>> parse_user_answers("2 3 1 4", 4)
+    {1: 'B', 2: 'C', 3: 'A', 4: 'D'}
+    >>> parse_user_answers("2\\n3\\n1\\n4", 4)
+    {1: 'B', 2: 'C', 3: 'A', 4: 'D'}
+    >>> parse_user_answers("B\\nC\\nA", 3)
+    {1: 'B', 2: 'C', 3: 'A'}
+    >>> parse_user_answers("ABD", 3)
+    {1: 'A', 2: 'B', 3: 'D'}
+    """
+    text = (text or "").strip()
+    answers = {}
+
+    for number, marker, separator, choice in USER_ANSWER_PATTERN.findall(text):
+        if not marker and not separator and choice.isdigit():
+            continue
+        letter = normalize_choice(choice)
+        if letter:
+            answers[int(number)] = letter
+    if answers:
+        return answers
+
+    # 번호 없이 줄 단위 또는 공백 단위로 나열한 경우
+    tokens = [t for t in re.split(r"[\s,/]+", text) if t]
+    if len(tokens) > 1:
+        for index, token in enumerate(tokens[:question_count], start=1):
+            letter = normalize_choice(token)
+            if letter:
+                answers[index] = letter
+        return answers
+
+    # "ABCDA..." 처럼 한 덩어리로 입력한 경우
+    compact = re.sub(r"[^A-Ea-e①②③④⑤]", "", text)
+    for index, choice in enumerate(compact[:question_count], start=1):
+        answers[index] = normalize_choice(choice)
+    return answers
+
+
+def grade_answers(answer_key, user_answers):
+    """ 정답 키와 사용자 답안을 비교해 문제별 결과 리스트를 반환합니다. """
+    results = []
+    for item in answer_key:
+        user_choice = user_answers.get(item["no"])
+        results.append(dict(item, user_answer=user_choice, is_correct=(user_choice == item["answer"])))
+    return results
+
+
+def _format_choice(item, letter):
+    if not letter:
+        return "(미응답)"
+    choice_text = item.get("choices", {}).get(letter)
+    return f"{letter}) {choice_text}" if choice_text else letter
+
+
+def format_wrong_item(item, explanation=""):
+    """ 틀린 문제 하나를 오답노트/채점 결과용 텍스트 블록으로 만듭니다. """
+    lines = [f"{item['no']}. {item.get('question') or '(문제)'} (X)"]
+    lines.append(f"[정답] {_format_choice(item, item['answer'])}")
+    lines.append(f"[내 답] {_format_choice(item, item.get('user_answer'))}")
+    if explanation:
+        lines.append(f"[해설] {explanation}")
+    return "\n".join(lines)
+
+
+def build_grade_report(results, explanations):
+    """ 채점 결과 전체 텍스트 (기존 GRADE_QUIZ_PROMPT 출력과 같은 모양) """
+    blocks = []
+    for item in results:
+        if item["is_correct"]:
+            blocks.append(f"{item['no']}. (O)")
+        else:
+            blocks.append(format_wrong_item(item, explanations.get(item["no"], "")))
+    correct_count = sum(1 for item in results if item["is_correct"])
+    blocks.append(f"총 {len(results)}문제 중 {correct_count}개 맞았습니다.")
+    return "\n\n".join(blocks)
+
+
+def parse_explanations(raw_text):
+    """ 해설 LLM 응답({"3": "..."})을 {3: "..."} 로 변환합니다. """
+    body = re.sub(r"^```(?:json)?|```$", "", (raw_text or "").strip(), flags=re.MULTILINE).strip()
+    start, end = body.find("{"), body.rfind("}")
+    if start == -1 or end == -1:
+        return {}
+    try:
+        parsed = json.loads(body[start:end + 1])
+    except ValueError:
+        return {}
+    explanations = {}
+    for key, value in parsed.items():
+        try:
+            explanations[int(key)] = str(value).strip()
+        except (TypeError, ValueError):
+            continue
+    return explanations
+
+
+# ----------------------------
+# 관련 원문 구절 선택 (전체 코퍼스 대신 필요한 부분만 전송)
+# ----------------------------
+def _terms(text):
+    return {t for t in re.findall(r"[0-9A-Za-z가-힣_]{2,}", (text or "").lower())}
+
+
+def select_passages(corpus_text, wrong_items, max_chars=MAX_PASSAGE_CHARS):
+    """
+    전체 문서를 문단 단위로 나누고, 틀린 문제의 문제/정답/근거 문장과
+    단어가 가장 많이 겹치는 문단만 골라 반환합니다.
+    """
+    paragraphs = [p.strip() for p in re.split(r"\n\s*\n", corpus_text or "") if p.strip()]
+    if not paragraphs:
+        return ""
+    paragraph_terms = [_terms(p) for p in paragraphs]
+
+    chosen = []
+    for item in wrong_items:
+        query = " ".join([item.get("question", ""), item.get("concept", ""), item.get("evidence", ""),
+                          item.get("choices", {}).get(item["answer"], "")])
+        query_terms = _terms(query)
+        if not query_terms:
+            continue
+        scored = sorted(((len(query_terms & terms), i) for i, terms in enumerate(paragraph_terms)), reverse=True)
+        for score, index in scored[:PASSAGES_PER_QUESTION]:
+            if score > 0 and index not in chosen:
+                chosen.append(index)
+
+    passages, used = [], 0
+    for index in sorted(chosen):
+        passage = paragraphs[index]
+        if used + len(passage) > max_chars:
+            passage = passage[:max(0, max_chars - used)]
+        if not passage:
+            break
+        passages.append(passage)
+        used += len(passage)
+    return "\n\n".join(passages)
+
+
+def to_html(text):
+    """ 기존 라우트와 동일하게 줄바꿈을 <br>로 바꿉니다. (LLM 출력이 아닌 로컬 텍스트는 이스케이프) """
+    return html.escape(text, quote=False).replace("\n", "<br>")
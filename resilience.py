@@ -0,0 +1,203 @@
+import os
+import time
+import random
+import threading
+from collections import deque, defaultdict
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import metrics
+
+# ----------------------------
+# [!! ★★★ 신규 ★★★ !!]
+# LLM 호출 복원력 (재시도 / 회로 차단기 / 헤지 요청)
+# - 일시적 오류(429, 5xx, 연결 끊김)만 지수 백오프 + 지터로 재시도 (마감 시간 안에서만)
+# - 연속 실패가 쌓이면 회로를 열어 일정 시간 즉시 실패 -> 워커가 죽은 API를 기다리며 묶이지 않음
+# - 짧은 비스트리밍 호출은 느리면 같은 요청을 하나 더 보내 먼저 온 응답을 사용 (p99 지연 감소)
+# ----------------------------
+
+RETRYABLE = "retryable"
+TIMEOUT = "timeout"
+FATAL = "fatal"
+
+_RETRYABLE_CODES = {429, 500, 502, 503}
+_RETRYABLE_NAMES = {"ResourceExhausted", "TooManyRequests", "ServiceUnavailable", "InternalServerError",
+                    "BadGateway", "Aborted", "Unknown", "ConnectionError", "RemoteDisconnected"}
+
+
+def _env_number(name, default):
+    try:
+        return float(os.getenv(name, default))
+    except ValueError:
+        return float(default)
+
+
+def classify_error(error):
+    """ 예외를 재시도 가능/시간 초과/치명(요청 자체 문제)으로 분류합니다. (google 예외를 import하지 않음) """
+    name = type(error).__name__
+    if "DeadlineExceeded" in name or "Timeout" in name or isinstance(error, TimeoutError):
+        return TIMEOUT
+    code = getattr(error, "code", None)
+    code = code() if callable(code) else code
+    if isinstance(code, int) and code in _RETRYABLE_CODES:
+        return RETRYABLE
+    if name in _RETRYABLE_NAMES or isinstance(error, ConnectionError):
+        return RETRYABLE
+    return FATAL
+
+
+class RetryPolicy:
+    """ 지수 백오프 + 전체 지터 (attempt는 0부터) """
+
+    def __init__(self, max_attempts=3, base_delay=0.5, max_delay=8.0):
+        self.max_attempts = max(1, int(max_attempts))
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def backoff(self, attempt):
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+
+class CircuitOpen(Exception):
+    """ 회로가 열려 있어 호출하지 않음 """
+
+
+class CircuitBreaker:
+    """
+    closed    : 정상. 연속 실패가 failure_threshold번 쌓이면 open
+    open      : reset_timeout초 동안 즉시 실패
+    half_open : 시험 호출 1건만 허용 -> 성공하면 closed, 실패하면 다시 open
+    """
+
+    def __init__(self, name, failure_threshold=5, reset_timeout=30.0):
+        self.name = name
+        self.failure_threshold = max(1, int(failure_threshold))
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        with self._lock:
+            if self.state == "open":
+                if time.monotonic() - self._opened_at < self.reset_timeout:
+                    metrics.incr("llm_circuit_rejected_total", circuit=self.name)
+                    raise CircuitOpen(self.name)
+                self._set_state("half_open")
+            if self.state == "half_open":
+                if self._trial_in_flight:
+                    metrics.incr("llm_circuit_rejected_total", circuit=self.name)
+                    raise CircuitOpen(self.name)
+                self._trial_in_flight = True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._trial_in_flight = False
+            if self.state != "closed":
+                self._set_state("closed")
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_in_flight = False
+            if self.state == "half_open" or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+                if self.state != "open":
+                    self._set_state("open")
+
+    def release_trial(self):
+        """ 시험 호출이 성공/실패 판단 없이 끝난 경우 (요청 자체 오류 등) """
+        with self._lock:
+            self._trial_in_flight = False
+
+    def _set_state(self, state):
+        print(f"🔌 [Circuit] '{self.name}' {self.state} -> {state}")
+        self.state = state
+        metrics.set_gauge("llm_circuit_open", 1 if state == "open" else 0, circuit=self.name)
+        metrics.incr("llm_circuit_transitions_total", circuit=self.name, to=state)
+
+
+class LatencyTracker:
+    """ 작업별 최근 소요 시간으로 헤지 지연(기본 p90)을 정합니다. """
+
+    def __init__(self, window=50):
+        self._samples = defaultdict(lambda: deque(maxlen=window))
+        self._lock = threading.Lock()
+
+    def add(self, key, seconds):
+        with self._lock:
+            self._samples[key].append(seconds)
+
+    def quantile(self, key, q=0.9, min_samples=10):
+        with self._lock:
+            samples = sorted(self._samples[key])
+        if len(samples) < min_samples:
+            return None
+        return samples[min(len(samples) - 1, int(len(samples) * q))]
+
+
+_hedge_pool = None
+_hedge_pool_lock = threading.Lock()
+
+
+def _get_hedge_pool():
+    global _hedge_pool
+    if _hedge_pool is None:
+        with _hedge_pool_lock:
+            if _hedge_pool is None:
+                _hedge_pool = ThreadPoolExecutor(max_workers=int(_env_number("AITER_LLM_HEDGE_THREADS", 8)),
+                                                 thread_name_prefix="llm-hedge")
+    return _hedge_pool
+
+
+class HedgeSkipped(Exception):
+    """ 헤지 복제 호출을 시작하지 않음 (실행 슬롯/한도 부족) -> 원래 호출 결과만 기다림 """
+
+
+def hedged_call(func, hedge_delay, label, hedge_func=None):
+    """
+    func()을 실행하고 hedge_delay초 안에 끝나지 않으면 hedge_func()(기본 func)을 한 번 더 실행해 먼저 성공한 결과를 반환합니다.
+    (둘 다 실패하면 원래 호출의 예외. 늦게 끝난 쪽 결과는 버림 - 동기 호출은 중간에 끊을 수 없음)
+    hedge_func가 HedgeSkipped를 던지면 복제 없이 원래 호출만 기다립니다.
+    """
+    pool = _get_hedge_pool()
+    primary = pool.submit(func)
+    done, _ = wait([primary], timeout=hedge_delay)
+    if done:
+        return primary.result()
+    secondary = pool.submit(hedge_func or func)
+    pending = {primary, secondary}
+    error = None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            exception = future.exception()
+            if exception is None:
+                if future is secondary:
+                    metrics.incr("llm_hedge_wins_total", action=label)
+                return future.result()
+            if isinstance(exception, HedgeSkipped):
+                continue
+            if error is None or future is primary:
+                error = exception
+    raise error
+
+
+# 환경 변수
+#   AITER_LLM_RETRIES              최대 시도 횟수 (기본 3)
+#   AITER_LLM_RETRY_BASE / _MAX    백오프 기본/최대 초 (기본 0.5 / 8)
+#   AITER_LLM_BREAKER_FAILURES     회로를 여는 연속 실패 수 (기본 5)
+#   AITER_LLM_BREAKER_RESET        회로 open 유지 시간 초 (기본 30)
+retry_policy = RetryPolicy(
+    max_attempts=_env_number("AITER_LLM_RETRIES", 3),
+    base_delay=_env_number("AITER_LLM_RETRY_BASE", 0.5),
+    max_delay=_env_number("AITER_LLM_RETRY_MAX", 8.0),
+)
+breaker = CircuitBreaker(
+    "gemini",
+    failure_threshold=_env_number("AITER_LLM_BREAKER_FAILURES", 5),
+    reset_timeout=_env_number("AITER_LLM_BREAKER_RESET", 30.0),
+)
+latency = LatencyTracker()
@@ -0,0 +1,100 @@
+import os
+import hmac
+from functools import wraps
+from flask import Blueprint, request, jsonify, Response
+
+import llm
+import ledger
+import metrics
+import profiling
+
+# ----------------------------
+# [!! ★★★ 신규 ★★★ !!]
+# 운영자용 API (지표 등)
+# 로그인 세션 대신 관리자 토큰(AITER_ADMIN_TOKEN)으로 보호합니다.
+#   curl -H "X-Admin-Token: $AITER_ADMIN_TOKEN" http://127.0.0.1:5000/admin/metrics
+# 토큰은 X-Admin-Token 헤더로만 받습니다. (쿼리 문자열은 접속 로그/브라우저 기록/Referer에 남음)
+# 토큰이 설정되지 않았으면 모든 관리자 API가 비활성화(404)됩니다.
+# ----------------------------
+
+admin_bp = Blueprint('admin', __name__, url_prefix='/admin')
+
+
+def is_admin_request():
+    """ 요청의 X-Admin-Token 헤더가 관리자 토큰과 같은지 (토큰 미설정이면 항상 False) """
+    expected = os.getenv("AITER_ADMIN_TOKEN")
+    if not expected:
+        return False
+    given = request.headers.get("X-Admin-Token", "")
+    return hmac.compare_digest(given.encode('utf-8'), expected.encode('utf-8'))
+
+
+def admin_required(view):
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not os.getenv("AITER_ADMIN_TOKEN"):
+            return jsonify({"success": False, "error": "Not Found"}), 404
+        if not is_admin_request():
+            return jsonify({"success": False, "error": "관리자 토큰이 올바르지 않습니다."}), 403
+        return view(*args, **kwargs)
+    return wrapper
+
+
+@admin_bp.route("/metrics", methods=["GET"])
+@admin_required
+def show_metrics():
+    if request.args.get("format") == "json":
+        return jsonify({"success": True, "metrics": metrics.snapshot()})
+    return Response(metrics.render_text(), mimetype='text/plain')
+
+
+# [!! 신규 !!] 요청 프로파일 (AITER_PROFILE=1일 때 수집)
+@admin_bp.route("/profiles", methods=["GET"])
+@admin_required
+def list_profiles():
+    return jsonify({"success": True, "profiles": profiling.list_profiles()})
+
+
+@admin_bp.route("/profiles/<endpoint>", methods=["GET"])
+@admin_required
+def show_profile(endpoint):
+    """ collapsed stack 텍스트 (flamegraph.pl / speedscope 입력 형식) """
+    folded = profiling.read_folded(endpoint)
+    if folded is None:
+        return jsonify({"success": False, "error": "해당 라우트의 프로파일이 없습니다."}), 404
+    return Response(folded, mimetype='text/plain')
+
+
+@admin_bp.route("/profiles/reset", methods=["POST"])
+@admin_required
+def reset_profiles():
+    profiling.reset_profiles()
+    return jsonify({"success": True})
+
+
+# [!! 신규 !!] LLM 사용량 원장 보고서 (사용자/작업별 호출 수, 토큰, 비용, 캐시 적중률)
+#   curl -H "X-Admin-Token: $AITER_ADMIN_TOKEN" "http://127.0.0.1:5000/admin/ledger?days=7&user=cs101"
+@admin_bp.route("/ledger", methods=["GET"])
+@admin_required
+def show_ledger():
+    try:
+        days = max(1, min(int(request.args.get("days", "1")), 366))
+    except ValueError:
+        return jsonify({"success": False, "error": "days는 정수여야 합니다."}), 400
+    user_id = request.args.get("user") or None
+    report = ledger.build_report(days, user_id)
+    if user_id:
+        report["quota"] = {"daily_tokens": ledger.get_quota(user_id), "used_today": ledger.tokens_used_today(user_id)}
+    return jsonify({"success": True, "report": report})
+
+
+# [!! 신규 !!] 작업별 모델 라우팅 (현재 적용값 + 최근 작업->모델별 지연/비용)
+#   curl -H "X-Admin-Token: $AITER_ADMIN_TOKEN" "http://127.0.0.1:5000/admin/llm_routes?days=7"
+@admin_bp.route("/llm_routes", methods=["GET"])
+@admin_required
+def show_llm_routes():
+    try:
+        days = max(1, min(int(request.args.get("days", "7")), 366))
+    except ValueError:
+        return jsonify({"success": False, "error": "days는 정수여야 합니다."}), 400
+    return jsonify({"success": True, "routes": llm.route_table(), "observed": ledger.build_report(days)["by_route"]})
@@ -1,12 +1,12 @@
 from flask import Blueprint, request, jsonify, session
 from datetime import datetime 
 import threading
-import google.generativeai as genai
 
-# [!! ★★★ 핵심 ★★★ !!]
-from app import data_lock, LATEX_FIX_INSTRUCTION
 import storage
 import prompts
+import llm
+import ledger
+import similarity
 
 analysis_bp = Blueprint('analysis', __name__)
 
@@ -40,6 +40,7 @@ def run_analysis():
         
         if cache_key in qa_cache:
             print(f"⚡️ [Analysis] '{user_id}' 캐시 HIT")
+            ledger.record_hit(user_id, action_type)
             return jsonify({"success": True, "status": "complete", "answer": qa_cache[cache_key]["answer"], "question_text": "전체 파일 핵심 추출"})
         
         if not all_file_text:
@@ -49,12 +50,11 @@ def run_analysis():
         try:
             print(f"💬 [Analysis] '{user_id}' Gemini API 요청 중...")
             system_content = prompts.EXTRACT_ALL_PROMPT.format(context_to_use=all_file_text)
-            model = genai.GenerativeModel("gemini-flash-latest", system_instruction=system_content)
-            response = model.generate_content("위 [전체 문서]의 모든 정보를 빠짐없이 추출해줘.")
+            response = llm.generate(action_type, system_content, "위 [전체 문서]의 모든 정보를 빠짐없이 추출해줘.", user_id=user_id)
             answer = response.text.strip().replace("\n", "<br>")
             
             qa_cache[cache_key] = {"answer": answer, "question_text": "전체 파일 핵심 추출", "action_type": action_type, "timestamp": datetime.now().strftime('%Y-%m-%d %H:%M:%S') }
-            storage.save_qa_cache(user_id, qa_cache)
+            storage.put_qa_entry(user_id, cache_key, qa_cache[cache_key])
             
             return jsonify({"success": True, "status": "complete", "answer": answer, "question_text": "전체 파일 핵심 추출"})
         
@@ -87,6 +87,7 @@ def generate_correlation_async():
     # 1. 캐시 확인 (HIT)
     if cache_key in qa_cache:
         print(f"⚡️ [Analysis] '{user_id}' 비동기 캐시 HIT")
+        ledger.record_hit(user_id, "generate_mindmap")
         answer = qa_cache[cache_key]["answer"]
         return jsonify({"success": True, "status": "complete", "answer": answer, "question_text": question_text})
     
@@ -95,33 +96,42 @@ def generate_correlation_async():
     
     def background_correlation_task(u_id, files, key, q_text):
         print(f"🧵 [BG-Analysis] '{u_id}/{key}' 생성 작업 시작...")
-        context_to_use = ""
         try:
-            # (RLock 상태에서 storage 함수들 호출)
-            for filename in files:
-                file_text = storage.get_text_from_single_file(u_id, filename) 
-                if file_text:
-                    context_to_use += f"--- {filename} 시작 ---\n{file_text}\n--- {filename} 끝 ---\n\n"
-            
-            if not context_to_use:
-                print(f"🧵 [BG-Analysis 오류] '{u_id}/{key}' 텍스트 추출 실패.")
-                return
+            # [!! 신규 !!] 2개 이상 파일이면 로컬 TF-IDF로 파일 간 연결 구절만 추려서 전달
+            linked = None
+            try:
+                linked = similarity.find_linked_passages(u_id, files)
+            except Exception as e:
+                print(f"⚠️ [BG-Analysis] '{u_id}/{key}' 유사도 분석 실패, 전체 문서 방식으로 진행: {e}")
+
+            if linked:
+                system_content = prompts.CORRELATION_PASSAGES_PROMPT.format(
+                    file_links=similarity.format_file_links(linked),
+                    passage_pairs=similarity.format_passage_pairs(linked))
+            else:
+                # (파일 1개 / numpy 없음 / 연결 구절 없음 -> 기존 방식: 선택 파일 전체)
+                context_parts = []
+                for filename in files:
+                    file_text = storage.get_text_from_single_file(u_id, filename) 
+                    if file_text:
+                        context_parts.append(f"--- {filename} 시작 ---\n{file_text}\n--- {filename} 끝 ---\n\n")
+                
+                if not context_parts:
+                    print(f"🧵 [BG-Analysis 오류] '{u_id}/{key}' 텍스트 추출 실패.")
+                    return
+                system_content = prompts.CORRELATION_PROMPT.format(context_to_use="".join(context_parts))
 
             print(f"💬 [BG-Analysis] '{u_id}/{key}' Gemini API 요청 중...")
-            system_content = prompts.CORRELATION_PROMPT.format(context_to_use=context_to_use)
-            model = genai.GenerativeModel("gemini-flash-latest", system_instruction=system_content)
-            response = model.generate_content("위 내용을 바탕으로 주제별 연관 관계를 상세히 분석해줘.")
+            response = llm.generate("generate_mindmap", system_content, "위 내용을 바탕으로 주제별 연관 관계를 상세히 분석해줘.", user_id=u_id)
             answer = response.text.strip()
             
-            # 캐시 저장
-            current_qa_cache = storage.load_qa_cache(u_id) # 최신 캐시 다시 읽기
-            current_qa_cache[key] = {
+            # 캐시 저장 (잠금을 잡고 최신 캐시 위에 반영)
+            storage.put_qa_entry(u_id, key, {
                 "answer": answer, 
                 "question_text": q_text,
                 "action_type": "generate_mindmap", 
                 "timestamp": datetime.now().strftime('%Y-%m-%d %H:%M:%S') 
-            }
-            storage.save_qa_cache(u_id, current_qa_cache)
+            })
             print(f"✅ [BG-Analysis] '{u_id}/{key}' 생성 및 캐시 저장 완료.")
 
         except Exception as e:
@@ -6,14 +6,17 @@ import threading
 import os
 from urllib.parse import unquote
 
-# [!! ★★★ 핵심 ★★★ !!]
-# app.py에서 생성된 app과 data_lock을 import합니다.
-from app import app, data_lock, LATEX_FIX_INSTRUCTION
-# storage.py와 prompts.py에서 헬퍼 함수와 프롬프트를 import합니다.
-# storage.py와 prompts.py에서 헬퍼 함수와 프롬프트를 import합니다.
+# [!! ★★★ 변경 ★★★ !!]
+# app.py를 import하지 않습니다. (순환 import 제거 -> 앱 팩토리에서 블루프린트만 등록)
+# 캐시 잠금은 storage.py가, LLM 클라이언트는 llm.py가 관리합니다.
 import storage
 import prompts
-import google.generativeai as genai # [!! ★★★ 추가 ★★★ !!]
+import quiz_grading
+import llm
+import ledger
+import archive
+import chat_sessions
+import search_index
 
 # 'core'라는 이름의 Blueprint(청사진)를 생성합니다.
 core_bp = Blueprint('core', __name__)
@@ -39,6 +42,7 @@ def load_main_page():
 
     answer = ""
     question_text = ""
+    quiz_key = ""
     
     # (참고: GET 요청은 app.py의 index()에서 이미 처리되었습니다)
 
@@ -66,17 +70,17 @@ def load_main_page():
                     cache_key = f"[요약] {original_question_text}_{previous_answer_text[:50]}"
                     
                     if cache_key in qa_cache:
+                        ledger.record_hit(user_id, action_type)
                         answer = qa_cache[cache_key]["answer"]
                         question_text = qa_cache[cache_key]["question_text"]
                     else:
                         system_content = prompts.EXTRACT_ANSWER_PROMPT.format(previous_answer_text=previous_answer_text)
-                        model = genai.GenerativeModel("gemini-flash-latest", system_instruction=system_content)
-                        response = model.generate_content("위 [텍스트]의 모든 정보를 빠짐없이 추출해줘.")
+                        response = llm.generate(action_type, system_content, "위 [텍스트]의 모든 정보를 빠짐없이 추출해줘.", user_id=user_id)
                         answer = response.text.strip().replace("\n", "<br>")
                         
                         question_text = f"[요약] {original_question_text}" 
                         qa_cache[cache_key] = { "answer": answer, "question_text": question_text, "action_type": "extract_answer", "timestamp": datetime.now().strftime('%Y-%m-%d %H:%M:%S') }
-                        storage.save_qa_cache(user_id, qa_cache)
+                        storage.put_qa_entry(user_id, cache_key, qa_cache[cache_key])
 
             # ===============================================
             # [!! ★★★ 롤백 ★★★ !!] 'quiz_context' -> 'quiz_file'
@@ -93,13 +97,16 @@ def load_main_page():
                          answer = f"'{target_filename}'... 파일명을 찾을 수 없거나 텍스트를 추출할 수 없습니다."
                     else:
                         system_content = prompts.QUIZ_SELECTED_PROMPT.format(context_to_use=context_text) # 선택 퀴즈 프롬프트 재활용
-                        model = genai.GenerativeModel("gemini-flash-latest", system_instruction=system_content)
-                        response = model.generate_content(original_question_text)
-                        answer = response.text.strip().replace("\n", "<br>")
+                        response = llm.generate(action_type, system_content, original_question_text, user_id=user_id)
+                        display_text, answer_key = quiz_grading.split_answer_key(response.text)
+                        answer = display_text.replace("\n", "<br>")
                         
                         cache_key = f"{original_question_text}_{action_type}"
                         qa_cache[cache_key] = { "answer": answer, "question_text": original_question_text, "action_type": action_type, "timestamp": datetime.now().strftime('%Y-%m-%d %H:%M:%S') }
-                        storage.save_qa_cache(user_id, qa_cache)
+                        if answer_key:
+                            qa_cache[cache_key]["answer_key"] = answer_key
+                            quiz_key = cache_key
+                        storage.put_qa_entry(user_id, cache_key, qa_cache[cache_key])
             
             # (기타 비-스트리밍 액션들)
 
@@ -109,17 +116,17 @@ def load_main_page():
         # --- 최종 렌더링 (POST 요청의 결과) ---
         ask_list, summarize_list, quiz_list, mindmap_list = storage.get_categorized_cache(qa_cache)
         supported_files = storage.get_supported_files(user_id)
-        ocr_cache = storage.load_ocr_cache(user_id)
         
         return render_template("index.html", 
                                answer=answer, question_text=original_question_text, 
+                               quiz_key=quiz_key,
                                ask_list=ask_list, summarize_list=summarize_list,
                                quiz_list=quiz_list, 
                                mindmap_list=mindmap_list,
                                supported_files=supported_files,
                                odapnote_list=odapnote_list,
                                chat_history=[], # (2단계에서 구현)
-                               ocr_cache_keys=list(ocr_cache.keys()),
+                               ocr_cache_keys=storage.get_ocr_done_files(user_id),
                                current_user=user_id)
 
 # ----------------------------
@@ -159,7 +166,11 @@ def stream_ask():
     
     # [!! ★★★ 롤백 ★★★ !!]
     # 'floating_widget'만 '현재 맥락'을 확인합니다.
+    # [!! ★★★ 변경 ★★★ !!] 서버 대화 세션: 맥락은 바뀔 때만 전송되고(previous_answer 생략 = 이전 맥락 유지),
+    # 이전 대화는 세션의 요약 + 최근 턴으로 이어 붙입니다. (chat_sessions.py)
     elif source == 'floating_widget':
+        chat_session_id, chat = chat_sessions.prepare(user_id, data.get("session_id"), data.get("previous_answer"))
+        previous_answer_html = chat["context"]
         if previous_answer_html and previous_answer_html != "(답변이 여기에 표시됩니다.)":
             # 1. 플로팅 위젯 + 현재 맥락 O -> '채팅' 프롬프트
             print(f"⚡️ [Stream] '플로팅 위젯(Chat)' 요청. '현재 맥락'을 사용합니다.")
@@ -185,46 +196,59 @@ def stream_ask():
              system_content = prompts.STREAM_CHAT_PROMPT.format(context_to_use=context_to_use)
         else:
              system_content = prompts.STREAM_ASK_PROMPT.format(context_to_use=context_to_use)
-    
 
-    model = genai.GenerativeModel("gemini-flash-latest", system_instruction=system_content)
+    gemini_history = [{"role": "user", "parts": [question_text]}]
+    if source == 'floating_widget':
+        system_content += chat_sessions.summary_section(chat)
+        gemini_history = chat_sessions.build_contents(chat, question_text)
     
+
     # 3. 스트림 생성기 정의
     def stream_generator():
         try:
-            gemini_history = [{"role": "user", "parts": [question_text]}]
-            
-            stream = model.generate_content(gemini_history, stream=True)
             full_answer = []
             
-            for chunk in stream:
-                text_chunk = chunk.text.replace("\n", "<br>")
-                full_answer.append(chunk.text) 
-                yield text_chunk
+            # [!! 신규 !!] 마감 시간 + 연결 끊김/재질문 시 upstream 스트림 취소
+            with llm.open_stream("stream_ask", system_content, gemini_history, cancel_key=(user_id, source),
+                                 user_id=user_id) as stream:
+                for text in stream:
+                    full_answer.append(text) 
+                    yield text.replace("\n", "<br>")
             
             final_answer_raw = "".join(full_answer)
             final_answer_html = final_answer_raw.replace("\n", "<br>")
 
             # 'main_form'이 보낸 질문은 캐시 저장
             if source == 'main_form':
-                current_qa_cache = storage.load_qa_cache(user_id)
-                current_qa_cache[cache_key] = {
+                storage.put_qa_entry(user_id, cache_key, {
                     "answer": final_answer_html, 
                     "question_text": question_text, 
                     "action_type": "ask", 
                     "timestamp": datetime.now().strftime('%Y-%m-%d %H:%M:%S') 
-                }
-                storage.save_qa_cache(user_id, current_qa_cache)
+                })
                 print(f"✅ [Stream] '{user_id}' API 응답 및 '메인' 캐시 저장 완료.")
             else:
-                # 플로팅 위젯은 캐시 저장 안 함
+                # 플로팅 위젯은 캐시 저장 안 함 (대신 대화 세션에 턴 추가)
+                if source == 'floating_widget':
+                    chat_sessions.append_turn(user_id, chat_session_id, question_text, final_answer_raw)
                 print(f"✅ [Stream] '{user_id}' API 응답 완료 (보조 질문창 - 캐시 저장 안 함).")
 
+        except llm.LLMCancelled as e:
+            # (새 질문으로 대체됨 -> 이 응답은 더 이상 화면에 표시되지 않음)
+            print(f"🛑 [Stream] '{user_id}' 스트림 취소: {e}")
+        except llm.LLMTimeout as e:
+            print(f"⏱️ [Stream] '{user_id}' 스트림 시간 초과")
+            yield f"<br>⏱️ {e}"
+        except llm.LLMQuotaExceeded as e:
+            yield f"⚠️ {e}"
         except Exception as e:
             print(f"💥 [Stream] '{user_id}' 생성기 오류: {e}")
             yield f"❌ Gemini API 스트림 오류: {e}"
 
-    return Response(stream_with_context(stream_generator()), mimetype='text/html')
+    response = Response(stream_with_context(stream_generator()), mimetype='text/html')
+    if source == 'floating_widget':
+        response.headers["X-Chat-Session"] = chat_session_id
+    return response
 
 # ----------------------------
 # (개인화) 업로드/삭제/OCR API
@@ -255,6 +279,17 @@ def upload_file():
     else:
         return jsonify({"success": False, "error": "File type not allowed"}), 400
 
+# [!! ★★★ 신규 ★★★ !!] 프롬프트 정규화 절감 리포트 (파일별 바이트/토큰)
+@core_bp.route("/normalize_report", methods=["GET"])
+def normalize_report():
+    user_id = session.get('folder_id')
+    if not user_id:
+        return jsonify({"success": False, "error": "로그인이 필요합니다."}), 401
+    try:
+        return jsonify({"success": True, "report": storage.get_normalize_report(user_id)})
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
 @core_bp.route("/delete_file", methods=["POST"])
 def delete_file():
     user_id = session.get('folder_id')
@@ -273,24 +308,87 @@ def delete_file():
         
         print(f"🗑️ [Delete] '{user_id}/{filename}' 삭제 요청...")
         
-        with data_lock:
-            # 1. 파일 삭제
-            if os.path.exists(filepath):
-                os.remove(filepath)
-                print(f"  - (1/2) '{user_id}/{filename}' 파일 시스템에서 삭제 완료.")
-            
-            # 2. OCR 캐시 삭제
-            ocr_cache = storage.load_ocr_cache(user_id)
-            if filename in ocr_cache:
-                del ocr_cache[filename]
-                storage.save_ocr_cache(user_id, ocr_cache)
-                print(f"  - (2/2) OCR 캐시에서 '{user_id}/{filename}' 삭제 완료.")
+        # 1. 파일 삭제
+        if os.path.exists(filepath):
+            os.remove(filepath)
+            print(f"  - (1/2) '{user_id}/{filename}' 파일 시스템에서 삭제 완료.")
+        
+        # 2. OCR 캐시 삭제 (프로세스 간 잠금 + 원자적 저장)
+        if storage.delete_ocr_entry(user_id, filename):
+            print(f"  - (2/2) OCR 캐시에서 '{user_id}/{filename}' 삭제 완료.")
             
         return jsonify({"success": True, "filename": filename})
     except Exception as e:
         print(f"💥 [Delete] '{user_id}/{filename}' 파일 삭제 오류: {e}")
         return jsonify({"success": False, "error": str(e)}), 500
 
+# ----------------------------
+# [!! ★★★ 신규 ★★★ !!] 일괄 처리 API
+# 항목 N개를 잠금 1회 + 캐시 저장 1회로 처리하고, 항목별 결과를 돌려줍니다.
+#   {"success": true, "results": [{"key": ..., "success": bool, "error": ...}], "done": n}
+# ----------------------------
+MAX_BATCH_ITEMS = 500
+
+def parse_batch_items(data, field):
+    """ 요청 본문의 목록 필드 (비었거나 너무 길면 None) """
+    items = (data or {}).get(field)
+    if not isinstance(items, list) or not items or len(items) > MAX_BATCH_ITEMS:
+        return None
+    return items
+
+def batch_response(results):
+    return jsonify({"success": True, "results": results, "done": sum(1 for r in results if r["success"])})
+
+@core_bp.route("/delete_files", methods=["POST"])
+def delete_files():
+    user_id = session.get('folder_id')
+    if not user_id:
+        return jsonify({"success": False, "error": "로그인이 필요합니다."}), 401
+
+    filenames = parse_batch_items(request.get_json(silent=True), 'filenames')
+    if filenames is None:
+        return jsonify({"success": False, "error": f"filenames 목록이 필요합니다. (최대 {MAX_BATCH_ITEMS}개)"}), 400
+    try:
+        # (같은 이름이 여러 번 오면 한 번만: 결과가 이름별이므로 두 번째가 not_found로 덮어쓰지 않게)
+        filenames = list(dict.fromkeys(os.path.basename(str(name)) for name in filenames))
+        statuses = storage.delete_files(user_id, filenames)
+        print(f"🗑️ [Delete] '{user_id}' 파일 {len(filenames)}개 일괄 삭제 요청 처리")
+        errors = {"deleted": None, "not_found": "File not found"}
+        return batch_response([{"key": name, "success": statuses[name] == "deleted",
+                                 "error": errors.get(statuses[name], statuses[name])}
+                                for name in filenames])
+    except Exception as e:
+        print(f"💥 [Delete] '{user_id}' 일괄 삭제 오류: {e}")
+        return jsonify({"success": False, "error": str(e)}), 500
+
+@core_bp.route("/move_files", methods=["POST"])
+def move_files():
+    """ 파일 이름 일괄 변경: {"moves": [{"from": "a.pdf", "to": "b.pdf"}, ...]} """
+    user_id = session.get('folder_id')
+    if not user_id:
+        return jsonify({"success": False, "error": "로그인이 필요합니다."}), 401
+
+    moves = parse_batch_items(request.get_json(silent=True), 'moves')
+    if moves is None:
+        return jsonify({"success": False, "error": f"moves 목록이 필요합니다. (최대 {MAX_BATCH_ITEMS}개)"}), 400
+    try:
+        results, pairs, slots = [], [], []
+        for move in moves:
+            move = move if isinstance(move, dict) else {}
+            source = os.path.basename(str(move.get('from') or ""))
+            target = secure_filename(str(move.get('to') or ""))
+            results.append({"key": source, "to": target, "success": False, "error": "from/to가 필요합니다."})
+            if source and target:
+                pairs.append((source, target))
+                slots.append(results[-1])
+        for result, status in zip(slots, storage.move_files(user_id, pairs)):
+            result.update(success=status == "moved", error=None if status == "moved" else status)
+        print(f"✅ [Move] '{user_id}' 파일 {len(pairs)}개 이름 변경 요청 처리")
+        return batch_response(results)
+    except Exception as e:
+        print(f"💥 [Move] '{user_id}' 이름 변경 오류: {e}")
+        return jsonify({"success": False, "error": str(e)}), 500
+
 @core_bp.route("/run_ocr", methods=["POST"])
 def run_ocr():
     user_id = session.get('folder_id')
@@ -342,11 +440,7 @@ def delete_history():
         
         print(f"🗑️ [Core] '{user_id}' Q&A 캐시 삭제 요청: {key_to_delete}")
 
-        qa_cache = storage.load_qa_cache(user_id)
-        
-        if key_to_delete in qa_cache:
-            del qa_cache[key_to_delete]
-            storage.save_qa_cache(user_id, qa_cache)
+        if storage.delete_qa_entries(user_id, [key_to_delete]):
             print(f"✅ [Core] '{user_id}' Q&A 캐시 삭제 완료.")
             return jsonify({"success": True})
         else:
@@ -355,4 +449,85 @@ def delete_history():
 
     except Exception as e:
         print(f"💥 [Core] Q&A 캐시 삭제 오류: {e}")
-        return jsonify({"success": False, "error": str(e)}), 500
\ No newline at end of file
+        return jsonify({"success": False, "error": str(e)}), 500
+
+@core_bp.route("/delete_histories", methods=["POST"])
+def delete_histories():
+    """ (일괄) Q&A 캐시 항목 여러 개를 한 번의 저장으로 삭제합니다. """
+    user_id = session.get('folder_id')
+    if not user_id:
+        return jsonify({"success": False, "error": "로그인이 필요합니다."}), 401
+
+    keys = parse_batch_items(request.get_json(silent=True), 'keys')
+    if keys is None:
+        return jsonify({"success": False, "error": f"keys 목록이 필요합니다. (최대 {MAX_BATCH_ITEMS}개)"}), 400
+    try:
+        keys = [unquote(str(key)) for key in keys]
+        deleted = set(storage.delete_qa_entries(user_id, keys))
+        print(f"🗑️ [Core] '{user_id}' Q&A 캐시 {len(deleted)}/{len(keys)}개 일괄 삭제")
+        return batch_response([{"key": key, "success": key in deleted, "error": None if key in deleted else "Key not found"}
+                                for key in keys])
+    except Exception as e:
+        print(f"💥 [Core] Q&A 캐시 일괄 삭제 오류: {e}")
+        return jsonify({"success": False, "error": str(e)}), 500
+
+# ----------------------------
+# [!! ★★★ 신규 ★★★ !!] 기록 + 오답노트 전문 검색 (search_index.py)
+#   GET /search?q=경사하강법&page=1&per_page=20&type=quiz
+# ----------------------------
+SEARCH_TYPES = {"ask", "summarize", "quiz", "mindmap", "odapnote"}
+
+@core_bp.route("/search", methods=["GET"])
+def search_history():
+    user_id = session.get('folder_id')
+    if not user_id:
+        return jsonify({"success": False, "error": "로그인이 필요합니다."}), 401
+
+    query = request.args.get("q", "").strip()
+    if not query:
+        return jsonify({"success": False, "error": "검색어를 입력해주세요."}), 400
+    category = request.args.get("type") or None
+    if category and category not in SEARCH_TYPES:
+        return jsonify({"success": False, "error": "알 수 없는 기록 종류입니다."}), 400
+    try:
+        page = min(int(request.args.get("page", "1")), 1000)
+        per_page = int(request.args.get("per_page", "20"))
+    except ValueError:
+        return jsonify({"success": False, "error": "page/per_page는 정수여야 합니다."}), 400
+    try:
+        result = search_index.search(user_id, query[:200], page, per_page, category)
+        return jsonify(dict(result, success=True, query=query))
+    except Exception as e:
+        print(f"💥 [Core] '{user_id}' 검색 오류: {e}")
+        return jsonify({"success": False, "error": str(e)}), 500
+
+# ----------------------------
+# [!! ★★★ 신규 ★★★ !!] 폴더 내보내기/가져오기 (서버 간 이전, archive.py)
+# ----------------------------
+@core_bp.route("/export_folder", methods=["GET"])
+def export_folder():
+    user_id = session.get('folder_id')
+    if not user_id:
+        return jsonify({"success": False, "error": "로그인이 필요합니다."}), 401
+    filename = f"aiter_{secure_filename(user_id) or 'folder'}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.tar.gz"
+    print(f"📦 [Export] '{user_id}' 폴더 내보내기 시작...")
+    return Response(stream_with_context(archive.iter_export(user_id)), mimetype='application/gzip',
+                    headers={"Content-Disposition": f'attachment; filename="{filename}"', "Cache-Control": "no-store"})
+
+@core_bp.route("/import_folder", methods=["POST"])
+def import_folder():
+    """ 내보낸 tar.gz를 현재 폴더로 가져옵니다. (multipart 'file' 또는 요청 본문 그대로) """
+    user_id = session.get('folder_id')
+    if not user_id:
+        return jsonify({"success": False, "error": "로그인이 필요합니다."}), 401
+
+    stream = request.files['file'].stream if 'file' in request.files else request.stream
+    try:
+        report = archive.import_archive(user_id, stream)
+        return jsonify({"success": True, "report": report})
+    except archive.ArchiveError as e:
+        print(f"⚠️ [Import] '{user_id}' 가져오기 거부: {e}")
+        return jsonify({"success": False, "error": str(e)}), 400
+    except Exception as e:
+        print(f"💥 [Import] '{user_id}' 가져오기 오류: {e}")
+        return jsonify({"success": False, "error": str(e)}), 500
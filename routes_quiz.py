@@ -1,11 +1,11 @@
 from flask import Blueprint, request, jsonify, session
 from datetime import datetime 
-import google.generativeai as genai
 
-# [!! ★★★ 핵심 ★★★ !!]
-from app import data_lock, LATEX_FIX_INSTRUCTION
 import storage
 import prompts
+import llm
+import quiz_grading
+from routes_core import parse_batch_items, batch_response, MAX_BATCH_ITEMS
 
 quiz_bp = Blueprint('quiz', __name__)
 
@@ -72,7 +72,8 @@ def run_quiz():
             if not odapnote_list:
                 return jsonify({"success": False, "error": "퀴즈를 낼 오답노트가 비어있습니다."})
             
-            context_to_use = "\n\n".join([item['content'].replace("<br>", "\n") for item in odapnote_list])
+            # 전체 기록 대신 많이 틀린/관련 높은 상위 N개만 전송
+            context_to_use = storage.format_odap_for_prompt(storage.select_odap_items(odapnote_list))
             question_text = "오답노트 기반 약점 퀴즈"
             system_content = prompts.QUIZ_WEAKNESS_PROMPT.format(odap_content=context_to_use)
             
@@ -86,7 +87,7 @@ def run_quiz():
                 return jsonify({"success": False, "error": "분석할 오답노트가 비어있습니다."})
             
             # ANALYZE_WEAKNESS_PROMPT는 '오답'과 '원본' 둘 다 필요
-            odap_content = "\n\n".join([item['content'].replace("<br>", "\n") for item in odapnote_list])
+            odap_content = storage.format_odap_for_prompt(storage.select_odap_items(odapnote_list))
             context_to_use = all_file_text # 원본 문서
             
             question_text = "오답노트 기반 취약점 분석"
@@ -97,9 +98,10 @@ def run_quiz():
 
         # --- Gemini API 호출 공통 로직 ---
         print(f"💬 [Quiz] '{user_id}' Gemini API 요청 ({action_type})...")
-        model = genai.GenerativeModel("gemini-flash-latest", system_instruction=system_content)
-        response = model.generate_content(f"{question_text} 생성해줘.")
-        answer = response.text.strip().replace("\n", "<br>")
+        response = llm.generate(action_type, system_content, f"{question_text} 생성해줘.", user_id=user_id)
+        # [정답 키] 퀴즈 본문과 구조화 정답(JSON)을 분리합니다.
+        display_text, answer_key = quiz_grading.split_answer_key(response.text)
+        answer = display_text.replace("\n", "<br>")
 
         # --- 캐시 저장 공통 로직 ---
         cache_key = f"{action_type}_{datetime.now().strftime('%Y%m%d%H%M%S')}" 
@@ -107,9 +109,12 @@ def run_quiz():
             "answer": answer, "question_text": question_text,
             "action_type": action_type, "timestamp": datetime.now().strftime('%Y-%m-%d %H:%M:%S') 
         }
-        storage.save_qa_cache(user_id, qa_cache)
+        if answer_key:
+            qa_cache[cache_key]["answer_key"] = answer_key
+        storage.put_qa_entry(user_id, cache_key, qa_cache[cache_key])
         
-        return jsonify({"success": True, "status": "complete", "answer": answer, "question_text": question_text})
+        return jsonify({"success": True, "status": "complete", "answer": answer, "question_text": question_text,
+                        "quiz_key": cache_key if answer_key else ""})
 
     except Exception as e:
         print(f"💥 [Quiz] '{user_id}' 퀴즈 생성 실패: {e}")
@@ -127,13 +132,21 @@ def grade_quiz():
     data = request.get_json()
     quiz_questions_html = data.get("previous_answer", "")
     user_answers_text = data.get("query", "")
-    
-    all_file_text = storage.load_all_text_from_data(user_id)
+    quiz_key = data.get("quiz_key") or ""
 
     if not quiz_questions_html or quiz_questions_html == "(답변이 여기에 표시됩니다.)":
         return jsonify({"success": False, "error": "채점할 퀴즈가 없습니다."})
     if not user_answers_text.strip():
         return jsonify({"success": False, "error": "제출할 답안을 입력해주세요."})
+
+    # [정답 키] 구조화 정답이 저장된 퀴즈는 로컬에서 채점합니다.
+    answer_key = None
+    if quiz_key:
+        answer_key = storage.load_qa_cache(user_id).get(quiz_key, {}).get("answer_key")
+    if answer_key:
+        return _grade_with_answer_key(user_id, answer_key, user_answers_text)
+
+    all_file_text = storage.load_all_text_from_data(user_id)
     if not all_file_text:
         return jsonify({"success": False, "error": "채점 기준이 될 원본 파일이 없습니다."})
 
@@ -142,8 +155,7 @@ def grade_quiz():
         quiz_questions_text = quiz_questions_html.replace("<br>", "\n").strip()
         
         system_content_grader = prompts.GRADE_QUIZ_PROMPT.format(context_to_use=all_file_text, quiz_questions_text=quiz_questions_text)
-        model_grader = genai.GenerativeModel("gemini-flash-latest", system_instruction=system_content_grader)
-        response_grader = model_grader.generate_content(f"[사용자 답안]\n{user_answers_text}")
+        response_grader = llm.generate("grade_quiz", system_content_grader, f"[사용자 답안]\n{user_answers_text}", user_id=user_id)
         
         answer_text = response_grader.text.strip()
         answer = answer_text.replace("\n", "<br>") 
@@ -152,18 +164,11 @@ def grade_quiz():
         if "(X)" in answer_text:
             print(f"💬 [Quiz] '{user_id}' 2/2: 오답 추출 API 요청 중...")
             system_content_extractor = prompts.EXTRACT_ERRORS_PROMPT.format(answer_text=answer_text)
-            model_extractor = genai.GenerativeModel("gemini-flash-latest", system_instruction=system_content_extractor)
-            response_extractor = model_extractor.generate_content("위 [채점 결과]에서 틀린 문제만 모두 추출해줘.")
+            response_extractor = llm.generate("extract_errors", system_content_extractor, "위 [채점 결과]에서 틀린 문제만 모두 추출해줘.", user_id=user_id)
             extracted_errors = response_extractor.text.strip()
             
             if "추출할 오답이 없습니다." not in extracted_errors and extracted_errors:
-                new_odap_entry = {
-                    "timestamp": datetime.now().strftime('%Y-%m-%d %H:%M'),
-                    "content": extracted_errors.replace("\n", "<br>")
-                }
-                odapnote_list = storage.load_odapnote(user_id)
-                odapnote_list.append(new_odap_entry)
-                storage.save_odapnote(user_id, odapnote_list)
+                storage.record_odap_items(user_id, [storage.make_odap_item(extracted_errors.replace("\n", "<br>"))])
                 print(f"✅ [Quiz] '{user_id}' 2/2: 오답노트 저장 완료.")
         
         return jsonify({"success": True, "status": "complete", "answer": answer, "question_text": "퀴즈 채점 결과"})
@@ -173,6 +178,40 @@ def grade_quiz():
         return jsonify({"success": False, "error": str(e)})
 
 
+def _grade_with_answer_key(user_id, answer_key, user_answers_text):
+    """
+    정답 키 기반 로컬 채점.
+    객관식 채점/오답노트 생성은 로컬에서 끝내고, 틀린 문제가 있을 때만
+    관련 원문 구절을 골라 해설 1회를 LLM에 요청합니다.
+    """
+    user_answers = quiz_grading.parse_user_answers(user_answers_text, len(answer_key))
+    results = quiz_grading.grade_answers(answer_key, user_answers)
+    wrong_items = [item for item in results if not item["is_correct"]]
+    print(f"✅ [Quiz] '{user_id}' 로컬 채점 완료: {len(results) - len(wrong_items)}/{len(results)}")
+
+    explanations = {}
+    if wrong_items:
+        try:
+            print(f"💬 [Quiz] '{user_id}' 오답 해설 API 요청 중... ({len(wrong_items)}문제)")
+            passages = quiz_grading.select_passages(storage.load_all_text_from_data(user_id), wrong_items)
+            wrong_text = "\n\n".join(quiz_grading.format_wrong_item(item) for item in wrong_items)
+            system_content = prompts.EXPLAIN_WRONG_ANSWERS_PROMPT.format(wrong_items=wrong_text, passages=passages or "(관련 원문 없음)")
+            response = llm.generate("explain_wrong_answers", system_content, "각 오답의 해설을 JSON으로 작성해줘.", user_id=user_id)
+            explanations = quiz_grading.parse_explanations(response.text)
+        except Exception as e:
+            # 해설이 실패해도 채점 결과와 오답노트는 그대로 반환합니다.
+            print(f"⚠️ [Quiz] '{user_id}' 오답 해설 생성 실패: {e}")
+
+        # 문제별 오답 항목 (같은 문제를 또 틀리면 miss_count만 증가)
+        storage.record_odap_items(user_id, [
+            storage.make_odap_item_from_result(dict(item, explanation=explanations.get(item["no"], "")))
+            for item in wrong_items])
+        print(f"✅ [Quiz] '{user_id}' 오답노트 저장 완료.")
+
+    answer = quiz_grading.to_html(quiz_grading.build_grade_report(results, explanations))
+    return jsonify({"success": True, "status": "complete", "answer": answer, "question_text": "퀴즈 채점 결과"})
+
+
 @quiz_bp.route("/delete_odapnote", methods=["POST"])
 def delete_odapnote():
     """ (개인화) 오답노트 삭제 """
@@ -182,23 +221,40 @@ def delete_odapnote():
 
     try:
         data = request.get_json()
-        key_index = data.get('key') 
-        if key_index is None:
-            return jsonify({"success": False, "error": "Key index is missing"}), 400
+        item_id = data.get('key') 
+        if not item_id:
+            return jsonify({"success": False, "error": "Key is missing"}), 400
             
-        key_index = int(key_index)
-        print(f"🗑️ [Quiz] '{user_id}' 오답노트 {key_index}번째 항목 삭제 요청...")
+        print(f"🗑️ [Quiz] '{user_id}' 오답노트 '{item_id}' 항목 삭제 요청...")
 
-        odapnote_list = storage.load_odapnote(user_id)
-        if 0 <= key_index < len(odapnote_list):
-            del odapnote_list[key_index] 
-            storage.save_odapnote(user_id, odapnote_list)
+        # (인덱스가 아닌 고유 id로 삭제 -> 동시에 다른 항목이 추가/삭제되어도 안전)
+        if storage.delete_odap_items(user_id, [item_id]):
             print("✅ [Quiz] 오답노트 삭제 완료.")
         else:
-            print("💡 [Quiz] 잘못된 인덱스입니다.")
-            return jsonify({"success": False, "error": "Invalid index"}), 400
+            print("💡 [Quiz] 존재하지 않는 오답 id입니다.")
+            return jsonify({"success": False, "error": "Item not found"}), 404
 
         return jsonify({"success": True})
     except Exception as e:
         print(f"💥 [Quiz] 오답노트 삭제 오류: {e}")
-        return jsonify({"success": False, "error": str(e)}), 500
\ No newline at end of file
+        return jsonify({"success": False, "error": str(e)}), 500
+
+@quiz_bp.route("/delete_odapnotes", methods=["POST"])
+def delete_odapnotes():
+    """ (일괄) 오답노트 여러 개를 한 번의 저장으로 삭제: {"keys": [id, ...]} """
+    user_id = session.get('folder_id')
+    if not user_id:
+        return jsonify({"success": False, "error": "로그인이 필요합니다."}), 401
+
+    keys = parse_batch_items(request.get_json(silent=True), 'keys')
+    if keys is None:
+        return jsonify({"success": False, "error": f"keys 목록이 필요합니다. (최대 {MAX_BATCH_ITEMS}개)"}), 400
+    try:
+        keys = [str(key) for key in keys]
+        deleted = set(storage.delete_odap_items(user_id, keys))
+        print(f"🗑️ [Quiz] '{user_id}' 오답노트 {len(deleted)}/{len(keys)}개 일괄 삭제")
+        return batch_response([{"key": key, "success": key in deleted, "error": None if key in deleted else "Item not found"}
+                                for key in keys])
+    except Exception as e:
+        print(f"💥 [Quiz] 오답노트 일괄 삭제 오류: {e}")
+        return jsonify({"success": False, "error": str(e)}), 500
@@ -0,0 +1,215 @@
+import os
+import time
+import threading
+import itertools
+from collections import Counter
+
+import metrics
+
+# ----------------------------
+# [!! ★★★ 신규 ★★★ !!]
+# LLM 호출 스케줄러 (공정성 + 우선순위 + 전체 요청 한도)
+# - 우선순위: 대화형(채팅/채점) > 일반(퀴즈/요약 생성) > 배치(연관 분석/OCR)
+#   배치 작업은 전체 동시 실행 슬롯을 다 차지하지 못합니다. (대화형용 슬롯 예약)
+# - 사용자별 동시 실행 수 + 분당 토큰 한도 (한 사용자가 연관 분석을 여러 개 돌려도 다른 사용자 채팅은 바로 처리)
+# - 전체 분당 요청/토큰 한도 (Gemini API 한도 보호)
+# - 같은 우선순위 안에서는 실행 중인 작업이 적은 사용자 -> 먼저 온 요청 순
+# (한도는 워커 프로세스별입니다. gunicorn 워커 수로 나눠서 설정하세요)
+# ----------------------------
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_STANDARD = 1
+PRIORITY_BATCH = 2
+PRIORITY_NAMES = {PRIORITY_INTERACTIVE: "interactive", PRIORITY_STANDARD: "standard", PRIORITY_BATCH: "batch"}
+
+ACTION_PRIORITY = {
+    "stream_ask": PRIORITY_INTERACTIVE,
+    "grade_quiz": PRIORITY_INTERACTIVE, "extract_errors": PRIORITY_INTERACTIVE,
+    "explain_wrong_answers": PRIORITY_INTERACTIVE,
+    "quiz_all": PRIORITY_STANDARD, "quiz_selected": PRIORITY_STANDARD, "quiz_weakness": PRIORITY_STANDARD,
+    "quiz_file": PRIORITY_STANDARD, "analyze_weakness": PRIORITY_STANDARD,
+    "extract_answer": PRIORITY_STANDARD, "extract_all": PRIORITY_STANDARD,
+    "generate_mindmap": PRIORITY_BATCH, "ocr": PRIORITY_BATCH,
+}
+
+
+def _env_number(name, default):
+    try:
+        return float(os.getenv(name, default))
+    except ValueError:
+        return float(default)
+
+
+class QueueTimeout(Exception):
+    """ 마감 시간 안에 실행 차례가 오지 않음 """
+
+
+class TokenBucket:
+    """ 분당 한도(capacity)를 초당 capacity/60씩 채우는 토큰 버킷. capacity가 0 이하면 무제한 """
+
+    def __init__(self, per_minute):
+        self.capacity = per_minute
+        self.rate = per_minute / 60.0
+        self.tokens = per_minute
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount, now):
+        """ amount만큼 쓸 수 있을 때까지 남은 시간(초). (한도보다 큰 요청은 버킷이 가득 차면 허용) """
+        if self.capacity <= 0:
+            return 0.0
+        self._refill(now)
+        needed = min(amount, self.capacity)
+        return 0.0 if self.tokens >= needed else (needed - self.tokens) / self.rate
+
+    def take(self, amount, now):
+        if self.capacity > 0:
+            self._refill(now)
+            self.tokens -= min(amount, self.capacity)
+
+
+class _Waiter:
+    __slots__ = ("user_id", "priority", "tokens", "seq", "enqueued")
+
+    def __init__(self, user_id, priority, tokens, seq):
+        self.user_id, self.priority, self.tokens, self.seq = user_id, priority, tokens, seq
+        self.enqueued = time.monotonic()
+
+
+class Ticket:
+    """ 실행 슬롯. 호출이 끝나면(스트림은 닫힐 때) release() """
+
+    def __init__(self, scheduler, waiter):
+        self._scheduler, self._waiter, self._released = scheduler, waiter, False
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self._scheduler._release(self._waiter)
+
+
+class LLMScheduler:
+    def __init__(self, max_concurrency=8, batch_slots=None, user_concurrency=2,
+                 global_rpm=0, global_tpm=0, user_tpm=0):
+        self.max_concurrency = max(1, int(max_concurrency))
+        # 배치 작업이 쓸 수 있는 최대 슬롯 (기본: 전체 - 1 -> 대화형 1개는 항상 남김)
+        self.batch_slots = int(batch_slots) if batch_slots else max(1, self.max_concurrency - 1)
+        self.user_concurrency = max(1, int(user_concurrency))
+        self.user_tpm = user_tpm
+        self._cond = threading.Condition()
+        self._seq = itertools.count()
+        self._waiting = []
+        self._running = 0
+        self._running_batch = 0
+        self._running_by_user = Counter()
+        self._global_requests = TokenBucket(global_rpm)
+        self._global_tokens = TokenBucket(global_tpm)
+        self._user_tokens = {}
+
+    def _user_bucket(self, user_id):
+        bucket = self._user_tokens.get(user_id)
+        if bucket is None:
+            bucket = self._user_tokens[user_id] = TokenBucket(self.user_tpm)
+        return bucket
+
+    def _slot_free(self, waiter):
+        if self._running >= self.max_concurrency:
+            return False
+        if waiter.priority == PRIORITY_BATCH and self._running_batch >= self.batch_slots:
+            return False
+        return self._running_by_user[waiter.user_id] < self.user_concurrency
+
+    def _next_waiter(self, now):
+        """ 지금 실행 가능한 대기자 중 (우선순위, 사용자 실행 수, 도착 순) 최선 1명과, 막혀 있으면 재확인까지 시간 """
+        best, retry_after = None, None
+        for waiter in self._waiting:
+            if not self._slot_free(waiter):
+                continue
+            user_wait = self._user_bucket(waiter.user_id).wait_time(waiter.tokens, now)
+            if user_wait > 0:
+                retry_after = user_wait if retry_after is None else min(retry_after, user_wait)
+                continue
+            key = (waiter.priority, self._running_by_user[waiter.user_id], waiter.seq)
+            if best is None or key < best[0]:
+                best = (key, waiter)
+        if best is None:
+            return None, retry_after
+        waiter = best[1]
+        # 전체 한도는 선두 1명에게만 적용 (뒤 순번이 앞지르지 않도록)
+        global_wait = max(self._global_requests.wait_time(1, now), self._global_tokens.wait_time(waiter.tokens, now))
+        if global_wait > 0:
+            return None, global_wait if retry_after is None else min(retry_after, global_wait)
+        return waiter, None
+
+    def acquire(self, user_id, action_type, tokens=0, timeout=None):
+        priority = ACTION_PRIORITY.get(action_type, PRIORITY_STANDARD)
+        with self._cond:
+            waiter = _Waiter(user_id or "-", priority, tokens, next(self._seq))
+            self._waiting.append(waiter)
+            deadline = None if timeout is None else waiter.enqueued + timeout
+            try:
+                while True:
+                    now = time.monotonic()
+                    chosen, retry_after = self._next_waiter(now)
+                    if chosen is waiter:
+                        break
+                    if chosen is not None:
+                        # (다른 대기자 차례 -> 깨워 주고 다시 확인)
+                        self._cond.notify_all()
+                    remaining = None if deadline is None else deadline - now
+                    if remaining is not None and remaining <= 0:
+                        metrics.incr("llm_queue_timeouts_total", action=action_type)
+                        raise QueueTimeout(f"AI 요청 대기열이 밀려 있습니다. ({timeout:.0f}초 대기 후 중단)")
+                    waits = [w for w in (remaining, retry_after) if w is not None]
+                    self._cond.wait(min(waits) if waits else None)
+            finally:
+                self._waiting.remove(waiter)
+            now = time.monotonic()
+            self._global_requests.take(1, now)
+            self._global_tokens.take(tokens, now)
+            self._user_bucket(waiter.user_id).take(tokens, now)
+            self._running += 1
+            self._running_by_user[waiter.user_id] += 1
+            if priority == PRIORITY_BATCH:
+                self._running_batch += 1
+            self._cond.notify_all()
+            running, queued = self._running, len(self._waiting)
+
+        waited = now - waiter.enqueued
+        metrics.observe("llm_queue_wait_seconds", waited, priority=PRIORITY_NAMES[priority])
+        metrics.set_gauge("llm_running", running)
+        metrics.set_gauge("llm_queued", queued)
+        if waited > 1:
+            print(f"⏳ [Scheduler] '{waiter.user_id}' {action_type} {waited:.1f}초 대기 후 실행 (실행 {running}, 대기 {queued})")
+        return Ticket(self, waiter)
+
+    def _release(self, waiter):
+        with self._cond:
+            self._running -= 1
+            self._running_by_user[waiter.user_id] -= 1
+            if self._running_by_user[waiter.user_id] <= 0:
+                del self._running_by_user[waiter.user_id]
+            if waiter.priority == PRIORITY_BATCH:
+                self._running_batch -= 1
+            self._cond.notify_all()
+            running = self._running
+        metrics.set_gauge("llm_running", running)
+
+
+# 환경 변수 (0 = 무제한)
+#   AITER_LLM_MAX_CONCURRENCY   전체 동시 실행 수 (기본 8)
+#   AITER_LLM_BATCH_SLOTS       배치 작업 최대 동시 실행 수 (기본 전체-1)
+#   AITER_LLM_USER_CONCURRENCY  사용자별 동시 실행 수 (기본 2)
+#   AITER_LLM_RPM / AITER_LLM_TPM  전체 분당 요청 수 / 토큰 수
+#   AITER_LLM_USER_TPM          사용자별 분당 토큰 수
+scheduler = LLMScheduler(
+    max_concurrency=_env_number("AITER_LLM_MAX_CONCURRENCY", 8),
+    batch_slots=_env_number("AITER_LLM_BATCH_SLOTS", 0),
+    user_concurrency=_env_number("AITER_LLM_USER_CONCURRENCY", 2),
+    global_rpm=_env_number("AITER_LLM_RPM", 0),
+    global_tpm=_env_number("AITER_LLM_TPM", 0),
+    user_tpm=_env_number("AITER_LLM_USER_TPM", 0),
+)
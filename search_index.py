@@ -0,0 +1,208 @@
+import os
+import re
+import html
+import math
+import time
+import heapq
+import threading
+from collections import Counter, OrderedDict
+from urllib.parse import quote
+
+import storage
+import metrics
+
+# ----------------------------
+# [!! ★★★ 신규 ★★★ !!]
+# 기록(질문/요약/퀴즈/마인드맵) + 오답노트 전문 검색 (BM25 역색인)
+# - 색인은 사용자별로 프로세스 메모리에 두고, 검색할 때마다 qa/오답노트 캐시 파일 버전(stat)을 비교해
+#   바뀐 경우에만 항목 단위로 추가/삭제/교체 (전체 재구축 없음)
+# - 토큰: 영문/숫자는 단어, 한글/한자는 글자 2-gram (형태소 분석기 없이 부분 일치 검색)
+# - 질문 제목은 본문보다 가중치 2배
+# 설정: AITER_SEARCH_INDEX_USERS=16 (메모리에 유지할 사용자 색인 수)
+# ----------------------------
+
+INDEX_USERS = int(os.getenv("AITER_SEARCH_INDEX_USERS", "16"))
+BM25_K1 = 1.2
+BM25_B = 0.75
+TITLE_WEIGHT = 2
+MAX_PER_PAGE = 50
+SNIPPET_CHARS = 160
+
+_TAG_RE = re.compile(r"<[^>]+>")
+_TOKEN_RE = re.compile(r"[0-9a-z]+|[가-힣]+|[一-鿿]+")
+_SPACE_RE = re.compile(r"\s+")
+
+
+def plain_text(value):
+    """ 저장된 답변 HTML(<br> 등) -> 검색/스니펫용 평문 """
+    return _SPACE_RE.sub(" ", html.unescape(_TAG_RE.sub(" ", value or ""))).strip()
+
+
+def tokenize(text):
+    for match in _TOKEN_RE.finditer(text.lower()):
+        word = match.group()
+        if word[0] <= "z":
+            yield word
+        elif len(word) == 1:
+            yield word
+        else:
+            for i in range(len(word) - 1):
+                yield word[i:i + 2]
+
+
+class UserIndex:
+    """ 한 사용자의 역색인. docs: {doc_id: (서명, 메타데이터, 평문, 토큰별 tf, 길이)} postings: {토큰: {doc_id: tf}} """
+
+    def __init__(self):
+        self.version = None
+        self.docs = {}
+        self.postings = {}
+        self.total_length = 0
+        self.lock = threading.Lock()
+
+    def _add(self, doc_id, signature, meta, title, body):
+        counts = Counter(tokenize(body))
+        for token in tokenize(title):
+            counts[token] += TITLE_WEIGHT
+        length = sum(counts.values())
+        for token, tf in counts.items():
+            self.postings.setdefault(token, {})[doc_id] = tf
+        self.docs[doc_id] = (signature, meta, f"{title} {body}".strip(), counts, length)
+        self.total_length += length
+
+    def _remove(self, doc_id):
+        _, _, _, counts, length = self.docs.pop(doc_id)
+        for token in counts:
+            posting = self.postings.get(token)
+            if posting is not None:
+                posting.pop(doc_id, None)
+                if not posting:
+                    del self.postings[token]
+        self.total_length -= length
+
+    def sync(self, user_id):
+        """ 캐시 파일이 바뀌었으면 항목별 서명을 비교해 바뀐 항목만 다시 색인합니다. 반환: (추가/교체, 삭제) 수 """
+        version = storage.get_cache_version(user_id, ("qa", "odap"))
+        if version == self.version:
+            return 0, 0
+        current = {}
+        for key, entry in storage.load_qa_cache(user_id).items():
+            category = storage.history_category(entry)
+            if not category:
+                continue
+            signature = (entry.get("timestamp"), hash(entry.get("question_text", "")), hash(entry.get("answer", "")))
+            current["qa:" + key] = (signature, category, key, entry)
+        for item in storage.load_odapnote(user_id):
+            signature = (item.get("timestamp"), item.get("miss_count"), hash(item.get("content", "")))
+            current["odap:" + item.get("id", "")] = (signature, "odapnote", item.get("id", ""), item)
+
+        removed = [doc_id for doc_id in self.docs if doc_id not in current]
+        for doc_id in removed:
+            self._remove(doc_id)
+        changed = 0
+        for doc_id, (signature, category, key, entry) in current.items():
+            existing = self.docs.get(doc_id)
+            if existing and existing[0] == signature:
+                continue
+            if existing:
+                self._remove(doc_id)
+            if category == "odapnote":
+                concepts = ", ".join(entry.get("concepts", []))
+                title = f"[오답] {concepts}" if concepts else f"[{entry.get('timestamp', '')} 오답노트]"
+                body = plain_text(entry.get("content", ""))
+                url = f"/?odap_key={quote(key, safe='')}"
+            else:
+                title = entry.get("question_text", "")
+                body = plain_text(entry.get("answer", ""))
+                url = f"/?cache_key={quote(key, safe='')}"
+            meta = {"key": key, "type": category, "title": title, "timestamp": entry.get("timestamp", ""), "url": url}
+            self._add(doc_id, signature, meta, title, body)
+            changed += 1
+        self.version = version
+        return changed, len(removed)
+
+    def search(self, query_tokens, category=None):
+        """ BM25 점수 -> [(점수, doc_id)] (정렬 안 됨) """
+        n_docs = len(self.docs)
+        if not n_docs:
+            return []
+        avg_length = self.total_length / n_docs or 1
+        scores = {}
+        for token in set(query_tokens):
+            posting = self.postings.get(token)
+            if not posting:
+                continue
+            idf = math.log(1 + (n_docs - len(posting) + 0.5) / (len(posting) + 0.5))
+            for doc_id, tf in posting.items():
+                length = self.docs[doc_id][4]
+                norm = tf * (BM25_K1 + 1) / (tf + BM25_K1 * (1 - BM25_B + BM25_B * length / avg_length))
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * norm
+        if category:
+            return [(score, doc_id) for doc_id, score in scores.items() if self.docs[doc_id][1]["type"] == category]
+        return [(score, doc_id) for doc_id, score in scores.items()]
+
+
+_indexes = OrderedDict()
+_indexes_lock = threading.Lock()
+
+
+def get_index(user_id):
+    with _indexes_lock:
+        index = _indexes.get(user_id)
+        if index is None:
+            index = _indexes[user_id] = UserIndex()
+        _indexes.move_to_end(user_id)
+        while len(_indexes) > INDEX_USERS:
+            _indexes.popitem(last=False)
+    return index
+
+
+def sync(user_id):
+    index = get_index(user_id)
+    with index.lock:
+        return index.sync(user_id)
+
+
+def make_snippet(text, query):
+    """ 검색어가 처음 나오는 곳 주변을 잘라 HTML 이스케이프 후 <mark>로 강조 """
+    words = sorted({word for word in query.lower().split() if word}, key=len, reverse=True)
+    lowered = text.lower()
+    positions = [lowered.find(word) for word in words]
+    positions = [pos for pos in positions if pos >= 0]
+    if not positions:
+        # (2-gram으로만 맞은 경우: 검색어 앞부분 2글자로 위치 찾기)
+        positions = [pos for pos in (lowered.find(word[:2]) for word in words if len(word) >= 2) if pos >= 0]
+    start = max(0, min(positions) - SNIPPET_CHARS // 3) if positions else 0
+    window = text[start:start + SNIPPET_CHARS]
+    if not words:
+        return html.escape(window)
+    pattern = re.compile("|".join(re.escape(word) for word in words), re.IGNORECASE)
+    pieces, last = [], 0
+    for match in pattern.finditer(window):
+        pieces.append(html.escape(window[last:match.start()]))
+        pieces.append(f"<mark>{html.escape(match.group())}</mark>")
+        last = match.end()
+    pieces.append(html.escape(window[last:]))
+    return ("…" if start > 0 else "") + "".join(pieces) + ("…" if start + SNIPPET_CHARS < len(text) else "")
+
+
+def search(user_id, query, page=1, per_page=20, category=None):
+    """ 반환: {"total", "page", "per_page", "results": [{key, type, title, timestamp, url, snippet, score}], "took_ms"} """
+    started = time.perf_counter()
+    per_page = max(1, min(per_page, MAX_PER_PAGE))
+    page = max(1, page)
+    index = get_index(user_id)
+    with index.lock:
+        index.sync(user_id)
+        scored = index.search(list(tokenize(query)), category)
+        # (최근 기록을 동점일 때 앞에)
+        top = heapq.nlargest(page * per_page, scored,
+                             key=lambda item: (item[0], index.docs[item[1]][1]["timestamp"]))[(page - 1) * per_page:]
+        results = []
+        for score, doc_id in top:
+            _, meta, text, _, _ = index.docs[doc_id]
+            results.append(dict(meta, score=round(score, 3), snippet=make_snippet(text, query)))
+    took = time.perf_counter() - started
+    metrics.observe("search_seconds", took)
+    return {"total": len(scored), "page": page, "per_page": per_page, "results": results,
+            "took_ms": round(took * 1000, 2)}
@@ -0,0 +1,246 @@
+import re
+import math
+import hashlib
+import importlib.util
+from collections import Counter
+
+import storage
+import normalize
+
+# ----------------------------
+# [!! ★★★ 신규 ★★★ !!]
+# 로컬 TF-IDF 파일 간 유사도 (연관 분석용)
+# 예전: 선택한 파일 전체를 이어 붙여 CORRELATION_PROMPT에 넣음 -> 파일 10개면 프롬프트가 거대하고 수 분 소요
+# 지금: 파일을 페이지/문단 청크로 나눠 NumPy로 TF-IDF 행렬을 만들고,
+#       '서로 다른 파일' 청크 쌍의 코사인 유사도 상위 구절 쌍만 모델에 전달합니다.
+# 결과는 (파일명, 블롭 해시) 집합 기준으로 cache/similarity_<user>.json에 저장해 재사용합니다.
+# (numpy는 연관 분석을 실제로 실행할 때만 import합니다)
+# ----------------------------
+
+NUMPY_AVAILABLE = importlib.util.find_spec("numpy") is not None
+
+SIMILARITY_VERSION = 2
+CHUNK_CHARS = 800
+MAX_CHUNKS_PER_FILE = 400
+MAX_FEATURES = 8192
+TOP_PAIRS = 30
+PAIRS_PER_FILE_PAIR = 4
+MAX_USES_PER_CHUNK = 2
+MIN_SCORE = 0.08
+# 캐시에 보관할 파일 조합 결과 개수 (사용자별)
+CACHE_ENTRIES = 8
+
+_TOKEN = re.compile(r"[a-z][a-z0-9_]+|[0-9]+(?:\.[0-9]+)?|[가-힣]+")
+_STOPWORDS = {
+    "the", "and", "for", "are", "with", "this", "that", "from", "into", "which", "when", "then", "than",
+    "있다", "있는", "없는", "하는", "한다", "된다", "되는", "이다", "그리고", "또는", "따라서", "하지만", "경우",
+}
+
+
+def tokenize(text):
+    """ 영문/숫자는 단어, 한글은 글자 2-gram (조사가 붙어도 같은 어근이 겹치도록) """
+    for token in _TOKEN.findall(text.lower()):
+        if token in _STOPWORDS:
+            continue
+        if "가" <= token[0] <= "힣":
+            if len(token) == 1:
+                continue
+            for i in range(len(token) - 1):
+                yield token[i:i + 2]
+        elif len(token) >= 2:
+            yield token
+
+
+def _chunk_page(label, text):
+    """ 페이지 1개를 CHUNK_CHARS 안팎의 청크로 (줄 경계에서 자름) """
+    chunks, buffer, size = [], [], 0
+    for line in text.splitlines():
+        if not line.strip():
+            continue
+        buffer.append(line)
+        size += len(line) + 1
+        if size >= CHUNK_CHARS:
+            chunks.append((label, "\n".join(buffer)))
+            buffer, size = [], 0
+    if buffer:
+        chunks.append((label, "\n".join(buffer)))
+    return chunks
+
+
+def build_chunks(user_id, filenames):
+    """ 반환: ([(파일 번호, 위치 표시, 텍스트)], 버전 키) - 추출 안 된 파일은 1차 파싱, OCR 필요 파일은 제외 """
+    manifest = storage.load_ocr_manifest(user_id)
+    chunks, version = [], []
+    for file_index, filename in enumerate(filenames):
+        text = storage.read_ocr_text(user_id, filename, manifest)
+        if not text:
+            text = storage.get_text_from_single_file(user_id, filename)
+            manifest = storage.load_ocr_manifest(user_id)
+        if not text or text == storage.NEED_OCR_FLAG:
+            continue
+        entry = manifest.get(filename, {})
+        version.append((filename, entry.get("hash") or hashlib.sha1(text.encode('utf-8')).hexdigest()))
+        pages, _ = normalize.strip_boilerplate(normalize.split_pages(text, entry.get("segments")), filename)
+        file_chunks = [chunk for label, page_text in pages for chunk in _chunk_page(label, page_text)]
+        chunks.extend((file_index, label, chunk_text) for label, chunk_text in file_chunks[:MAX_CHUNKS_PER_FILE])
+    return chunks, version
+
+
+def manifest_version(user_id, filenames):
+    """ 매니페스트의 블롭 해시만으로 build_chunks와 같은 버전 키를 만듭니다. (추출 전/원본 변경 파일이 있으면 None) """
+    versions = storage.manifest_versions(user_id, filenames)
+    if versions is None:
+        return None
+    return [(filename, blob_hash) for filename, status, blob_hash in versions
+            if status != storage.OCR_STATUS_NEED_OCR and blob_hash]
+
+
+def _cache_key(version):
+    return hashlib.sha1(repr((SIMILARITY_VERSION, CHUNK_CHARS, TOP_PAIRS, version)).encode('utf-8')).hexdigest()
+
+
+def _cached_result(user_id, cache_key, file_count):
+    cached = storage.load_similarity_cache(user_id).get(cache_key)
+    if not cached:
+        return None
+    print(f"⚡️ [Similarity] '{user_id}' 유사도 캐시 HIT ({file_count}개 파일)")
+    return cached
+
+
+def tfidf_matrix(chunks, file_count):
+    """
+    청크별 TF-IDF 행렬 (L2 정규화, float32).
+    두 개 이상의 '파일'에 나오는 단어만 특징으로 씁니다. (한 파일에만 있는 단어는 파일 간 유사도에 기여하지 않음)
+    """
+    import numpy as np
+    counts = [Counter(tokenize(text)) for _, _, text in chunks]
+    chunk_df, file_sets = Counter(), {}
+    for (file_index, _, _), counter in zip(chunks, counts):
+        chunk_df.update(counter.keys())
+        for term in counter:
+            file_sets.setdefault(term, set()).add(file_index)
+    n_chunks = len(chunks)
+    # 거의 모든 청크에 나오는 단어(과목명 등)도 제외
+    candidates = [term for term, files in file_sets.items()
+                  if len(files) >= 2 and chunk_df[term] <= max(2, n_chunks * 0.5)]
+    candidates.sort(key=lambda term: -chunk_df[term])
+    vocabulary = {term: i for i, term in enumerate(candidates[:MAX_FEATURES])}
+
+    matrix = np.zeros((n_chunks, len(vocabulary)), dtype=np.float32)
+    for row, counter in enumerate(counts):
+        for term, count in counter.items():
+            column = vocabulary.get(term)
+            if column is not None:
+                matrix[row, column] = 1.0 + math.log(count)
+    if vocabulary:
+        df = np.array([chunk_df[term] for term in vocabulary], dtype=np.float32)
+        matrix *= np.log((1.0 + n_chunks) / (1.0 + df)) + 1.0
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        matrix /= np.where(norms == 0, 1.0, norms)
+    return matrix, len(vocabulary)
+
+
+def rank_pairs(chunks, matrix, file_count):
+    """ 파일 간 청크 유사도 행렬에서 상위 구절 쌍과 파일×파일 연관도(상위 3쌍 평균)를 구합니다. """
+    import numpy as np
+    file_ids = np.array([file_index for file_index, _, _ in chunks])
+    scores = matrix @ matrix.T
+    # 같은 파일 안의 쌍과 대각/하삼각은 제외
+    scores[file_ids[:, None] == file_ids[None, :]] = 0.0
+    scores = np.triu(scores, k=1)
+
+    file_matrix = [[0.0] * file_count for _ in range(file_count)]
+    for a in range(file_count):
+        for b in range(a + 1, file_count):
+            block = scores[np.ix_(file_ids == a, file_ids == b)]
+            if block.size:
+                top = np.sort(block, axis=None)[-3:]
+                file_matrix[a][b] = file_matrix[b][a] = round(float(top.mean()), 4)
+
+    flat = scores.ravel()
+    candidate_count = min(flat.size, TOP_PAIRS * 20)
+    if candidate_count == 0:
+        return [], file_matrix
+    candidates = np.argpartition(flat, -candidate_count)[-candidate_count:]
+    candidates = candidates[np.argsort(flat[candidates])[::-1]]
+
+    pairs, per_file_pair, uses = [], Counter(), Counter()
+    for flat_index in candidates:
+        score = float(flat[flat_index])
+        if score < MIN_SCORE or len(pairs) >= TOP_PAIRS:
+            break
+        i, j = divmod(int(flat_index), len(chunks))
+        file_pair = (chunks[i][0], chunks[j][0])
+        if per_file_pair[file_pair] >= PAIRS_PER_FILE_PAIR or uses[i] >= MAX_USES_PER_CHUNK or uses[j] >= MAX_USES_PER_CHUNK:
+            continue
+        per_file_pair[file_pair] += 1
+        uses[i] += 1
+        uses[j] += 1
+        pairs.append((round(score, 4), i, j))
+    return pairs, file_matrix
+
+
+def find_linked_passages(user_id, filenames):
+    """
+    선택 파일들 사이에서 내용이 가장 많이 겹치는 구절 쌍을 찾습니다. (파일 버전이 같으면 캐시 결과 사용)
+    반환: {"files", "file_matrix", "pairs": [{"score", "a": {file,label,text}, "b": {...}}], "chunks", "features"}
+          (numpy 없음/파일 2개 미만/연결 없음이면 None)
+    """
+    if not NUMPY_AVAILABLE or len(filenames) < 2:
+        return None
+    filenames = sorted(filenames)
+    # (캐시 키는 매니페스트 해시로 먼저: 적중하면 파일을 읽거나 청크로 나누지 않음)
+    version = manifest_version(user_id, filenames)
+    cache_key = _cache_key(version) if version is not None else None
+    cached = _cached_result(user_id, cache_key, len(filenames)) if cache_key else None
+    if not cached:
+        chunks, version = build_chunks(user_id, filenames)
+        # (방금 1차 파싱한 파일이 있었으면 키가 달라질 수 있으므로 한 번 더 확인)
+        if _cache_key(version) != cache_key:
+            cache_key = _cache_key(version)
+            cached = _cached_result(user_id, cache_key, len(filenames))
+    if cached:
+        return cached["result"] if cached["result"]["pairs"] else None
+
+    if len({file_index for file_index, _, _ in chunks}) < 2:
+        return None
+    matrix, feature_count = tfidf_matrix(chunks, len(filenames))
+    pairs, file_matrix = rank_pairs(chunks, matrix, len(filenames))
+    result = {
+        "files": filenames,
+        "file_matrix": file_matrix,
+        "pairs": [{
+            "score": score,
+            "a": {"file": filenames[chunks[i][0]], "label": chunks[i][1], "text": chunks[i][2]},
+            "b": {"file": filenames[chunks[j][0]], "label": chunks[j][1], "text": chunks[j][2]},
+        } for score, i, j in pairs],
+        "chunks": len(chunks),
+        "features": feature_count,
+    }
+    print(f"✅ [Similarity] '{user_id}' 청크 {len(chunks)}개 x 특징 {feature_count}개 -> 연결 구절 {len(pairs)}쌍")
+
+    def mutate(cache):
+        cache[cache_key] = {"result": result, "files": filenames}
+        # (오래된 조합부터 정리: dict는 삽입 순서 유지)
+        for old_key in list(cache)[:-CACHE_ENTRIES]:
+            del cache[old_key]
+    storage.update_similarity_cache(user_id, mutate)
+    return result if result["pairs"] else None
+
+
+def format_file_links(result):
+    """ 파일×파일 연관도 요약 (연관도 높은 순) """
+    files, matrix = result["files"], result["file_matrix"]
+    links = sorted(((matrix[a][b], files[a], files[b]) for a in range(len(files)) for b in range(a + 1, len(files))),
+                   reverse=True)
+    return "\n".join(f"- {a} <-> {b}: {score:.2f}" for score, a, b in links if score > 0) or "- (뚜렷한 연관 없음)"
+
+
+def format_passage_pairs(result):
+    blocks = []
+    for number, pair in enumerate(result["pairs"], start=1):
+        a, b = pair["a"], pair["b"]
+        blocks.append(f"[연결 {number}] 유사도 {pair['score']:.2f}\n"
+                      f"- ({a['file']} {a['label']}) {a['text']}\n"
+                      f"- ({b['file']} {b['label']}) {b['text']}")
+    return "\n\n".join(blocks)
@@ -0,0 +1,732 @@
+// [!! ★★★ 수정 ★★★ !!]
+// DOMContentLoaded로 모든 스크립트를 감쌉니다.
+document.addEventListener('DOMContentLoaded', function() {
+    
+    // 로그인 상태 확인
+    // (정적 파일로 분리되어 Jinja2 변수 대신 <body data-logged-in>에서 읽습니다)
+    const IS_LOGGED_IN = document.body.dataset.loggedIn === 'true';
+
+    // === [헬퍼 함수] API 호출 후 메인 화면 갱신 ===
+    function updateMainContent(data) {
+        if (data.success && data.status === 'complete') {
+            document.querySelector('#responseSection h3').textContent = `질문: ${data.question_text}`;
+            document.getElementById('response').innerHTML = data.answer;
+
+            // [!! ★★★ 핵심 수정 ★★★ !!]
+            // 사이드바 기능으로 로드된 답변도 'previous_answer' hidden input에 저장합니다.
+            const prevAnswerInput = document.getElementById('previous_answer');
+            if(prevAnswerInput) {
+                prevAnswerInput.value = data.answer;
+            }
+
+            // [정답 키] 구조화 정답이 있는 퀴즈면 채점 시 로컬 채점에 사용할 키를 기억합니다.
+            const quizKeyInput = document.getElementById('quiz_key');
+            if(quizKeyInput) {
+                quizKeyInput.value = data.quiz_key || "";
+            }
+
+            // (2단계) 페이지 새로고침 없이 사이드바도 갱신
+        } else { // [!! ★★★ 수정 ★★★ !!] else 구문은 if 블록 밖에 있어야 합니다.
+            alert("작업 실패: " + data.error);
+        }
+    }
+    
+    // === [플로팅 위젯 로직] ===
+    const floatingBtn = document.getElementById('floating-btn');
+    const floatingWindow = document.getElementById('floating-window');
+    const floatingClose = document.getElementById('floating-close');
+    const floatingInput = document.getElementById('floating-input');
+    const floatingSend = document.getElementById('floating-send');
+    const floatingBody = document.getElementById('floating-body');
+
+    if (floatingBtn) {
+        floatingBtn.addEventListener('click', () => {
+            floatingWindow.style.display = 'flex';
+            floatingBtn.style.display = 'none';
+            if(floatingInput) floatingInput.focus();
+        });
+    }
+    if (floatingClose) {
+        floatingClose.addEventListener('click', () => {
+            floatingWindow.style.display = 'none';
+            floatingBtn.style.display = 'flex';
+        });
+    }
+
+    // [!! 신규 !!] 서버 대화 세션: 세션 ID는 첫 응답의 X-Chat-Session 헤더로 받고,
+    // 메인 답변 창 내용(맥락)은 마지막으로 보낸 것과 달라졌을 때만 다시 보냅니다.
+    let chatSessionId = null;
+    let lastSentContext = null;
+
+    async function sendFloatingMessage() {
+        const query = floatingInput.value.trim();
+        if (!query) return;
+
+        const userDiv = document.createElement('div');
+        userDiv.className = 'f-msg f-user';
+        userDiv.textContent = query;
+        floatingBody.appendChild(userDiv);
+        floatingBody.scrollTop = floatingBody.scrollHeight;
+        floatingInput.value = "";
+
+        const botDiv = document.createElement('div');
+        botDiv.className = 'f-msg f-bot';
+        botDiv.textContent = "...";
+        floatingBody.appendChild(botDiv);
+        floatingBody.scrollTop = floatingBody.scrollHeight;
+
+        try {
+            // [!! ★★★ 추가 ★★★ !!] 메인 답변 창의 현재 내용을 가져옵니다.
+            const mainResponseHTML = document.getElementById('response').innerHTML.trim();
+            
+            const payload = { query: query, source: 'floating_widget', session_id: chatSessionId };
+            const contextChanged = mainResponseHTML !== lastSentContext;
+            if (contextChanged) {
+                payload.previous_answer = mainResponseHTML; // [!! ★★★ 추가 ★★★ !!]
+            }
+
+            const response = await fetch('/stream_ask', {
+                method: 'POST',
+                headers: {'Content-Type': 'application/json'},
+                body: JSON.stringify(payload)
+            });
+
+            if (!response.ok) throw new Error("Network error");
+            const returnedSessionId = response.headers.get('X-Chat-Session');
+            if (returnedSessionId !== chatSessionId) {
+                // (새 세션이 발급됨 -> 서버에 맥락이 없으므로 이번 요청에 보낸 경우만 보낸 것으로 기록)
+                chatSessionId = returnedSessionId;
+                lastSentContext = contextChanged ? mainResponseHTML : null;
+            } else if (contextChanged) {
+                lastSentContext = mainResponseHTML;
+            }
+
+            botDiv.textContent = ""; 
+            const reader = response.body.getReader();
+            const decoder = new TextDecoder('utf-8');
+
+            while (true) {
+                const { done, value } = await reader.read();
+                if (done) break;
+                const chunk = decoder.decode(value, {stream: true});
+                botDiv.innerHTML += chunk;
+                floatingBody.scrollTop = floatingBody.scrollHeight;
+            }
+            
+        } catch (error) {
+            botDiv.textContent = "오류 발생: " + error.message;
+            botDiv.style.color = "red";
+        }
+    }
+
+    if (floatingSend) floatingSend.addEventListener('click', sendFloatingMessage);
+    if (floatingInput) floatingInput.addEventListener('keypress', (e) => {
+        if (e.key === 'Enter') sendFloatingMessage(); // [!! ★★★ 괄호() 추가 ★★★ !!]
+    });
+
+    // === [메인 폼 로직] ===
+    const questionForm = document.getElementById('questionForm');
+    const responseDiv = document.getElementById('response');
+    const queryTextarea = document.getElementById('query');
+    const responseSection = document.getElementById('responseSection');
+    const uploadForm = document.getElementById('uploadForm');
+    const uploadStatus = document.getElementById('uploadStatus');
+    const toggleLeftBtn = document.getElementById('toggle-left');
+    const toggleRightBtn = document.getElementById('toggle-right');
+    const toggleFullscreenBtn = document.getElementById('toggle-fullscreen');
+    const body = document.body;
+
+    if (responseSection) {
+        responseSection.scrollTop = responseSection.scrollHeight;
+    }
+
+    // [!! ★★★ 롤백 + 수정 ★★★ !!] 
+    // '질문하기' 버튼은 'previous_answer'를 비우고,
+    // '그 외' 버튼은 'previous_answer'를 채웁니다.
+    document.querySelectorAll('button[type="submit"]').forEach(button => {
+        button.addEventListener('click', function() {
+            // '질문하기' 버튼을 누른 경우, 맥락(previous_answer)을 지웁니다.
+            if (this.value === 'ask') {
+                const prevAnswerInput = document.getElementById('previous_answer');
+                if (prevAnswerInput) {
+                    prevAnswerInput.value = ""; // [!! ★★★ 수정 ★★★ !!]
+                }
+            } 
+            // '질문하기'가 아닌 다른 버튼(채점 등)은 현재 내용을 맥락으로 사용합니다.
+            else if (responseDiv) {
+                let currentAnswerHTML = responseDiv.innerHTML.trim();
+                if (currentAnswerHTML === '(답변이 여기에 표시됩니다.)') {
+                    currentAnswerHTML = "";
+                }
+                const prevAnswerInput = document.getElementById('previous_answer');
+                if(prevAnswerInput) {
+                    prevAnswerInput.value = currentAnswerHTML;
+                }
+            }
+        });
+    });
+
+    if (questionForm) {
+        questionForm.addEventListener('submit', async function(event) {
+            const action = document.activeElement ? document.activeElement.value : '';
+            if (!action) return; 
+
+            if (action === 'ask') {
+                // '질문하기' (스트리밍)
+                event.preventDefault(); 
+                const query = queryTextarea.value;
+                const previousAnswer = document.getElementById('previous_answer').value; // [!! ★★★ 수정 ★★★ !!] 'ask' 클릭 시 이 값은 비어있게 됨
+
+                document.querySelector('#responseSection h3').textContent = `질문: ${query}`;
+                responseDiv.innerHTML = "답변 생성 중... (스트리밍)";
+                document.getElementById('quiz_key').value = "";
+                queryTextarea.disabled = true;
+                document.querySelector('button[value="ask"]').disabled = true;
+
+                try {
+                    const response = await fetch('/stream_ask', {
+                        method: 'POST',
+                        headers: {'Content-Type': 'application/json'},
+                        body: JSON.stringify({
+                            query: query,
+                            previous_answer: previousAnswer, // [!! ★★★ 수정 ★★★ !!] 'ask'의 경우 빈 문자열("") 전송
+                            source: 'main_form' // [!! ★★★ 추가 ★★★ !!]
+                        })
+                    });
+
+                    if (!response.ok) {
+                        throw new Error(`HTTP 오류! 상태: ${response.status}`);
+                    }
+
+                    responseDiv.innerHTML = ""; 
+                    const reader = response.body.getReader();
+                    const decoder = new TextDecoder('utf-8');
+                    
+                    while (true) {
+                        const { done, value } = await reader.read();
+                        if (done) break;
+                        const chunk = decoder.decode(value, {stream: true});
+                        responseDiv.innerHTML += chunk; 
+                        if(responseSection) responseSection.scrollTop = responseSection.scrollHeight;
+                    }
+                    
+                    // [!! ★★★ 추가 ★★★ !!]
+                    // 스트리밍 완료 후, 이 답변을 'previous_answer'에 저장
+                    const prevAnswerInput = document.getElementById('previous_answer');
+                    if(prevAnswerInput) {
+                        prevAnswerInput.value = responseDiv.innerHTML;
+                    }
+                    
+                    // (2단계) 스트리밍 완료 후 사이드바 갱신
+                    // location.reload(); 
+
+                } catch (error) {
+                    responseDiv.innerHTML = `❌ 스트리밍 처리 중 오류: ${error}`;
+                } finally {
+                    queryTextarea.disabled = false; 
+                    document.querySelector('button[value="ask"]').disabled = false;
+                }
+            
+            } else if (action === 'grade_quiz') {
+                // '채점하기' (비동기)
+                event.preventDefault();
+                const btn = document.querySelector('button[value="grade_quiz"]');
+                btn.textContent = "채점 중...";
+                btn.disabled = true;
+                
+                fetch('/grade_quiz', {
+                    method: 'POST',
+                    headers: {'Content-Type': 'application/json'},
+                    body: JSON.stringify({
+                        query: queryTextarea.value,
+                        previous_answer: document.getElementById('previous_answer').value,
+                        quiz_key: document.getElementById('quiz_key').value
+                    })
+                })
+                .then(res => res.json())
+                .then(data => updateMainContent(data)) // 공통 함수로 결과 처리
+                .catch(err => alert('네트워크 오류: ' + err))
+                .finally(() => {
+                    btn.textContent = "[답안] 제출/채점";
+                    btn.disabled = false;
+                });
+
+            } else {
+                // '답변 핵심 추출', '[파일] 퀴즈내기' (동기)
+                // (2단계에서 이 로직도 fetch로 변경)
+                // 1단계에서는 기존 폼 제출 방식을 유지
+            }
+        });
+    }
+
+    if (uploadForm) {
+        uploadForm.addEventListener('submit', function(event) {
+            event.preventDefault(); 
+            const fileInput = document.getElementById('file');
+            if (!fileInput || fileInput.files.length === 0) {
+                uploadStatus.textContent = "파일을 선택하세요.";
+                uploadStatus.style.color = "red";
+                return;
+            }
+            const formData = new FormData(this);
+            uploadStatus.textContent = "업로드 중...";
+            uploadStatus.style.color = "blue";
+
+            fetch('/upload', { method: 'POST', body: formData })
+            .then(response => response.json())
+            .then(data => {
+                if (data.success) {
+                    uploadStatus.textContent = `'${data.filename}' 업로드 성공!`;
+                    uploadStatus.style.color = "green";
+                    setTimeout(() => location.reload(), 1000); // (2단계) 부분 갱신으로 변경
+                } else {
+                    uploadStatus.textContent = `업로드 실패: ${data.error}`;
+                    uploadStatus.style.color = "red";
+                }
+            })
+            .catch(error => {
+                uploadStatus.textContent = `네트워크 오류: ${error}`;
+                uploadStatus.style.color = "red";
+            });
+        });
+    }
+
+    // [!! 신규 !!] 폴더 가져오기 (내보낸 tar.gz)
+    const importForm = document.getElementById('importForm');
+    const importStatus = document.getElementById('importStatus');
+    if (importForm) {
+        importForm.addEventListener('submit', function(event) {
+            event.preventDefault();
+            if (!confirm("가져온 파일/기록이 현재 폴더에 합쳐집니다. 계속할까요?")) return;
+            importStatus.textContent = "가져오는 중...";
+            importStatus.style.color = "blue";
+
+            fetch('/import_folder', { method: 'POST', body: new FormData(this) })
+            .then(response => response.json())
+            .then(data => {
+                if (data.success) {
+                    const r = data.report;
+                    importStatus.textContent = `완료: 파일 ${r.data + r.data_reused}개, 추출 텍스트 ${r.blobs_written + r.blobs_reused}개, 기록 ${r.qa}개`;
+                    importStatus.style.color = "green";
+                    setTimeout(() => location.reload(), 1500);
+                } else {
+                    importStatus.textContent = `가져오기 실패: ${data.error}`;
+                    importStatus.style.color = "red";
+                }
+            })
+            .catch(error => {
+                importStatus.textContent = `네트워크 오류: ${error}`;
+                importStatus.style.color = "red";
+            });
+        });
+    }
+
+    document.querySelectorAll('.sidebar-left a').forEach(link => {
+        link.addEventListener('click', function() {
+            try {
+                localStorage.setItem('collapseLeftSidebar', 'true');
+            } catch (e) {
+                console.warn("LocalStorage 사용 불가: " + e);
+            }
+        });
+    });
+
+    function rebindAllEventListeners() {
+        
+        // (파일 삭제)
+        document.querySelectorAll('.btn-delete-file').forEach(button => {
+            if (button.dataset.listenerAdded) return;
+            button.dataset.listenerAdded = 'true';
+            button.addEventListener('click', function(e) {
+                e.preventDefault();
+                const filename = this.dataset.filename;
+                if(!confirm(`'${filename}' 삭제? (OCR 캐시도 삭제됨)`)) return;
+                
+                fetch('/delete_file', {
+                    method: 'POST', headers: {'Content-Type': 'application/json'},
+                    body: JSON.stringify({filename: filename})
+                }).then(res=>res.json()).then(data=>{
+                    if(data.success) {
+                        this.parentElement.remove();
+                        // (2단계) all_file_text 갱신
+                    } else {
+                        alert("삭제 실패: " + data.error);
+                    }
+                });
+            });
+        });
+
+        // (기록 삭제)
+        document.querySelectorAll('.btn-delete-history').forEach(btn => {
+            if(btn.dataset.listenerAdded) return;
+            btn.dataset.listenerAdded='true';
+            btn.addEventListener('click', function(e){
+                e.preventDefault();
+                const key = this.dataset.key;
+                if(!confirm("기록 삭제?")) return;
+                fetch('/delete_history', {
+                    method:'POST', headers:{'Content-Type':'application/json'},
+                    body:JSON.stringify({key:key})
+                }).then(r=>r.json()).then(d=>{
+                    if(d.success) this.parentElement.remove();
+                });
+            });
+        });
+
+        // (오답노트 삭제)
+        document.querySelectorAll('.btn-delete-odap').forEach(btn => {
+            if(btn.dataset.listenerAdded) return;
+            btn.dataset.listenerAdded='true';
+            btn.addEventListener('click', function(e){
+                e.preventDefault();
+                const key = this.dataset.key;
+                if(!confirm("오답 삭제?")) return;
+                fetch('/delete_odapnote', {
+                    method:'POST', headers:{'Content-Type':'application/json'},
+                    body:JSON.stringify({key:key})
+                }).then(r=>r.json()).then(d=>{
+                    if(d.success) this.parentElement.remove();
+                });
+            });
+        });
+
+        // (파일 클릭)
+        document.querySelectorAll('#fileList li span').forEach(span => {
+            if(span.dataset.listenerAdded) return;
+            span.dataset.listenerAdded='true';
+            span.addEventListener('click', function(){
+                if(queryTextarea) {
+                    queryTextarea.value += this.textContent.trim() + " ";
+                    queryTextarea.focus();
+                }
+            });
+        });
+
+        // [!! 신규 !!] OCR 버튼 클릭
+        document.querySelectorAll('.btn-run-ocr').forEach(button => {
+            if (button.dataset.listenerAdded) return;
+            button.dataset.listenerAdded = 'true';
+            button.addEventListener('click', function(e) {
+                e.preventDefault(); 
+                const filename = this.dataset.filename;
+                this.textContent = "처리중...";
+                this.disabled = true;
+
+                fetch('/run_ocr', {
+                    method: 'POST',
+                    headers: {'Content-Type': 'application/json'},
+                    body: JSON.stringify({ filename: filename }),
+                })
+                .then(response => response.json())
+                .then(data => {
+                    if (data.success) {
+                        alert(`'${filename}'의 OCR 처리를 백그라운드에서 시작했습니다.\n완료되면 새로고침 시 '✅'로 표시됩니다.`);
+                    } else {
+                        alert(`OCR 시작 실패: ${data.error}`);
+                        this.textContent = "OCR";
+                        this.disabled = false;
+                    }
+                })
+                .catch(error => {
+                    alert(`네트워크 오류: ${error}`);
+                    this.textContent = "OCR";
+                    this.disabled = false;
+                });
+            });
+        });
+    }
+    
+    rebindAllEventListeners();
+
+    // [!! 신규 !!] 일괄 처리 (요청 1번 = 서버 캐시 저장 1번)
+    function postBatch(url, body) {
+        return fetch(url, {
+            method: 'POST', headers: {'Content-Type': 'application/json'},
+            body: JSON.stringify(body)
+        }).then(r => r.json());
+    }
+
+    function reportBatchFailures(data) {
+        if (!data.success) {
+            alert("처리 실패: " + data.error);
+            return;
+        }
+        const failed = data.results.filter(r => !r.success);
+        if (failed.length > 0) {
+            alert(`${data.done}개 완료, ${failed.length}개 실패\n` + failed.map(r => `- ${r.key}: ${r.error}`).join("\n"));
+        }
+    }
+
+    // (기록/오답노트 목록 비우기)
+    document.querySelectorAll('.btn-clear-list').forEach(btn => {
+        btn.addEventListener('click', function() {
+            const list = document.getElementById(this.dataset.list);
+            const buttons = Array.from(list.querySelectorAll('.btn-delete-history, .btn-delete-odap'));
+            if (buttons.length === 0) return;
+            if (!confirm(`${buttons.length}개 항목을 모두 삭제할까요?`)) return;
+
+            const isOdap = this.dataset.list === 'odapnote-list';
+            const keys = buttons.map(b => b.dataset.key);
+            postBatch(isOdap ? '/delete_odapnotes' : '/delete_histories', {keys: keys}).then(data => {
+                if (data.success) {
+                    const deleted = new Set(data.results.filter(r => r.success).map(r => r.key));
+                    // (기록 키는 urlencode된 값 -> 서버는 디코딩한 키로 응답)
+                    buttons.forEach(b => {
+                        if (deleted.has(isOdap ? b.dataset.key : decodeURIComponent(b.dataset.key))) b.parentElement.remove();
+                    });
+                }
+                reportBatchFailures(data);
+            });
+        });
+    });
+
+    // [!! 신규 !!] 기록/오답노트 검색 (입력이 멈추면 검색, '더 보기'로 다음 페이지)
+    const searchInput = document.getElementById('history-search-input');
+    const searchResults = document.getElementById('history-search-results');
+    const searchMore = document.getElementById('history-search-more');
+    const SEARCH_TYPE_LABELS = {ask: '질문', summarize: '요약', quiz: '퀴즈', mindmap: '마인드맵', odapnote: '오답'};
+    let searchTimer = null;
+    let searchState = {query: '', page: 1};
+
+    function runSearch(query, page) {
+        const params = new URLSearchParams({q: query, page: page, per_page: 20});
+        fetch('/search?' + params.toString()).then(r => r.json()).then(data => {
+            // (응답을 기다리는 동안 검색어가 바뀌었으면 버림)
+            if (query !== searchInput.value.trim()) return;
+            if (page === 1) searchResults.innerHTML = '';
+            if (!data.success) {
+                searchResults.innerHTML = `<li>${data.error}</li>`;
+                searchMore.style.display = 'none';
+                return;
+            }
+            if (data.total === 0) {
+                searchResults.innerHTML = '<li>검색 결과가 없습니다.</li>';
+            }
+            data.results.forEach(item => {
+                const li = document.createElement('li');
+                const link = document.createElement('a');
+                link.href = item.url;
+                link.title = item.title;
+                link.textContent = `[${SEARCH_TYPE_LABELS[item.type] || item.type}] ${item.title}`;
+                const snippet = document.createElement('div');
+                snippet.className = 'search-snippet';
+                snippet.innerHTML = item.snippet; // (서버에서 이스케이프 + <mark>만 추가)
+                li.appendChild(link);
+                li.appendChild(snippet);
+                searchResults.appendChild(li);
+            });
+            searchState = {query: query, page: page};
+            searchMore.style.display = (page * data.per_page < data.total) ? 'block' : 'none';
+        }).catch(error => {
+            searchResults.innerHTML = `<li>검색 오류: ${error}</li>`;
+        });
+    }
+
+    if (searchInput) {
+        searchInput.addEventListener('input', () => {
+            clearTimeout(searchTimer);
+            const query = searchInput.value.trim();
+            if (!query) {
+                searchResults.innerHTML = '';
+                searchMore.style.display = 'none';
+                return;
+            }
+            searchTimer = setTimeout(() => runSearch(query, 1), 250);
+        });
+        searchMore.addEventListener('click', () => runSearch(searchState.query, searchState.page + 1));
+    }
+
+    // (선택 파일 삭제 / 이름 변경)
+    document.getElementById('btn_delete_selected')?.addEventListener('click', () => {
+        const checkedFiles = Array.from(document.querySelectorAll('.file-checkbox:checked'));
+        if (checkedFiles.length === 0) {
+            alert('삭제할 파일을 1개 이상 선택해주세요.');
+            return;
+        }
+        if (!confirm(`선택한 파일 ${checkedFiles.length}개를 삭제할까요? (OCR 캐시도 삭제됨)`)) return;
+        postBatch('/delete_files', {filenames: checkedFiles.map(cb => cb.value)}).then(data => {
+            if (data.success) {
+                const deleted = new Set(data.results.filter(r => r.success).map(r => r.key));
+                checkedFiles.forEach(cb => { if (deleted.has(cb.value)) cb.parentElement.remove(); });
+            }
+            reportBatchFailures(data);
+        });
+    });
+
+    document.getElementById('btn_move_selected')?.addEventListener('click', () => {
+        const checkedFiles = Array.from(document.querySelectorAll('.file-checkbox:checked'));
+        if (checkedFiles.length === 0) {
+            alert('이름을 바꿀 파일을 1개 이상 선택해주세요.');
+            return;
+        }
+        const moves = [];
+        for (const cb of checkedFiles) {
+            const target = prompt(`'${cb.value}'의 새 이름`, cb.value);
+            if (target === null) return;
+            if (target && target !== cb.value) moves.push({from: cb.value, to: target});
+        }
+        if (moves.length === 0) return;
+        postBatch('/move_files', {moves: moves}).then(data => {
+            reportBatchFailures(data);
+            if (data.success && data.done > 0) window.location.reload();
+        });
+    });
+
+    // [!! ★★★ 폼 버그 수정 -> API 호출 방식으로 변경 ★★★ !!]
+    
+    // (1) 퀴즈/분석 작업 공통 호출 함수
+    function submitQuizJob(action, data = {}) {
+        const btn = document.getElementById(`btn_${action}`);
+        if (btn) {
+            btn.textContent = "요청 중...";
+            btn.disabled = true;
+        }
+        
+        fetch(`/run_quiz`, { // '/run_quiz' API 사용
+            method: 'POST',
+            headers: {'Content-Type': 'application/json'},
+            body: JSON.stringify({ action: action, ...data })
+        })
+        .then(res => res.json())
+        .then(data => updateMainContent(data)) // 공통 함수로 결과 처리
+        .catch(err => alert('네트워크 오류: ' + err))
+        .finally(() => {
+            if(btn) {
+                btn.disabled = false;
+                // (텍스트는 원래대로 돌려야 함 - 2단계)
+                // btn.textContent = "..."; 
+            }
+        });
+    }
+    
+    // (2) 분석 작업 공통 호출 함수
+    function submitAnalysisJob(action, data = {}) {
+        const btn = document.getElementById(`btn_${action}`);
+        if (btn) {
+            btn.textContent = "요청 중...";
+            btn.disabled = true;
+        }
+        
+        fetch(`/run_analysis`, { // '/run_analysis' API 사용
+            method: 'POST',
+            headers: {'Content-Type': 'application/json'},
+            body: JSON.stringify({ action: action, ...data })
+        })
+        .then(res => res.json())
+        .then(data => updateMainContent(data)) // 공통 함수로 결과 처리
+        .catch(err => alert('네트워크 오류: ' + err))
+        .finally(() => {
+            if(btn) {
+                btn.disabled = false;
+                // btn.textContent = "...";
+            }
+        });
+    }
+
+    // (3) 사이드바 버튼 이벤트 바인딩
+    document.getElementById('btn_analyze_weakness')?.addEventListener('click', () => submitQuizJob('analyze_weakness'));
+    document.getElementById('btn_quiz_weakness')?.addEventListener('click', () => submitQuizJob('quiz_weakness'));
+    document.getElementById('btn_extract_all')?.addEventListener('click', () => submitAnalysisJob('extract_all'));
+    document.getElementById('btn_quiz_all')?.addEventListener('click', () => submitQuizJob('quiz_all'));
+    
+    document.getElementById('btn_quiz_selected')?.addEventListener('click', () => {
+        const checkedFiles = document.querySelectorAll('.file-checkbox:checked');
+        if (checkedFiles.length === 0) {
+            alert('파일을 1개 이상 선택해주세요.');
+            return;
+        }
+        const filenames = Array.from(checkedFiles).map(cb => cb.value);
+        submitQuizJob('quiz_selected', { selected_files: filenames });
+    });
+
+    // (4) '연관 분석' 버튼은 별도 API (비동기)
+    document.getElementById('btn_correlation')?.addEventListener('click', () => {
+        const checkedFiles = document.querySelectorAll('.file-checkbox:checked');
+        if (checkedFiles.length === 0) {
+            alert('분석할 파일을 1개 이상 선택해주세요.');
+            return;
+        }
+        const filenames = Array.from(checkedFiles).map(cb => cb.value);
+
+        const btnCorrelation = document.getElementById('btn_correlation');
+        btnCorrelation.textContent = "요청 중...";
+        btnCorrelation.disabled = true;
+
+        fetch('/generate_correlation_async', { // 새 API 호출
+            method: 'POST',
+            headers: {'Content-Type': 'application/json'},
+            body: JSON.stringify({ 'selected_files': filenames })
+        })
+        .then(res => res.json())
+        .then(data => {
+            if (data.success) {
+                if (data.status === 'complete') {
+                    // [성공] 캐시 HIT, 즉시 결과 표시
+                    alert('연관 분석을 캐시에서 불러왔습니다.');
+                    updateMainContent(data); // [!! ★★★ 수정 ★★★ !!]
+                
+                } else if (data.status === 'processing') {
+                    // [시작] 작업이 백그라운드에서 시작됨
+                    alert(data.message);
+                }
+            } else {
+                // [실패]
+                alert("작업 실패: " + data.error);
+            }
+        })
+        .catch(err => {
+            alert('네트워크 오류: ' + err);
+        })
+        .finally(() => {
+            btnCorrelation.textContent = "[선택] 연관 분석";
+            btnCorrelation.disabled = false;
+        });
+    });
+
+
+    // 사이드바 토글
+    if (toggleLeftBtn) {
+        toggleLeftBtn.addEventListener('click', function() {
+            body.classList.toggle('left-collapsed');
+            toggleLeftBtn.textContent = body.classList.contains('left-collapsed') ? '▶' : '◀';
+        });
+    }
+    if (toggleRightBtn) {
+        toggleRightBtn.addEventListener('click', function() {
+            body.classList.toggle('right-collapsed');
+            toggleRightBtn.textContent = body.classList.contains('right-collapsed') ? '◀' : '▶';
+        });
+    }
+
+    try {
+        if (localStorage.getItem('collapseLeftSidebar') === 'true') {
+            body.classList.add('left-collapsed');
+            if (toggleLeftBtn) toggleLeftBtn.textContent = '▶';
+            localStorage.removeItem('collapseLeftSidebar');
+        }
+    } catch (e) {
+        console.warn("LocalStorage 사용 불가: " + e);
+    }
+
+    // 전체화면 토글
+    if (toggleFullscreenBtn) {
+        toggleFullscreenBtn.addEventListener('click', function() {
+            body.classList.toggle('fullscreen-mode');
+            
+            if (body.classList.contains('fullscreen-mode')) {
+                toggleFullscreenBtn.textContent = '원래대로';
+                if (body.classList.contains('left-collapsed')) {
+                    body.classList.remove('left-collapsed');
+                    if (toggleLeftBtn) toggleLeftBtn.textContent = '◀';
+                }
+                if (body.classList.contains('right-collapsed')) {
+                    body.classList.remove('right-collapsed');
+                    if (toggleRightBtn) toggleRightBtn.textContent = '▶';
+                }
+            } else {
+                toggleFullscreenBtn.textContent = '전체화면';
+            }
+        });
+    }
+
+}); // End of DOMContentLoaded
@@ -1,16 +1,33 @@
 import os
+import re
+import gzip
+import mmap
 import json
 import time
-import fitz  # PyMuPDF
-import pptx
-from flask import session, current_app
-import google.generativeai as genai 
-
+import hashlib
+import tempfile
+import threading
+import importlib.util
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime
 try:
-    from app import data_lock
+    import fcntl  # (Linux/macOS) 프로세스 간 파일 잠금
 except ImportError:
-    import threading
-    data_lock = threading.RLock()
+    fcntl = None  # (Windows) 프로세스 내부 잠금만 사용 - 단일 프로세스로 실행하세요
+import quiz_grading
+import llm
+import extractors
+import normalize
+# (fitz/pptx/openpyxl은 해당 형식 파일을 실제로 파싱할 때만 import합니다)
+
+# [!! ★★★ 변경 ★★★ !!]
+# 프로세스 내부 잠금은 storage가 직접 소유합니다. (app.py는 이 객체를 재노출)
+# 캐시 파일의 읽기-수정-저장은 아래 cache_file_lock(프로세스 간 잠금)을 사용합니다.
+data_lock = threading.RLock()
+
+# 'openpyxl' 설치 여부 (import 없이 확인만)
+OPENPYXL_AVAILABLE = importlib.util.find_spec("openpyxl") is not None
 
 # 설정값
 BASE_DATA_DIR = "data"
@@ -30,50 +47,568 @@ def get_user_cache_path(user_id, cache_type="qa"):
     os.makedirs(BASE_CACHE_DIR, exist_ok=True)
     return os.path.join(BASE_CACHE_DIR, f"{cache_type}_{user_id}.json")
 
-def load_qa_cache(user_id):
-    qa_cache_file = get_user_cache_path(user_id, "qa")
-    if os.path.exists(qa_cache_file):
+# ----------------------------
+# [!! ★★★ 신규 ★★★ !!] 프로세스 간 안전한 캐시 파일 접근
+# ----------------------------
+# gunicorn 워커가 여러 개여도 같은 캐시 파일을 동시에 고치지 않도록
+# 스레드 잠금(프로세스 내부) + flock(프로세스 간)을 함께 잡습니다.
+# 저장은 임시 파일에 쓴 뒤 os.replace로 교체하므로, 읽는 쪽은 항상 완전한 JSON만 봅니다.
+_path_locks = {}
+_path_locks_guard = threading.Lock()
+_held_locks = threading.local()
+
+@contextmanager
+def cache_file_lock(path):
+    """ 캐시 파일 1개에 대한 배타 잠금. 같은 스레드에서 다시 잡아도 됩니다(재진입). """
+    held = getattr(_held_locks, "paths", None)
+    if held is None:
+        held = _held_locks.paths = set()
+    if path in held:
+        yield
+        return
+
+    with _path_locks_guard:
+        thread_lock = _path_locks.setdefault(path, threading.Lock())
+    with thread_lock:
+        fd = os.open(path + ".lock", os.O_RDWR | os.O_CREAT, 0o644)
         try:
-            with open(qa_cache_file, 'r', encoding='utf-8') as f: return json.load(f)
-        except: return {}
-    return {}
+            if fcntl:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+            held.add(path)
+            try:
+                yield
+            finally:
+                held.discard(path)
+        finally:
+            os.close(fd)  # (close 시 flock도 해제됨)
 
-def save_qa_cache(user_id, qa_cache):
-    qa_cache_file = get_user_cache_path(user_id, "qa")
-    with data_lock:
+# [!! 신규 !!] 파싱된 JSON 캐시 (프로세스 내부)
+# 저장은 항상 임시 파일 -> os.replace(새 inode)이므로 (inode, mtime_ns, size)가 같으면 내용도 같습니다.
+# 열어 둔 파일의 fstat으로 비교 -> 다른 워커가 저장한 최신 내용도 바로 반영됩니다.
+_json_cache = OrderedDict()
+_json_cache_lock = threading.Lock()
+JSON_CACHE_ENTRIES = int(os.getenv("AITER_JSON_CACHE_ENTRIES", "256"))
+
+def _copy_cached(data, depth=3):
+    """ 호출자가 받은 객체를 고쳐도 캐시가 오염되지 않도록 dict/list를 depth 단계까지 복사 (문자열 등은 공유) """
+    if depth == 0:
+        return data
+    if isinstance(data, dict):
+        return {key: _copy_cached(value, depth - 1) for key, value in data.items()}
+    if isinstance(data, list):
+        return [_copy_cached(value, depth - 1) for value in data]
+    return data
+
+def _read_json(path, default):
+    if not os.path.exists(path):
+        return default
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            st = os.fstat(f.fileno())
+            stamp = (st.st_ino, st.st_mtime_ns, st.st_size)
+            with _json_cache_lock:
+                cached = _json_cache.get(path)
+                if cached and cached[0] == stamp:
+                    _json_cache.move_to_end(path)
+                    return _copy_cached(cached[1])
+            data = json.load(f)
+    except (OSError, ValueError) as e:
+        # (원자적 저장 이후로는 반쯤 쓰인 파일을 읽는 일이 없어야 합니다)
+        print(f"💥 [Storage] '{path}' 읽기 실패: {e}")
+        return default
+    with _json_cache_lock:
+        _json_cache[path] = (stamp, data)
+        _json_cache.move_to_end(path)
+        while len(_json_cache) > JSON_CACHE_ENTRIES:
+            _json_cache.popitem(last=False)
+    return _copy_cached(data)
+
+def _atomic_write_json(path, data):
+    """ 같은 폴더의 임시 파일에 쓰고 fsync 후 원자적으로 교체합니다. """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", prefix=os.path.basename(path) + ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=4)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try: os.remove(tmp_path)
+        except OSError: pass
+        raise
+
+def _save_json(path, data):
+    with cache_file_lock(path):
         try:
-            with open(qa_cache_file, 'w', encoding='utf-8') as f: json.dump(qa_cache, f, ensure_ascii=False, indent=4)
+            _atomic_write_json(path, data)
         except Exception as e: print(f"💥 Error: {e}")
 
-def load_ocr_cache(user_id):
-    ocr_cache_file = get_user_cache_path(user_id, "ocr")
-    if os.path.exists(ocr_cache_file):
+def load_qa_cache(user_id):
+    return _read_json(get_user_cache_path(user_id, "qa"), {})
+
+def save_qa_cache(user_id, qa_cache):
+    _save_json(get_user_cache_path(user_id, "qa"), qa_cache)
+
+def update_qa_cache(user_id, mutate):
+    """
+    잠금을 잡은 채로 최신 qa 캐시를 읽고 -> mutate(cache) -> 저장합니다.
+    (오래 걸리는 LLM 호출 전에 읽어 둔 캐시를 그대로 저장하면 그 사이 다른 변경이 사라지므로,
+     저장은 항상 이 함수를 통해 최신 상태 위에 적용합니다)
+    """
+    path = get_user_cache_path(user_id, "qa")
+    with cache_file_lock(path):
+        qa_cache = load_qa_cache(user_id)
+        result = mutate(qa_cache)
+        save_qa_cache(user_id, qa_cache)
+        return result
+
+def put_qa_entry(user_id, key, entry):
+    update_qa_cache(user_id, lambda qa_cache: qa_cache.__setitem__(key, entry))
+
+def delete_qa_entries(user_id, keys):
+    """ 여러 키를 한 번의 잠금/저장으로 삭제하고, 실제로 삭제된 키 목록을 반환합니다. """
+    def mutate(qa_cache):
+        return [key for key in keys if qa_cache.pop(key, None) is not None]
+    return update_qa_cache(user_id, mutate)
+
+# [!! 신규 !!] 파일 간 유사도 결과 캐시 (similarity.py, 키: 파일 버전 조합 해시)
+def load_similarity_cache(user_id):
+    return _read_json(get_user_cache_path(user_id, "similarity"), {})
+
+def update_similarity_cache(user_id, mutate):
+    path = get_user_cache_path(user_id, "similarity")
+    with cache_file_lock(path):
+        cache = load_similarity_cache(user_id)
+        result = mutate(cache)
+        _save_json(path, cache)
+        return result
+
+# [!! 신규 !!] 보조 질문창 대화 세션 (chat_sessions.py, 키: 세션 ID)
+def load_chat_sessions(user_id):
+    return _read_json(get_user_cache_path(user_id, "chat"), {})
+
+def update_chat_sessions(user_id, mutate):
+    path = get_user_cache_path(user_id, "chat")
+    with cache_file_lock(path):
+        sessions = load_chat_sessions(user_id)
+        result = mutate(sessions)
+        _save_json(path, sessions)
+        return result
+
+# ----------------------------
+# [!! ★★★ 신규 ★★★ !!] 추출 텍스트 저장소 (매니페스트 + 문서별 블롭)
+# ----------------------------
+# 예전: cache/ocr_<user>.json 하나에 {파일명: 전체 텍스트} -> 파일 목록만 필요해도 전부 파싱
+# 지금: cache/ocr_manifest_<user>.json  {파일명: {hash, size, status, pages, compressed, source_*}}
+#       cache/blobs/<user>/<hash>.txt(.gz)  문서별 텍스트 (내용 해시로 이름을 붙여 중복 저장 없음)
+OCR_STATUS_OK = "ok"
+OCR_STATUS_NEED_OCR = "need_ocr"
+NEED_OCR_FLAG = "[SYSTEM_FLAG: NEED_OCR]"
+# 블롭 gzip 압축 여부 (압축 시 mmap 대신 gzip으로 읽음)
+OCR_BLOB_COMPRESS = os.getenv("AITER_OCR_BLOB_COMPRESS", "0") == "1"
+
+def get_user_blob_path(user_id):
+    path = os.path.join(BASE_CACHE_DIR, "blobs", user_id)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+def _blob_file(user_id, text_hash, compressed):
+    return os.path.join(get_user_blob_path(user_id), text_hash + (".txt.gz" if compressed else ".txt"))
+
+def _file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def load_ocr_manifest(user_id):
+    """ 파일 목록/상태만 필요한 곳(목록 표시 등)은 이 작은 매니페스트만 읽습니다. """
+    manifest_path = get_user_cache_path(user_id, "ocr_manifest")
+    if not os.path.exists(manifest_path) and os.path.exists(get_user_cache_path(user_id, "ocr")):
+        _migrate_legacy_ocr_cache(user_id)
+    return _read_json(manifest_path, {})
+
+def update_ocr_manifest(user_id, mutate):
+    path = get_user_cache_path(user_id, "ocr_manifest")
+    with cache_file_lock(path):
+        manifest = load_ocr_manifest(user_id)
+        result = mutate(manifest)
+        _save_json(path, manifest)
+        return result
+
+def get_ocr_done_files(user_id):
+    """ 텍스트 추출이 끝난(✅) 파일명 목록 """
+    return [name for name, entry in load_ocr_manifest(user_id).items() if entry.get("status") == OCR_STATUS_OK]
+
+def _stream_blob(user_id, segments, min_chars=1):
+    """
+    Segment들을 순서대로 임시 블롭 파일에 쓰면서 해시를 계산합니다. (전체 문자열을 만들지 않음)
+    반환: (임시 경로, 해시, 바이트 수, 공백 제외 글자 수, 구간 색인[[label, 글자 오프셋], ...])
+    공백 제외 글자 수가 min_chars 미만이면 임시 파일을 지우고 tmp_path=None을 반환합니다.
+    """
+    digest = hashlib.sha256()
+    size, visible_chars, char_offset, index = 0, 0, 0, []
+    fd, tmp_path = tempfile.mkstemp(dir=get_user_blob_path(user_id), suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'wb') as raw:
+            out = gzip.GzipFile(fileobj=raw, mode='wb') if OCR_BLOB_COMPRESS else raw
+            for segment in segments:
+                if not segment.text:
+                    continue
+                data = segment.text.encode('utf-8')
+                digest.update(data)
+                out.write(data)
+                index.append([segment.label, char_offset])
+                size += len(data)
+                char_offset += len(segment.text)
+                visible_chars += len(segment.text.strip())
+            if out is not raw:
+                out.close()
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    if visible_chars < min_chars:
+        os.remove(tmp_path)
+        tmp_path = None
+    return tmp_path, digest.hexdigest(), size, visible_chars, index
+
+def _commit_blob(user_id, tmp_path, text_hash):
+    """ 임시 블롭을 내용 해시 이름으로 확정합니다. (같은 내용이 이미 있으면 임시 파일만 삭제) """
+    path = _blob_file(user_id, text_hash, OCR_BLOB_COMPRESS)
+    if os.path.exists(path):
+        os.remove(tmp_path)
+    else:
+        os.replace(tmp_path, path)
+
+def _read_blob(user_id, entry):
+    path = _blob_file(user_id, entry["hash"], entry.get("compressed", False))
+    try:
+        if entry.get("compressed"):
+            with gzip.open(path, 'rb') as f: return f.read().decode('utf-8')
+        with open(path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return ""
+            # 메모리 매핑: 페이지 캐시에서 바로 읽어 별도 읽기 버퍼를 두지 않음
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                return mapped[:].decode('utf-8')
+    except (OSError, ValueError) as e:
+        print(f"💥 [Storage] 블롭 읽기 실패 '{path}': {e}")
+        return None
+
+def _source_matches(user_id, filename, entry):
+    """ 원본 파일이 추출 당시와 같은지 확인합니다. (크기/mtime이 다르면 해시로 재확인) """
+    file_path = os.path.join(get_user_data_path(user_id), filename)
+    try:
+        st = os.stat(file_path)
+    except OSError:
+        return False
+    if entry.get("source_size") == st.st_size and entry.get("source_mtime_ns") == st.st_mtime_ns:
+        return True
+    if entry.get("source_hash") and entry.get("source_size") == st.st_size and _file_sha256(file_path) == entry["source_hash"]:
+        # (내용은 같고 mtime만 바뀐 경우: 복사/이전 등) -> 재추출 없이 mtime만 갱신
+        update_ocr_manifest(user_id, lambda m: m.get(filename, {}).__setitem__("source_mtime_ns", st.st_mtime_ns))
+        return True
+    return False
+
+def read_ocr_text(user_id, filename, manifest=None):
+    """
+    저장된 추출 텍스트를 반환합니다. (없거나 원본이 바뀌었으면 None)
+    OCR이 필요한 파일로 기록돼 있으면 NEED_OCR_FLAG를 반환합니다.
+    """
+    entry = (manifest if manifest is not None else load_ocr_manifest(user_id)).get(filename)
+    if not entry or not _source_matches(user_id, filename, entry):
+        return None
+    if entry.get("status") == OCR_STATUS_NEED_OCR:
+        return NEED_OCR_FLAG
+    return _read_blob(user_id, entry)
+
+def save_ocr_text(user_id, filename, text, status=OCR_STATUS_OK, pages=None):
+    """ 추출 텍스트(문자열 1개)를 저장합니다. (Gemini OCR 결과, 예전 캐시 이전 등) """
+    if status != OCR_STATUS_OK:
+        _save_ocr_entry(user_id, filename, {"status": status, "pages": pages})
+        return 0
+    return save_ocr_segments(user_id, filename, [extractors.Segment(text, "text", 0, "")], stats={"units": pages})
+
+def save_ocr_segments(user_id, filename, segments, stats=None, min_chars=1):
+    """
+    추출기(extractors.iter_segments)가 내보내는 Segment를 그대로 블롭에 흘려 쓰고 매니페스트를 갱신합니다.
+    반환: 저장한 텍스트의 공백 제외 글자 수 (min_chars 미만이면 저장하지 않고 그 값만 반환)
+    """
+    stats = stats if stats is not None else {}
+    # (파싱+블롭 쓰기는 잠금 밖에서 -> 큰 파일을 읽는 동안 다른 요청이 매니페스트를 기다리지 않음)
+    tmp_path, text_hash, size, visible_chars, index = _stream_blob(user_id, segments, min_chars)
+    if tmp_path is None:
+        return visible_chars
+    entry = {
+        "status": OCR_STATUS_OK, "pages": stats.get("units") or None,
+        "hash": text_hash, "size": size, "compressed": OCR_BLOB_COMPRESS,
+        # 구간 색인: [위치 표시, 텍스트 내 글자 오프셋] (청크 분할/검색 결과에 페이지 표시용)
+        "segments": index if len(index) > 1 else [],
+    }
+    if stats.get("truncated"):
+        entry["truncated"] = True
+    _save_ocr_entry(user_id, filename, entry, tmp_path)
+    return visible_chars
+
+def _save_ocr_entry(user_id, filename, entry, tmp_blob_path=None):
+    file_path = os.path.join(get_user_data_path(user_id), filename)
+    st = os.stat(file_path)
+    entry.update(source_size=st.st_size, source_mtime_ns=st.st_mtime_ns, source_hash=_file_sha256(file_path),
+                 updated_at=datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+    # (블롭 확정 ~ 매니페스트 갱신 ~ 정리를 한 잠금 안에서: 다른 워커가 새 블롭을 지우지 않도록)
+    with cache_file_lock(get_user_cache_path(user_id, "ocr_manifest")):
+        if tmp_blob_path:
+            _commit_blob(user_id, tmp_blob_path, entry["hash"])
+        manifest = update_ocr_manifest(user_id, lambda manifest: manifest.__setitem__(filename, entry) or manifest)
+        _collect_unused_blobs(user_id, manifest)
+
+def iter_file_segments(user_id, filename, limits=None, stats=None):
+    """ 원본 파일을 Segment 단위로 읽습니다. (청크 분할/해시/색인 등 전체 문자열이 필요 없는 곳에서 사용) """
+    return extractors.iter_segments(os.path.join(get_user_data_path(user_id), filename), limits, stats)
+
+def delete_ocr_entry(user_id, filename):
+    """ 매니페스트에서 파일 항목을 지우고, 더 이상 참조되지 않는 블롭을 정리합니다. """
+    with cache_file_lock(get_user_cache_path(user_id, "ocr_manifest")):
+        removed = update_ocr_manifest(user_id, lambda manifest: manifest.pop(filename, None))
+        if removed:
+            _collect_unused_blobs(user_id, load_ocr_manifest(user_id))
+    return removed is not None
+
+# [!! 신규 !!] 일괄 삭제/이동 (매니페스트 잠금 1회 + 저장 1회)
+def delete_files(user_id, filenames):
+    """
+    원본 파일과 매니페스트 항목을 한꺼번에 지웁니다. (한 파일이 실패해도 나머지는 계속)
+    반환: {파일명: "deleted" | "not_found" | 오류 메시지} (중복된 이름은 처음 한 번만 처리)
+    """
+    data_dir = get_user_data_path(user_id)
+    results = {}
+    with cache_file_lock(get_user_cache_path(user_id, "ocr_manifest")):
+        manifest = load_ocr_manifest(user_id)
+        changed = False
         try:
-            with open(ocr_cache_file, 'r', encoding='utf-8') as f: return json.load(f)
-        except: return {}
-    return {}
+            for filename in dict.fromkeys(filenames):
+                file_path = os.path.join(data_dir, filename)
+                # ('', '..' 같은 이름은 폴더를 가리키므로 일반 파일만 지움)
+                is_file = os.path.isfile(file_path)
+                if not is_file and filename not in manifest:
+                    results[filename] = "not_found"
+                    continue
+                try:
+                    if is_file:
+                        os.remove(file_path)
+                except OSError as e:
+                    results[filename] = f"삭제하지 못했습니다. ({e.strerror or e})"
+                    continue
+                changed = manifest.pop(filename, None) is not None or changed
+                results[filename] = "deleted"
+        finally:
+            # (중간에 예외가 나도 이미 지운 파일의 매니페스트 항목은 반영)
+            if changed:
+                _save_json(get_user_cache_path(user_id, "ocr_manifest"), manifest)
+                _collect_unused_blobs(user_id, manifest)
+    return results
 
-def save_ocr_cache(user_id, ocr_cache):
-    ocr_cache_file = get_user_cache_path(user_id, "ocr")
-    with data_lock:
+def move_files(user_id, moves):
+    """
+    [(원래 이름, 새 이름), ...] 순서대로 이름을 바꿉니다. (추출 결과는 매니페스트 키만 옮겨 재추출 없음)
+    반환: moves와 같은 순서의 ["moved" | 오류 메시지, ...] (한 항목이 실패해도 나머지는 계속)
+    """
+    data_dir = get_user_data_path(user_id)
+    results = []
+    with cache_file_lock(get_user_cache_path(user_id, "ocr_manifest")):
+        manifest = load_ocr_manifest(user_id)
+        changed = False
         try:
-            with open(ocr_cache_file, 'w', encoding='utf-8') as f: json.dump(ocr_cache, f, ensure_ascii=False, indent=4)
-        except Exception as e: print(f"💥 Error: {e}")
+            for source, target in moves:
+                source_path, target_path = os.path.join(data_dir, source), os.path.join(data_dir, target)
+                if not os.path.isfile(source_path):
+                    results.append("파일이 없습니다.")
+                elif not allowed_file(target):
+                    results.append("허용되지 않는 파일 형식입니다.")
+                elif os.path.exists(target_path):
+                    results.append("같은 이름의 파일이 이미 있습니다.")
+                else:
+                    try:
+                        # (rename은 mtime을 유지하므로 source_* 검증도 그대로 통과)
+                        os.rename(source_path, target_path)
+                    except OSError as e:
+                        results.append(f"이름을 바꾸지 못했습니다. ({e.strerror or e})")
+                        continue
+                    if source in manifest:
+                        manifest[target] = manifest.pop(source)
+                        changed = True
+                    results.append("moved")
+        finally:
+            if changed:
+                _save_json(get_user_cache_path(user_id, "ocr_manifest"), manifest)
+    return results
+
+def _collect_unused_blobs(user_id, manifest):
+    """ 매니페스트가 참조하지 않는 블롭 삭제 (매니페스트 잠금 안에서 호출) """
+    in_use = {entry.get("hash") for entry in manifest.values()}
+    blob_dir = get_user_blob_path(user_id)
+    for name in os.listdir(blob_dir):
+        if name.endswith(".tmp"):
+            continue
+        if name.split(".", 1)[0] not in in_use:
+            try: os.remove(os.path.join(blob_dir, name))
+            except OSError: pass
+
+def _migrate_legacy_ocr_cache(user_id):
+    """ 예전 ocr_<user>.json({파일명: 텍스트})을 매니페스트 + 블롭으로 1회 변환합니다. """
+    legacy_path = get_user_cache_path(user_id, "ocr")
+    with cache_file_lock(get_user_cache_path(user_id, "ocr_manifest")):
+        if not os.path.exists(legacy_path):
+            return
+        # (먼저 이름을 바꿔 두어야 아래 save_ocr_text -> load_ocr_manifest가 다시 이전을 시도하지 않음)
+        os.replace(legacy_path, legacy_path + ".migrated")
+        migrated = 0
+        for filename, text in _read_json(legacy_path + ".migrated", {}).items():
+            if text and os.path.exists(os.path.join(get_user_data_path(user_id), filename)):
+                save_ocr_text(user_id, filename, text)
+                migrated += 1
+        print(f"✅ [Storage] '{user_id}' OCR 캐시 {migrated}건을 블롭 저장소로 이전했습니다.")
+
+# ----------------------------
+# 오답노트 (구조화 + 중복 제거)
+# ----------------------------
+# 파일 형식: {"version": 2, "items": [{id, fingerprint, question, answer, user_answer,
+#            explanation, concepts, miss_count, first_missed, last_missed, timestamp, content}]}
+ODAPNOTE_VERSION = 2
+# 약점 퀴즈/취약점 분석 프롬프트에 넣을 최대 오답 개수
+ODAP_PROMPT_LIMIT = 20
+
+def odap_fingerprint(text):
+    """ 번호/공백/기호를 제거한 문제 텍스트의 지문 (같은 문제를 다시 틀리면 같은 값) """
+    normalized = re.sub(r"^\s*\d+\s*[.)]", "", (text or "").lower())
+    normalized = re.sub(r"<br\s*/?>|\(x\)|[^0-9a-z가-힣]+", "", normalized)
+    return hashlib.sha1(normalized.encode('utf-8')).hexdigest()[:16]
+
+def make_odap_item(content, question="", answer="", user_answer="", explanation="", concepts=None, timestamp=None):
+    """ 오답 1건을 저장 형식으로 만듭니다. (id/횟수는 병합 시 채움) """
+    timestamp = timestamp or datetime.now().strftime('%Y-%m-%d %H:%M')
+    return {
+        "fingerprint": odap_fingerprint(f"{question}|{answer}" if question else content),
+        "question": question, "answer": answer, "user_answer": user_answer,
+        "explanation": explanation,
+        "concepts": [c for c in (concepts or []) if c],
+        "first_missed": timestamp, "last_missed": timestamp, "timestamp": timestamp,
+        "content": content,
+    }
+
+def make_odap_item_from_result(result, timestamp=None):
+    """ quiz_grading의 문제별 채점 결과(틀린 문제)를 오답 항목으로 변환합니다. """
+    explanation = result.get("explanation", "")
+    return make_odap_item(
+        quiz_grading.to_html(quiz_grading.format_wrong_item(result, explanation)),
+        question=result.get("question", ""),
+        answer=result.get("choices", {}).get(result.get("answer"), result.get("answer", "")),
+        user_answer=result.get("user_answer") or "",
+        explanation=explanation,
+        concepts=[result.get("concept", "")],
+        timestamp=timestamp)
+
+def _merge_odap_items(items, new_items):
+    """ 지문이 같은 항목은 miss_count를 올려 합치고, 새 항목은 id를 붙여 추가합니다. """
+    by_fingerprint = {item.get("fingerprint"): item for item in items}
+    for new_item in new_items:
+        existing = by_fingerprint.get(new_item["fingerprint"])
+        if existing:
+            existing["miss_count"] = existing.get("miss_count", 1) + 1
+            existing["last_missed"] = existing["timestamp"] = new_item["last_missed"]
+            for field in ("user_answer", "explanation", "content"):
+                if new_item.get(field):
+                    existing[field] = new_item[field]
+            existing["concepts"] = sorted(set(existing.get("concepts", [])) | set(new_item["concepts"]))
+        else:
+            # id는 지문에서 파생 -> 예전 형식을 읽을 때마다 변환해도 항상 같은 id
+            new_item = dict(new_item, id="od_" + new_item["fingerprint"][:12], miss_count=1)
+            items.append(new_item)
+            by_fingerprint[new_item["fingerprint"]] = new_item
+    return items
+
+def _migrate_odapnote(raw):
+    """ 예전 형식(채점 1회당 HTML 덩어리 1개인 리스트)을 문제별 항목 리스트로 변환합니다. """
+    if isinstance(raw, dict):
+        return raw.get("items", [])
+    new_items = []
+    for entry in raw if isinstance(raw, list) else []:
+        if entry.get("items"):
+            new_items.extend(make_odap_item_from_result(r, entry.get("timestamp")) for r in entry["items"])
+        else:
+            new_items.append(make_odap_item(entry.get("content", ""), timestamp=entry.get("timestamp")))
+    return _merge_odap_items([], new_items)
 
 def load_odapnote(user_id):
-    odapnote_file = get_user_cache_path(user_id, "odap")
-    if os.path.exists(odapnote_file):
-        try:
-            with open(odapnote_file, 'r', encoding='utf-8') as f: return json.load(f)
-        except: return []
-    return []
+    return _migrate_odapnote(_read_json(get_user_cache_path(user_id, "odap"), []))
 
 def save_odapnote(user_id, odapnote_list):
-    odapnote_file = get_user_cache_path(user_id, "odap")
-    with data_lock:
+    _save_json(get_user_cache_path(user_id, "odap"), {"version": ODAPNOTE_VERSION, "items": odapnote_list})
+
+def record_odap_items(user_id, new_items):
+    """
+    오답을 지문 기준으로 병합 저장합니다.
+    이미 있는 문제면 miss_count만 올리고 최신 답/해설로 갱신, 없으면 새로 추가합니다.
+    """
+    with cache_file_lock(get_user_cache_path(user_id, "odap")):
+        items = _merge_odap_items(load_odapnote(user_id), new_items)
+        save_odapnote(user_id, items)
+        return items
+
+def delete_odap_items(user_id, item_ids):
+    """ id로 오답을 삭제하고, 실제로 삭제된 id 목록을 반환합니다. """
+    item_ids = set(item_ids)
+    with cache_file_lock(get_user_cache_path(user_id, "odap")):
+        items = load_odapnote(user_id)
+        remaining = [item for item in items if item.get("id") not in item_ids]
+        deleted = [item["id"] for item in items if item.get("id") in item_ids]
+        if deleted:
+            save_odapnote(user_id, remaining)
+        return deleted
+
+def build_concept_index(items):
+    """ {개념: [오답 id, ...]} """
+    index = {}
+    for item in items:
+        for concept in item.get("concepts", []):
+            index.setdefault(concept, []).append(item.get("id"))
+    return index
+
+def select_odap_items(items, limit=ODAP_PROMPT_LIMIT):
+    """
+    프롬프트에 넣을 오답 상위 N개를 고릅니다.
+    (많이 틀린 문제 > 자주 틀리는 개념에 속한 문제 > 최근에 틀린 문제 순)
+    """
+    concept_index = build_concept_index(items)
+    def score(item):
+        concept_weight = max((len(concept_index[c]) for c in item.get("concepts", [])), default=0)
+        return (item.get("miss_count", 1), concept_weight, item.get("last_missed", ""))
+    return sorted(items, key=score, reverse=True)[:limit]
+
+def format_odap_for_prompt(items):
+    """ 선택된 오답을 개념/틀린 횟수와 함께 프롬프트용 텍스트로 만듭니다. """
+    blocks = []
+    for item in items:
+        header = f"[개념: {', '.join(item.get('concepts', [])) or '미분류'} / 틀린 횟수: {item.get('miss_count', 1)}]"
+        blocks.append(header + "\n" + item.get("content", "").replace("<br>", "\n"))
+    return "\n\n".join(blocks)
+
+def get_cache_version(user_id, cache_types=("qa", "ocr_manifest", "odap")):
+    """
+    사용자 캐시 파일들과 data 폴더의 (mtime, 크기) 튜플을 반환합니다.
+    (내용을 읽지 않고 stat만 하므로, ETag 계산에 매 요청 사용해도 가볍습니다)
+    """
+    version = []
+    paths = [get_user_cache_path(user_id, cache_type) for cache_type in cache_types]
+    paths.append(get_user_data_path(user_id))
+    for path in paths:
         try:
-            with open(odapnote_file, 'w', encoding='utf-8') as f: json.dump(odapnote_list, f, ensure_ascii=False, indent=4)
-        except Exception as e: print(f"💥 Error: {e}")
+            st = os.stat(path)
+            version.append((st.st_mtime_ns, st.st_size))
+        except OSError:
+            version.append((0, 0))
+    return tuple(version)
 
 def get_supported_files(user_id):
     user_data_path = get_user_data_path(user_id)
@@ -84,16 +619,93 @@ def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
 
+# --- [!! 신규 !!] Gemini OCR (ocr_prep 전처리 결과 업로드) ---
+def _gemini_ocr(user_id, path, display_name, mime_type=None):
+    genai = llm.get_genai()
+    sample_file = genai.upload_file(path=path, display_name=display_name, mime_type=mime_type)
+    try:
+        while sample_file.state.name == "PROCESSING":
+            time.sleep(0.5)
+            sample_file = genai.get_file(sample_file.name)
+
+        if sample_file.state.name == "FAILED": raise ValueError("Gemini failed")
+
+        # (모델/출력 한도는 llm.MODEL_ROUTES["ocr"] - AITER_LLM_MODEL_OCR로 변경)
+        response = llm.generate("ocr", None, ["Extract everything.", sample_file], user_id=user_id)
+        return response.text
+    finally:
+        try: genai.delete_file(sample_file.name)
+        except Exception: pass
+
+def _run_manual_ocr(user_id, filename, file_path):
+    """
+    텍스트 층이 있는 PDF 페이지는 그대로, 나머지는 전처리 결과물을 OCR해 페이지 순서대로 저장합니다.
+    [!! 신규 !!] OCR 구간은 동시에 처리하고, 끝난 구간은 바로 체크포인트에 저장합니다.
+    일부 구간이 실패하면 예외를 내고(저장 안 함), 다시 실행하면 체크포인트가 없는 구간만 OCR합니다.
+    반환: 저장한 공백 제외 글자 수 (0이면 저장 안 함)
+    """
+    import ocr_prep
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+    parts, report = ocr_prep.prepare(file_path)
+    # (업로드가 모두 끝날 때까지 결과물은 캐시 정리 대상에서 제외)
+    try:
+        checkpoint = ocr_prep.checkpoint_dir(user_id, report)
+        texts = [part.text for part in parts]
+        pending = []
+        for index, part in enumerate(parts):
+            if part.text is None:
+                texts[index] = ocr_prep.load_checkpoint(checkpoint, part)
+                if texts[index] is None:
+                    pending.append(index)
+        ocr_count = sum(1 for part in parts if part.text is None)
+        print(f"🚀 [Manual-OCR] '{filename}' Gemini 전송 중... ({len(pending)}개 구간"
+              f"{f', 이전 실행에서 끝난 {ocr_count - len(pending)}개 구간 재사용' if len(pending) < ocr_count else ''})")
+
+        def ocr_part(part):
+            text = _gemini_ocr(user_id, part.path, f"{filename} {part.label}".strip(), part.mime)
+            ocr_prep.save_checkpoint(checkpoint, part, text)
+            return text
+
+        started = time.perf_counter()
+        failures = []
+        if pending:
+            with ThreadPoolExecutor(max_workers=min(ocr_prep.OCR_CONCURRENCY, len(pending)), thread_name_prefix="ocr-part") as pool:
+                futures = {pool.submit(ocr_part, parts[index]): index for index in pending}
+                for future in as_completed(futures):
+                    index = futures[future]
+                    try:
+                        texts[index] = future.result()
+                    except Exception as e:
+                        failures.append((index, e))
+        seconds = time.perf_counter() - started
+        ocr_prep.record_ocr(report, seconds)
+    finally:
+        ocr_prep.release(parts)
+    if failures:
+        failures.sort()
+        labels = ", ".join(parts[index].label or filename for index, _ in failures)
+        raise RuntimeError(f"'{filename}' OCR 구간 {len(failures)}/{len(pending)}개 실패 ({labels}): {failures[0][1]} "
+                           f"- 다시 실행하면 실패한 구간만 처리합니다.")
+    print(f"✅ [Manual-OCR] '{filename}' OCR {seconds:.1f}s (업로드 {report['upload_bytes'] / 1e6:.2f}MB / 원본 {report['original_bytes'] / 1e6:.2f}MB)")
+
+    # (페이지 순서대로 병합)
+    segments = []
+    for index, (part, text) in enumerate(zip(parts, texts), start=1):
+        if text:
+            segments.append(extractors.Segment(text if text.endswith("\n") else text + "\n", "page", index, part.label))
+    pages = max((page for part in parts for page in part.pages), default=None) if len(parts) > 1 or report["prepared"] else None
+    visible_chars = save_ocr_segments(user_id, filename, segments, stats={"units": pages})
+    ocr_prep.clear_checkpoints(checkpoint)
+    return visible_chars
+
 # --- [!! 핵심 수정 !!] 수동 OCR 전략 ---
 def get_text_from_single_file(user_id, filename, force_ocr=False):
     user_data_path = get_user_data_path(user_id)
-    ocr_cache = load_ocr_cache(user_id)
     file_path = os.path.join(user_data_path, filename)
     
-    # 1. 캐시 확인 (강제 OCR 아닐 때만)
+    # 1. 캐시 확인 (강제 OCR 아닐 때만) - 이 파일의 블롭 하나만 읽음
     if not force_ocr:
-        with data_lock:
-            cached_text = ocr_cache.get(filename)
+        cached_text = read_ocr_text(user_id, filename)
         if cached_text:
             return cached_text
             
@@ -101,85 +713,54 @@ def get_text_from_single_file(user_id, filename, force_ocr=False):
 
     if not os.path.exists(file_path):
         return None
-        
-    full_text = ""
     
     try:
         # ==================================================
         # [상황 1] 사용자가 [OCR] 버튼을 누름 (force_ocr=True)
+        # PDF/이미지만 Gemini로 보내고, PPT/TXT/XLSX는 아래 로컬 파싱으로 다시 추출
         # ==================================================
-        if force_ocr:
-            # (무조건 Gemini에게 보냄)
-            if filename.lower().endswith(('.pdf', '.png', '.jpg', '.jpeg')):
-                print(f"🚀 [Manual-OCR] '{filename}' Gemini 전송 중...")
-                sample_file = genai.upload_file(path=file_path, display_name=filename)
-                while sample_file.state.name == "PROCESSING":
-                    time.sleep(0.5)
-                    sample_file = genai.get_file(sample_file.name)
-                
-                if sample_file.state.name == "FAILED": raise ValueError("Gemini failed")
-                
-                model = genai.GenerativeModel("gemini-1.5-flash") 
-                response = model.generate_content(["Extract everything.", sample_file])
-                full_text = response.text
-                try: genai.delete_file(sample_file.name) 
-                except: pass
-            else:
-                # PPT, TXT 등은 로컬 방식으로 처리 (기존 유지)
-                pass 
+        if force_ocr and filename.lower().endswith(('.pdf', '.png', '.jpg', '.jpeg')):
+            # (로컬 전처리 후 필요한 부분만 업로드 -> 페이지 순서대로 구간 저장)
+            if _run_manual_ocr(user_id, filename, file_path):
+                return read_ocr_text(user_id, filename)
+            return None
 
         # ==================================================
         # [상황 2] 자동 파싱 (버튼 안 누름)
         # ==================================================
-        else:
-            # (A) PDF -> 텍스트 추출 시도
-            if filename.lower().endswith('.pdf'):
-                try:
-                    doc = fitz.open(file_path)
-                    for page in doc: full_text += page.get_text() + "\n"
-                    doc.close()
-                except: pass
-
-                # [!! 핵심 !!] 텍스트가 너무 적으면? -> "OCR 추천 메시지"를 텍스트로 저장
-                if len(full_text.strip()) < 50:
-                    print(f"⚠️ [Image-PDF] '{filename}' 텍스트 부족. OCR 추천 플래그 반환.")
-                    # 이 메시지가 나중에 프롬프트에 들어가서 AI가 대답하게 됨
-                    return "[SYSTEM_FLAG: NEED_OCR]" 
-
-            # (B) 이미지 파일 -> 무조건 OCR 추천
-            elif filename.lower().endswith(('.png', '.jpg', '.jpeg')):
-                return "[SYSTEM_FLAG: NEED_OCR]"
-
-            # (C) PPTX, TXT 등 -> 로컬 파싱
-            elif filename.lower().endswith('.pptx'):
-                prs = pptx.Presentation(file_path)
-                for slide in prs.slides:
-                    for shape in slide.shapes:
-                        if hasattr(shape, "text"): full_text += shape.text + "\n"
-            
-            elif filename.lower().endswith('.txt'):
-                try:
-                    with open(file_path, 'r', encoding='utf-8') as f: full_text = f.read()
-                except:
-                    with open(file_path, 'r', encoding='cp949') as f: full_text = f.read()
-            
-            elif filename.lower().endswith('.xlsx'):
-                if current_app.config.get('OPENPYXL_AVAILABLE', False):
-                    import openpyxl
-                    wb = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
-                    for sheet_name in wb.sheetnames:
-                        sheet = wb[sheet_name]
-                        for row in sheet.iter_rows():
-                            row_text = [str(cell.value) for cell in row if cell.value is not None]
-                            full_text += " ".join(row_text) + "\n"
-                    wb.close()
-
-        # 결과 저장 (성공한 텍스트만 캐시에 저장)
-        if full_text and len(full_text.strip()) > 0:
-            with data_lock:
-                ocr_cache[filename] = full_text
-                save_ocr_cache(user_id, ocr_cache)
-            return full_text
+        # (A) PDF -> 텍스트 추출 시도 (페이지 단위로 바로 블롭에 씀)
+        elif filename.lower().endswith('.pdf'):
+            stats = {}
+            try:
+                visible_chars = save_ocr_segments(user_id, filename, iter_file_segments(user_id, filename, stats=stats),
+                                                  stats=stats, min_chars=50)
+            except Exception as e:
+                print(f"⚠️ [Extract] '{filename}' PDF 파싱 실패: {e}")
+                visible_chars = 0
+
+            # [!! 핵심 !!] 텍스트가 너무 적으면? -> "OCR 추천 메시지"를 텍스트로 저장
+            if visible_chars < 50:
+                print(f"⚠️ [Image-PDF] '{filename}' 텍스트 부족. OCR 추천 플래그 반환.")
+                # 이 메시지가 나중에 프롬프트에 들어가서 AI가 대답하게 됨
+                # (매니페스트에 기록 -> 원본이 바뀌지 않는 한 매번 다시 파싱하지 않음)
+                save_ocr_text(user_id, filename, None, status=OCR_STATUS_NEED_OCR, pages=stats.get("units") or None)
+                return NEED_OCR_FLAG
+            return read_ocr_text(user_id, filename)
+
+        # (B) 이미지 파일 -> 무조건 OCR 추천
+        elif filename.lower().endswith(('.png', '.jpg', '.jpeg')):
+            save_ocr_text(user_id, filename, None, status=OCR_STATUS_NEED_OCR, pages=1)
+            return NEED_OCR_FLAG
+
+        # (C) PPTX, TXT, XLSX -> 로컬 파싱 (슬라이드/줄 묶음/시트 행 묶음 단위 스트리밍)
+        elif filename.lower().endswith(extractors.EXTRACTABLE_EXTENSIONS):
+            if filename.lower().endswith('.xlsx') and not OPENPYXL_AVAILABLE:
+                return None
+            stats = {}
+            if save_ocr_segments(user_id, filename, iter_file_segments(user_id, filename, stats=stats), stats=stats):
+                # (블롭에서 한 번에 읽어 반환: 조각 문자열을 이어 붙이지 않음)
+                return read_ocr_text(user_id, filename)
+            return None
             
     except Exception as e:
         print(f"❌ Error: {e}")
@@ -187,35 +768,110 @@ def get_text_from_single_file(user_id, filename, force_ocr=False):
     return None
 
 # --- [자동 감지] ---
-def load_all_text_from_data(user_id):
-    temp_text_list = []
+def _collect_documents(user_id):
+    """ 폴더의 파일별 추출 텍스트와, 정규화 결과 재사용 여부를 판단할 버전 키를 모읍니다. """
+    documents = []
     current_files = get_supported_files(user_id)
-    ocr_cache = load_ocr_cache(user_id)
+    manifest = load_ocr_manifest(user_id)
+    parsed_any = False
     
     for filename in current_files:
-        text = ocr_cache.get(filename)
+        # (매니페스트 1회 + 필요한 블롭만 읽음)
+        text = read_ocr_text(user_id, filename, manifest)
         if not text:
             # 캐시 없으면 1차 파싱 시도 (파싱 실패시 'NEED_OCR' 플래그가 옴)
             text = get_text_from_single_file(user_id, filename)
+            parsed_any = True
+
+        if text:
+            documents.append((filename, text))
+
+    if parsed_any:
+        manifest = load_ocr_manifest(user_id)
+    documents = [(filename, text, manifest.get(filename, {}).get("segments"), manifest.get(filename, {}).get("hash"))
+                 for filename, text in documents]
+    version_key = tuple((filename, blob_hash, len(text)) for filename, text, _, blob_hash in documents)
+    return documents, version_key
+
+# [!! 신규 !!] 조립된 전체 자료 텍스트 캐시 (사용자별 최근 1건)
+# 키는 매니페스트만으로 만듭니다(파일명/상태/블롭 해시 + 원본 일치 여부) -> 적중하면 블롭을 하나도 읽지 않음
+_corpus_cache = OrderedDict()
+_corpus_cache_lock = threading.Lock()
+CORPUS_CACHE_USERS = int(os.getenv("AITER_CORPUS_CACHE_USERS", "32"))
+
+def manifest_versions(user_id, filenames, manifest=None):
+    """
+    [!! 신규 !!] 파일별 (파일명, 상태, 블롭 해시)를 매니페스트만으로 모읍니다. (블롭을 읽지 않음)
+    추출 기록이 없거나 원본이 바뀐 파일이 하나라도 있으면 None
+    """
+    manifest = manifest if manifest is not None else load_ocr_manifest(user_id)
+    versions = []
+    for filename in filenames:
+        entry = manifest.get(filename)
+        if not entry or not _source_matches(user_id, filename, entry):
+            return None
+        versions.append((filename, entry.get("status"), entry.get("hash")))
+    return versions
+
+def _corpus_key(user_id):
+    """ 모든 파일이 추출 완료 상태이고 원본이 그대로일 때만 키를 만듭니다. (아니면 None -> 새로 조립) """
+    versions = manifest_versions(user_id, get_supported_files(user_id))
+    if versions is None:
+        return None
+    return (normalize.NORMALIZE_ENABLED,) + tuple(versions)
+
+def load_all_text_from_data(user_id):
+    corpus_key = _corpus_key(user_id)
+    with _corpus_cache_lock:
+        cached = _corpus_cache.get(user_id)
+        if corpus_key is not None and cached and cached[0] == corpus_key:
+            _corpus_cache.move_to_end(user_id)
+            return cached[1]
 
-        if text: 
-            temp_text_list.append(f"--- {filename} 시작 ---\n{text}\n--- {filename} 끝 ---")
+    documents, version_key = _collect_documents(user_id)
+    if normalize.NORMALIZE_ENABLED:
+        # [!! 신규 !!] 반복 머리글/바닥글/쪽 번호 + 폴더 내 중복 문단 제거 (토큰 절감)
+        texts, _ = normalize.normalize_cached(user_id, version_key, documents)
+    else:
+        texts = [(filename, text) for filename, text, _, _ in documents]
+    temp_text_list = [f"--- {filename} 시작 ---\n{text}\n--- {filename} 끝 ---" for filename, text in texts]
                 
     all_file_text = "\n\n".join(temp_text_list)
+    # (방금 1차 파싱한 파일이 있으면 매니페스트가 바뀌었으므로 키를 다시 계산)
+    corpus_key = _corpus_key(user_id)
+    # (조립 도중 다른 요청이 파일을 바꿨으면 저장하지 않음: 읽은 블롭 해시 == 키의 블롭 해시일 때만)
+    if corpus_key is not None and {f: h for f, h, _ in version_key} == {f: h for f, _, h in corpus_key[1:]}:
+        with _corpus_cache_lock:
+            _corpus_cache[user_id] = (corpus_key, all_file_text)
+            _corpus_cache.move_to_end(user_id)
+            while len(_corpus_cache) > CORPUS_CACHE_USERS:
+                _corpus_cache.popitem(last=False)
     return all_file_text
 
+def get_normalize_report(user_id):
+    """ 파일별 정규화 절감량 (바이트/추정 토큰) + 합계 """
+    documents, version_key = _collect_documents(user_id)
+    _, report = normalize.normalize_cached(user_id, version_key, documents)
+    return {"files": report, "total": normalize.summarize_report(report), "enabled": normalize.NORMALIZE_ENABLED}
+
+# [!! 신규 !!] 기록 목록 분류 (사이드바 목록과 검색 결과가 같은 기준을 쓰도록 분리)
+HISTORY_CATEGORIES = {
+    'ask': 'ask', 'quiz_file': 'ask',
+    'extract_answer': 'summarize', 'extract_all': 'summarize',
+    'quiz_all': 'quiz', 'quiz_selected': 'quiz', 'quiz_weakness': 'quiz', 'grade_quiz': 'quiz', 'analyze_weakness': 'quiz',
+    'generate_mindmap': 'mindmap',
+}
+
+def history_category(entry):
+    """ qa 캐시 항목 -> 'ask' | 'summarize' | 'quiz' | 'mindmap' | None(목록에 표시하지 않음) """
+    return HISTORY_CATEGORIES.get(entry.get('action_type', 'ask'))
+
 def get_categorized_cache(qa_cache):
     # (기존과 동일)
-    ask_list, summarize_list, quiz_list, mindmap_list = [], [], [], []
+    lists = {'ask': [], 'summarize': [], 'quiz': [], 'mindmap': []}
     sorted_items = sorted(qa_cache.items(), key=lambda item: item[1].get('timestamp', '0'), reverse=True)
     for key, value in sorted_items:
-        action_type = value.get('action_type', 'ask')
-        if action_type in ['ask', 'quiz_file']:
-            ask_list.append({'key': key, 'value': value})
-        elif action_type in ['extract_answer', 'extract_all']:
-            summarize_list.append({'key': key, 'value': value})
-        elif action_type in ['quiz_all', 'quiz_selected', 'quiz_weakness', 'grade_quiz', 'analyze_weakness']:
-            quiz_list.append({'key': key, 'value': value})
-        elif action_type == 'generate_mindmap':
-            mindmap_list.append({'key': key, 'value': value})
-    return ask_list, summarize_list, quiz_list, mindmap_list
\ No newline at end of file
+        category = history_category(value)
+        if category:
+            lists[category].append({'key': key, 'value': value})
+    return lists['ask'], lists['summarize'], lists['quiz'], lists['mindmap']
\ No newline at end of file
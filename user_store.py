@@ -0,0 +1,117 @@
+import os
+import json
+import sqlite3
+import threading
+from collections import OrderedDict
+
+# ----------------------------
+# [!! ★★★ 신규 ★★★ !!]
+# 인덱스 기반 사용자 저장소 (SQLite)
+# users.json 전체를 매번 읽고 쓰는 대신, folder_id 기본키로 한 명씩 조회/추가합니다.
+# ----------------------------
+
+USERS_DB = "users.db"
+LEGACY_USERS_FILE = "users.json"
+# 로그인이 잦은 사용자 레코드를 메모리에 보관하는 개수
+USER_CACHE_SIZE = 1024
+
+
+class UserStore:
+    def __init__(self, db_path=USERS_DB, legacy_json=LEGACY_USERS_FILE, cache_size=USER_CACHE_SIZE):
+        self.db_path = db_path
+        self.legacy_json = legacy_json
+        self.cache_size = cache_size
+        self._local = threading.local()
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._init_lock = threading.Lock()
+        self._initialized = False
+
+    # --- 연결/스키마 ---
+    def _connect(self):
+        """ 스레드마다 별도 연결을 씁니다. (sqlite3 연결은 스레드 간 공유 불가) """
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=10)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        if not self._initialized:
+            self._initialize(conn)
+        return conn
+
+    def _initialize(self, conn):
+        with self._init_lock:
+            if self._initialized:
+                return
+            with conn:
+                conn.execute("""CREATE TABLE IF NOT EXISTS users (
+                                    folder_id TEXT PRIMARY KEY,
+                                    password_hash TEXT NOT NULL,
+                                    created_at TEXT)""")
+                conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+            self._migrate_legacy_json(conn)
+            self._initialized = True
+
+    def _migrate_legacy_json(self, conn):
+        """ 기존 users.json이 있으면 최초 1회 DB로 옮깁니다. (원본 파일은 그대로 둡니다) """
+        if conn.execute("SELECT 1 FROM meta WHERE key = 'legacy_json_migrated'").fetchone():
+            return
+        migrated = 0
+        if os.path.exists(self.legacy_json):
+            try:
+                with open(self.legacy_json, 'r', encoding='utf-8') as f:
+                    legacy_users = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"⚠️ [UserStore] '{self.legacy_json}' 읽기 실패, 이전을 건너뜁니다: {e}")
+                legacy_users = {}
+            rows = [(folder_id, user.get("password_hash"), user.get("created_at"))
+                    for folder_id, user in legacy_users.items() if user.get("password_hash")]
+            with conn:
+                conn.executemany("INSERT OR IGNORE INTO users (folder_id, password_hash, created_at) VALUES (?, ?, ?)", rows)
+            migrated = len(rows)
+        with conn:
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('legacy_json_migrated', ?)", (str(migrated),))
+        if migrated:
+            print(f"✅ [UserStore] '{self.legacy_json}' 사용자 {migrated}명 이전 완료.")
+
+    # --- 캐시 ---
+    def _cache_get(self, folder_id):
+        with self._cache_lock:
+            user = self._cache.get(folder_id)
+            if user is not None:
+                self._cache.move_to_end(folder_id)
+            return user
+
+    def _cache_put(self, folder_id, user):
+        with self._cache_lock:
+            self._cache[folder_id] = user
+            self._cache.move_to_end(folder_id)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    # --- 공개 API ---
+    def get_user(self, folder_id):
+        """ 사용자 1명을 조회합니다. (없으면 None, 존재하는 사용자만 캐시) """
+        user = self._cache_get(folder_id)
+        if user is not None:
+            return user
+        row = self._connect().execute(
+            "SELECT password_hash, created_at FROM users WHERE folder_id = ?", (folder_id,)).fetchone()
+        if row is None:
+            return None
+        user = {"password_hash": row["password_hash"], "created_at": row["created_at"]}
+        self._cache_put(folder_id, user)
+        return user
+
+    def create_user(self, folder_id, password_hash, created_at):
+        """ 사용자를 추가합니다. 이미 있는 ID면 False (기본키 제약으로 동시 생성도 안전) """
+        try:
+            with self._connect() as conn:
+                conn.execute("INSERT INTO users (folder_id, password_hash, created_at) VALUES (?, ?, ?)",
+                             (folder_id, password_hash, created_at))
+        except sqlite3.IntegrityError:
+            return False
+        self._cache_put(folder_id, {"password_hash": password_hash, "created_at": created_at})
+        return True
@@ -0,0 +1,72 @@
+import os
+import time
+import threading
+
+import storage
+import metrics
+import search_index
+
+# ----------------------------
+# [!! ★★★ 신규 ★★★ !!]
+# 로그인/폴더 생성 직후 백그라운드 예열
+# 로그인 뒤 첫 요청이 qa/오답노트/매니페스트 JSON 파싱 + 전체 자료 조립(+ 미추출 파일 1차 파싱)을
+# 떠안지 않도록, 같은 작업을 미리 돌려 storage의 프로세스 내부 캐시(파싱된 JSON, 조립된 자료 텍스트,
+# 정규화 결과)를 채워 둡니다.
+#   AITER_WARMUP=0           끄기
+#   AITER_WARMUP_COOLDOWN=60 같은 사용자를 다시 예열하지 않는 시간(초)
+# ----------------------------
+
+WARMUP_ENABLED = os.getenv("AITER_WARMUP", "1") != "0"
+COOLDOWN_SECONDS = float(os.getenv("AITER_WARMUP_COOLDOWN", "60"))
+
+_lock = threading.Lock()
+_running = set()
+_last_done = {}
+
+
+def warm_user(user_id):
+    """ 예열 본체 (동기). 단계별 소요 시간(초)을 반환합니다. """
+    timings = {}
+
+    def step(name, func):
+        started = time.perf_counter()
+        func()
+        timings[name] = round(time.perf_counter() - started, 3)
+
+    step("qa", lambda: storage.get_categorized_cache(storage.load_qa_cache(user_id)))
+    step("odapnote", lambda: storage.load_odapnote(user_id))
+    step("manifest", lambda: storage.get_ocr_done_files(user_id))
+    # (미추출 파일 1차 파싱 + 정규화 + 조립까지: 첫 질문/퀴즈가 그대로 캐시 적중)
+    step("corpus", lambda: storage.load_all_text_from_data(user_id))
+    # (기록 검색 색인: 첫 검색이 전체 색인을 만들지 않도록)
+    step("search", lambda: search_index.sync(user_id))
+    return timings
+
+
+def _run(user_id):
+    started = time.perf_counter()
+    try:
+        timings = warm_user(user_id)
+        elapsed = time.perf_counter() - started
+        metrics.observe("warmup_seconds", elapsed)
+        print(f"🔥 [Warmup] '{user_id}' 예열 완료 {elapsed:.2f}s {timings}")
+    except Exception as e:
+        metrics.incr("warmup_errors_total")
+        print(f"💥 [Warmup] '{user_id}' 예열 실패: {e}")
+    finally:
+        with _lock:
+            _running.discard(user_id)
+            _last_done[user_id] = time.monotonic()
+
+
+def start(user_id):
+    """ 백그라운드 스레드로 예열을 시작합니다. (이미 진행 중이거나 최근에 했으면 건너뜀) """
+    if not WARMUP_ENABLED or not user_id:
+        return False
+    with _lock:
+        last = _last_done.get(user_id)
+        if user_id in _running or (last is not None and time.monotonic() - last < COOLDOWN_SECONDS):
+            return False
+        _running.add(user_id)
+    threading.Thread(target=_run, args=(user_id,), name=f"warmup-{user_id}", daemon=True).start()
+    return True